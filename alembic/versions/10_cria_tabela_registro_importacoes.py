@@ -0,0 +1,39 @@
+"""Cria a tabela registro_importacoes (hashes dos arquivos e blocos já importados).
+
+Revision ID: 10
+Revises: 9
+Create Date: 2026-10-18 14:02:51.730164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10'
+down_revision: Union[str, Sequence[str], None] = '9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- CRIANDO A TABELA registro_importacoes ---")
+
+    # Uma linha por arquivo ('arquivo') ou bloco de linhas ('bloco') importado para a tabela
+    # do apartamento. Usada pelas importações para ignorar conteúdo repetido (ver registro_importacoes.py).
+    op.create_table('registro_importacoes',
+        sa.Column('apartamento_id', sa.Integer(), nullable=False),
+        sa.Column('tabela', sa.Text(), nullable=False),
+        sa.Column('tipo', sa.Text(), nullable=False),
+        sa.Column('hash', sa.Text(), nullable=False),
+        sa.Column('linhas', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('importado_em', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('apartamento_id', 'tabela', 'tipo', 'hash')
+    )
+
+
+def downgrade() -> None:
+    print("--- REVERTENDO CRIAÇÃO DA TABELA registro_importacoes ---")
+    op.drop_table('registro_importacoes')
@@ -0,0 +1,48 @@
+"""Adiciona a coluna hash_linha às tabelas importadas (merge só das linhas alteradas).
+
+Revision ID: 11
+Revises: 10
+Create Date: 2026-10-18 15:37:09.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '11'
+down_revision: Union[str, Sequence[str], None] = '10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# As tabelas de config.TABLE_PRIMARY_KEYS. A coluna é preenchida pelo merge
+# (carga_em_massa.mesclar_staging); as linhas antigas ficam com NULL e são
+# regravadas na primeira importação que trouxer a chave delas.
+TABELAS = [
+    'relFilViagensCliente',
+    'relFilViagensFatCliente',
+    'relFilDespesasGerais',
+    'relFilContasPagarDet',
+    'relFilContasReceber',
+    'relFilAcertoMot',
+]
+
+
+def _tabelas_existentes():
+    tabelas = set(sa.inspect(op.get_bind()).get_table_names())
+    return [tabela for tabela in TABELAS if tabela in tabelas]
+
+
+def upgrade() -> None:
+    print("--- ADICIONANDO hash_linha ÀS TABELAS IMPORTADAS ---")
+    for tabela in _tabelas_existentes():
+        print(f"-> Adicionando hash_linha em {tabela}...")
+        op.execute(f'ALTER TABLE "{tabela}" ADD COLUMN IF NOT EXISTS hash_linha TEXT')
+
+
+def downgrade() -> None:
+    print("--- REMOVENDO hash_linha DAS TABELAS IMPORTADAS ---")
+    for tabela in _tabelas_existentes():
+        op.execute(f'ALTER TABLE "{tabela}" DROP COLUMN IF EXISTS hash_linha')
@@ -0,0 +1,38 @@
+"""Cria a tabela coleta_watermarks (até onde cada relatório de cada apartamento já foi coletado).
+
+Revision ID: 12
+Revises: 11
+Create Date: 2026-10-18 21:12:40.318576
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '12'
+down_revision: Union[str, Sequence[str], None] = '11'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- CRIANDO A TABELA coleta_watermarks ---")
+
+    # Uma linha por apartamento e relatório do ERP. Usada pela sincronização diária
+    # para coletar só a janela ainda aberta (ver watermarks_coleta.py).
+    op.create_table('coleta_watermarks',
+        sa.Column('apartamento_id', sa.Integer(), nullable=False),
+        sa.Column('relatorio', sa.Text(), nullable=False),
+        sa.Column('coletado_ate', sa.Date(), nullable=True),
+        sa.Column('ultima_coleta', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('ultima_completa', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('apartamento_id', 'relatorio')
+    )
+
+
+def downgrade() -> None:
+    print("--- REVERTENDO CRIAÇÃO DA TABELA coleta_watermarks ---")
+    op.drop_table('coleta_watermarks')
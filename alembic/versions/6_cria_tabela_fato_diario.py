@@ -0,0 +1,48 @@
+"""Cria a tabela fato_diario (valores pré-agregados por dia para o dashboard).
+
+Revision ID: 6
+Revises: 5
+Create Date: 2026-10-18 09:12:40.118532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6'
+down_revision: Union[str, Sequence[str], None] = '5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- CRIANDO A TABELA fato_diario ---")
+
+    # Uma linha por (apartamento, fonte, categoria, dia, placa, filial, grupo, negócio...).
+    # É mantida pelas importações (ver fato_diario.py) e lida pelos KPIs e gráficos do dashboard.
+    op.create_table('fato_diario',
+        sa.Column('apartamento_id', sa.Integer(), nullable=False),
+        sa.Column('fonte', sa.Text(), nullable=False),
+        sa.Column('categoria', sa.Text(), nullable=False),
+        sa.Column('dia', sa.Date(), nullable=True),
+        sa.Column('dia_lancamento', sa.Date(), nullable=True),
+        sa.Column('placa', sa.Text(), nullable=True),
+        sa.Column('filial', sa.Text(), nullable=True),
+        sa.Column('filial_alternativa', sa.Text(), nullable=True),
+        sa.Column('grupo', sa.Text(), nullable=True),
+        sa.Column('negocio', sa.Text(), nullable=True),
+        sa.Column('tipo_frete', sa.Text(), nullable=True),
+        sa.Column('valor', sa.Float(), nullable=True),
+        sa.Column('quantidade', sa.Integer(), nullable=False, server_default='0')
+    )
+    print("-> Criando índice por apartamento, fonte e dia...")
+    op.create_index('ix_fato_diario_apartamento_fonte_dia', 'fato_diario', ['apartamento_id', 'fonte', 'dia'])
+
+
+def downgrade() -> None:
+    print("--- REVERTENDO CRIAÇÃO DA TABELA fato_diario ---")
+    op.drop_index('ix_fato_diario_apartamento_fonte_dia', table_name='fato_diario')
+    op.drop_table('fato_diario')
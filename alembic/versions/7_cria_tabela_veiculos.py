@@ -0,0 +1,38 @@
+"""Cria a tabela veiculos (placas classificadas por apartamento).
+
+Revision ID: 7
+Revises: 6
+Create Date: 2026-10-18 10:41:07.502198
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7'
+down_revision: Union[str, Sequence[str], None] = '6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- CRIANDO A TABELA veiculos ---")
+
+    # Uma linha por placa do apartamento: 'Próprio', 'Terceiro', 'Agregado' ou 'Apoio'.
+    # É mantida pelas importações de viagens e despesas (ver veiculos.py).
+    op.create_table('veiculos',
+        sa.Column('apartamento_id', sa.Integer(), nullable=False),
+        sa.Column('placa', sa.Text(), nullable=False),
+        sa.Column('tipo', sa.Text(), nullable=False),
+        sa.Column('primeiro_visto', sa.Date(), nullable=True),
+        sa.Column('ultimo_visto', sa.Date(), nullable=True),
+        sa.PrimaryKeyConstraint('apartamento_id', 'placa')
+    )
+
+
+def downgrade() -> None:
+    print("--- REVERTENDO CRIAÇÃO DA TABELA veiculos ---")
+    op.drop_table('veiculos')
@@ -0,0 +1,59 @@
+"""Cria índices para as opções de filtro (filiais e tipos de negócio).
+
+Revision ID: 8
+Revises: 7
+Create Date: 2026-10-18 11:27:53.816240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8'
+down_revision: Union[str, Sequence[str], None] = '7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nome do índice, tabela, coluna). relFilViagensFatCliente e relFilAcertoMot são criadas
+# pela primeira importação, então cada índice só é criado se a tabela e a coluna existirem.
+INDICES = [
+    ('ix_viagens_fat_cliente_apt_nome_filial', 'relFilViagensFatCliente', 'nomeFilial'),
+    ('ix_viagens_fat_cliente_apt_nome_fil', 'relFilViagensFatCliente', 'nomeFil'),
+    ('ix_despesas_gerais_apt_nome_filial', 'relFilDespesasGerais', 'nomeFilial'),
+    ('ix_despesas_gerais_apt_nome_fil', 'relFilDespesasGerais', 'nomeFil'),
+    ('ix_despesas_gerais_apt_desc_negocio', 'relFilDespesasGerais', 'descNegocio'),
+    ('ix_contas_pagar_det_apt_nome_filial', 'relFilContasPagarDet', 'nomeFilial'),
+    ('ix_contas_pagar_det_apt_nome_fil', 'relFilContasPagarDet', 'nomeFil'),
+    ('ix_contas_receber_apt_nome_filial', 'relFilContasReceber', 'nomeFilial'),
+    ('ix_viagens_cliente_apt_nome_filial', 'relFilViagensCliente', 'nomeFilial'),
+    ('ix_viagens_cliente_apt_nome_fil', 'relFilViagensCliente', 'nomeFil'),
+]
+
+
+def _indices_aplicaveis():
+    inspector = sa.inspect(op.get_bind())
+    tabelas = set(inspector.get_table_names())
+    colunas = {}
+    for nome, tabela, coluna in INDICES:
+        if tabela not in tabelas:
+            continue
+        if tabela not in colunas:
+            colunas[tabela] = {col['name'] for col in inspector.get_columns(tabela)}
+        if coluna in colunas[tabela]:
+            yield nome, tabela, coluna
+
+
+def upgrade() -> None:
+    print("--- CRIANDO ÍNDICES PARA AS OPÇÕES DE FILTRO ---")
+    for nome, tabela, coluna in _indices_aplicaveis():
+        print(f"-> Criando índice {nome} em {tabela} (apartamento_id, {coluna})...")
+        op.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON "{tabela}" (apartamento_id, "{coluna}")')
+
+
+def downgrade() -> None:
+    print("--- REMOVENDO ÍNDICES DAS OPÇÕES DE FILTRO ---")
+    for nome, _, _ in INDICES:
+        op.execute(f'DROP INDEX IF EXISTS {nome}')
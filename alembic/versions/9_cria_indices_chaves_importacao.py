@@ -0,0 +1,56 @@
+"""Cria índices (apartamento_id, chave) usados pela carga em massa das importações.
+
+Revision ID: 9
+Revises: 8
+Create Date: 2026-10-18 12:14:36.208417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9'
+down_revision: Union[str, Sequence[str], None] = '8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nome do índice, tabela, coluna): as chaves de config.TABLE_PRIMARY_KEYS. O DELETE ... USING
+# de carga_em_massa.mesclar_staging localiza as linhas antigas por este índice.
+# Assim como na migração 8, cada índice só é criado se a tabela e a coluna existirem.
+INDICES = [
+    ('ix_viagens_cliente_apt_numero', 'relFilViagensCliente', 'numero'),
+    ('ix_viagens_fat_cliente_apt_numero', 'relFilViagensFatCliente', 'numero'),
+    ('ix_despesas_gerais_apt_cod_item_nota', 'relFilDespesasGerais', 'codItemNota'),
+    ('ix_contas_pagar_det_apt_cod_item_nota', 'relFilContasPagarDet', 'codItemNota'),
+    ('ix_contas_receber_apt_cod_duplicata', 'relFilContasReceber', 'codDuplicataReceber'),
+    ('ix_acerto_mot_apt_cod_acerto', 'relFilAcertoMot', 'codAcertoMotorista'),
+]
+
+
+def _indices_aplicaveis():
+    inspector = sa.inspect(op.get_bind())
+    tabelas = set(inspector.get_table_names())
+    colunas = {}
+    for nome, tabela, coluna in INDICES:
+        if tabela not in tabelas:
+            continue
+        if tabela not in colunas:
+            colunas[tabela] = {col['name'] for col in inspector.get_columns(tabela)}
+        if coluna in colunas[tabela]:
+            yield nome, tabela, coluna
+
+
+def upgrade() -> None:
+    print("--- CRIANDO ÍNDICES DAS CHAVES DE IMPORTAÇÃO ---")
+    for nome, tabela, coluna in _indices_aplicaveis():
+        print(f"-> Criando índice {nome} em {tabela} (apartamento_id, {coluna})...")
+        op.execute(f'CREATE INDEX IF NOT EXISTS {nome} ON "{tabela}" (apartamento_id, "{coluna}")')
+
+
+def downgrade() -> None:
+    print("--- REMOVENDO ÍNDICES DAS CHAVES DE IMPORTAÇÃO ---")
+    for nome, _, _ in INDICES:
+        op.execute(f'DROP INDEX IF EXISTS {nome}')
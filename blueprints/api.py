@@ -6,6 +6,8 @@ import json
 import time
 from datetime import datetime, timedelta
 import logic
+import cache_resultados
+import filtros_sql
 
 from extensions import bcrypt
 from db_connection import engine
@@ -28,6 +30,13 @@ def _parse_filters():
         filters['end_date_obj'] = None
     return filters
 
+def _resultado_em_cache(namespace, apartamento_id, filters, calcular, *extras):
+    """Serve o resultado do cache de resultados (Redis), calculando-o só em caso de falta."""
+    chave_filtros = filtros_sql.assinatura_filtros(
+        filters['start_date_obj'], filters['end_date_obj'], filters['placa'], filters['filial'], filters['tipo_negocio']
+    ) + tuple(extras)
+    return cache_resultados.obter_ou_calcular_resultado(namespace, apartamento_id, chave_filtros, calcular)
+
 @api_bp.route('/monthly_summary')
 @login_required
 def api_monthly_summary():
@@ -36,15 +45,48 @@ def api_monthly_summary():
         return jsonify({"error": "Contexto do apartamento não encontrado"}), 400
 
     filters = _parse_filters()
-    monthly_data = logic.get_monthly_summary(
+    monthly_data = _resultado_em_cache('monthly', apartamento_id_alvo, filters, lambda: logic.get_monthly_summary(
         apartamento_id=apartamento_id_alvo,
         start_date=filters['start_date_obj'],
         end_date=filters['end_date_obj'],
         placa_filter=filters['placa'],
         filial_filter=filters['filial'],
         tipo_negocio_filter=filters['tipo_negocio']
-    )
-    return jsonify(monthly_data.to_dict(orient='records'))
+    ).to_dict(orient='records'))
+    return jsonify(monthly_data)
+
+@api_bp.route('/filter_options')
+@login_required
+def api_filter_options():
+    """Opções dos filtros do dashboard: placas (com tipo), filiais e tipos de negócio."""
+    apartamento_id_alvo = get_target_apartment_id()
+    if apartamento_id_alvo is None:
+        return jsonify({"error": "Contexto do apartamento não encontrado"}), 400
+    return jsonify(logic.get_filter_options(apartamento_id_alvo))
+
+@api_bp.route('/dashboard_bundle')
+@login_required
+def api_dashboard_bundle():
+    """
+    Endpoint combinado: devolve numa só resposta as partes pedidas em ?partes=
+    (summary, monthly, faturamento, despesas, audit), calculadas sobre o mesmo bundle de dados.
+    """
+    apartamento_id_alvo = get_target_apartment_id()
+    if apartamento_id_alvo is None:
+        return jsonify({"error": "Contexto do apartamento não encontrado"}), 400
+
+    filters = _parse_filters()
+    partes = [p.strip() for p in request.args.get('partes', '').split(',') if p.strip()] or None
+    dados = _resultado_em_cache('bundle', apartamento_id_alvo, filters, lambda: logic.get_dashboard_bundle(
+        apartamento_id=apartamento_id_alvo,
+        start_date=filters['start_date_obj'],
+        end_date=filters['end_date_obj'],
+        placa_filter=filters['placa'],
+        filial_filter=filters['filial'],
+        tipo_negocio_filter=filters['tipo_negocio'],
+        partes=partes
+    ), ','.join(partes or logic.PARTES_BUNDLE_DASHBOARD))
+    return jsonify(dados)
 
 @api_bp.route('/get_robot_logs')
 @login_required
@@ -86,7 +128,7 @@ def api_faturamento_dashboard_data():
     # A função _parse_filters() já busca o 'tipo_negocio', então está correta.
     filters = _parse_filters()
     
-    dashboard_data = logic.get_faturamento_details_dashboard_data(
+    dashboard_data = _resultado_em_cache('faturamento', apartamento_id_alvo, filters, lambda: logic.get_faturamento_details_dashboard_data(
         apartamento_id=apartamento_id_alvo,
         start_date=filters['start_date_obj'],
         end_date=filters['end_date_obj'],
@@ -94,7 +136,7 @@ def api_faturamento_dashboard_data():
         filial_filter=filters['filial'],
         # --- LINHA ADICIONADA ---
         tipo_negocio_filter=filters['tipo_negocio']
-    )
+    ))
     return jsonify(dashboard_data)
 
 @api_bp.route('/despesas_dashboard_data')
@@ -104,14 +146,14 @@ def api_despesas_dashboard_data():
     if apartamento_id_alvo is None:
         return jsonify({"error": "Contexto do apartamento não encontrado"}), 400
     filters = _parse_filters()
-    dashboard_data = logic.get_despesas_details_dashboard_data(
+    dashboard_data = _resultado_em_cache('despesas', apartamento_id_alvo, filters, lambda: logic.get_despesas_details_dashboard_data(
         apartamento_id=apartamento_id_alvo,
         start_date=filters['start_date_obj'],
         end_date=filters['end_date_obj'],
         placa_filter=filters['placa'],
         filial_filter=filters['filial'],
         tipo_negocio_filter=filters['tipo_negocio']
-    )
+    ))
     return jsonify(dashboard_data)
 
 @api_bp.route('/despesas_audit_data')
@@ -121,7 +163,7 @@ def api_despesas_audit_data():
     if apartamento_id_alvo is None:
         return jsonify({"error": "Contexto do apartamento não encontrado"}), 400
     filters = _parse_filters()
-    audit_data = logic.get_expense_audit_data(
+    audit_data = _resultado_em_cache('audit', apartamento_id_alvo, filters, lambda: logic.get_expense_audit_data(
         apartamento_id=apartamento_id_alvo,
         start_date=filters['start_date_obj'],
         end_date=filters['end_date_obj'],
@@ -129,7 +171,7 @@ def api_despesas_audit_data():
         filial_filter=filters['filial'],
         # --- LINHA ADICIONADA ---
         tipo_negocio_filter=filters['tipo_negocio']
-    )
+    ))
     return jsonify(audit_data)
 
 @api_bp.route('/relatorio_viagem/<int:numero>') # ALTERADO AQUI
@@ -174,6 +216,27 @@ def api_heartbeat():
     except Exception as e:
         return jsonify({"status": "error"}), 500
 
+@api_bp.route('/cache_stats')
+@login_required
+@super_admin_required
+def api_cache_stats():
+    """Acertos/faltas do cache de resultados e ocupação do cache de DataFrames deste processo."""
+    import cache_dados
+    return jsonify({
+        "resultados": cache_resultados.estatisticas_resultados(),
+        "dataframes": cache_dados.estatisticas_cache()
+    })
+
+@api_bp.route('/import_status/<job_id>')
+@login_required
+def api_import_status(job_id):
+    """Andamento de um upload enfileirado: estado do job e, por arquivo, etapa atual e tempos."""
+    import fila_importacao
+    status = fila_importacao.status_do_lote(job_id, get_target_apartment_id())
+    if status is None:
+        return jsonify({"error": "Importação não encontrada."}), 404
+    return jsonify(status)
+
 @api_bp.route('/status_stream')
 @login_required
 @super_admin_required
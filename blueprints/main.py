@@ -8,8 +8,8 @@ import redis
 from rq import Queue
 import logic
 import coletor_principal
-import config
-import database as db
+import import_pipeline
+import fila_importacao
 import uuid
 from limpar_dados import limpar_dados_importados
 from datetime import datetime
@@ -126,40 +126,50 @@ def upload_file():
         flash('Erro: Nenhum ficheiro selecionado.', 'error')
         return redirect(url_for('main.index'))
 
+    reconhecidos = []
     for file in uploaded_files:
         if file and file.filename:
-            filename = file.filename
-            file_key = {info['path']: key for key, info in config.EXCEL_FILES_CONFIG.items()}.get(filename)
-            if file_key:
-                try:
-                    table_info = config.EXCEL_FILES_CONFIG[file_key]
-                    sheet_name = table_info.get('sheet_name')
-                    table_name = table_info['table']
-                    if table_name == 'relFilDespesasGerais':
-                        extra_cols = db.process_and_import_despesas(excel_source=file, sheet_name=sheet_name, table_name=table_name, apartamento_id=apartamento_id_alvo)
-                    else:
-                        key_columns = config.TABLE_PRIMARY_KEYS.get(table_name)
-                        if not key_columns:
-                            flash(f"ERRO: Chaves primárias não definidas para a tabela '{table_name}'.", 'error')
-                            continue
-                        extra_cols = db.import_excel_to_db(excel_source=file, sheet_name=sheet_name, table_name=table_name, key_columns=key_columns, apartamento_id=apartamento_id_alvo)
-                    
-                    flash(f'Sucesso: Planilha "{filename}" importada.', 'success')
-                    if extra_cols:
-                        flash(f'Aviso para "{filename}": As seguintes colunas não existem na base de dados e foram ignoradas: {", ".join(extra_cols)}', 'warning')
-                except Exception as e:
-                    flash(f'Erro ao processar "{filename}": {e}', 'error')
+            if import_pipeline.chave_do_arquivo(file.filename):
+                reconhecidos.append(file)
             else:
-                flash(f'Erro: Nome de ficheiro "{filename}" não reconhecido.', 'error')
-    
-    logic.sync_expense_groups(apartamento_id_alvo)
+                flash(f'Erro: Nome de ficheiro "{file.filename}" não reconhecido.', 'error')
+
+    if reconhecidos and fila_importacao.fila_disponivel(redis_conn):
+        # Os arquivos vão para o spool e o worker importa (ver fila_importacao.py)
+        try:
+            job_id = fila_importacao.enfileirar_uploads(reconhecidos, apartamento_id_alvo, redis_conn)
+        except Exception as e:
+            print(f"AVISO: Falha ao enfileirar o upload; importando na própria requisição. Erro: {e}")
+            job_id = None
+        if job_id:
+            if request.accept_mimetypes.best == 'application/json':
+                return jsonify({'status': 'sucesso', 'job_id': job_id, 'status_url': url_for('api.api_import_status', job_id=job_id)})
+            flash(f'A importação de {len(reconhecidos)} planilha(s) foi iniciada em segundo plano.', 'success')
+            return redirect(url_for('main.index'))
+        # O save() do spool leu os arquivos: volta ao início para a importação abaixo
+        for file in reconhecidos:
+            file.stream.seek(0)
+
+    # Alternativa sem fila: importa na própria requisição
+    for file in reconhecidos:
+        filename = file.filename
+        try:
+            extra_cols = import_pipeline.importar_arquivo(file, filename, apartamento_id_alvo, forcar=True)['extra_columns']
+
+            flash(f'Sucesso: Planilha "{filename}" importada.', 'success')
+            if extra_cols:
+                flash(f'Aviso para "{filename}": As seguintes colunas não existem na base de dados e foram ignoradas: {", ".join(extra_cols)}', 'warning')
+        except Exception as e:
+            flash(f'Erro ao processar "{filename}": {e}', 'error')
+
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'status': 'sucesso', 'job_id': None})
     return redirect(url_for('main.index'))
 
 @main_bp.route('/gerenciar-grupos-dados')
 @login_required
 def gerenciar_grupos_dados():
     apartamento_id_alvo = get_target_apartment_id()
-    logic.sync_expense_groups(apartamento_id_alvo) 
     df_flags = logic.get_group_flags_with_tipo_d_status(apartamento_id_alvo)
     flags_dict = df_flags.set_index('group_name').to_dict('index') if not df_flags.empty else {}
     return jsonify(flags_dict)
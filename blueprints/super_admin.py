@@ -2,6 +2,8 @@
 from flask import Blueprint, render_template, redirect, url_for, session, request, flash, jsonify
 from flask_login import login_required
 import logic
+import watermarks_coleta
+from db_connection import engine
 from limpar_dados import limpar_dados_importados
 
 # --- CORREÇÃO ---
@@ -68,6 +70,20 @@ def limpar_dados_apartamento(apartamento_id):
         flash(f'Erro ao limpar dados do apartamento {apartamento_id}: {e}', 'error')
         return jsonify({'status': 'error', 'message': f'Erro ao limpar dados: {e}'}), 500
 
+@super_admin_bp.route('/sincronizacao-completa/<int:apartamento_id>', methods=['POST'])
+@login_required
+@super_admin_required
+def sincronizacao_completa_apartamento(apartamento_id):
+    """Apaga as marcas d'água da coleta do apartamento: a próxima sincronização diária coleta tudo desde janeiro."""
+    try:
+        with engine.begin() as conn:
+            watermarks_coleta.invalidar(conn, apartamento_id)
+        flash(f'A próxima sincronização do apartamento {apartamento_id} será completa.', 'success')
+        return jsonify({'status': 'success', 'message': 'Marcas da coleta apagadas.'})
+    except Exception as e:
+        flash(f'Erro ao agendar a sincronização completa do apartamento {apartamento_id}: {e}', 'error')
+        return jsonify({'status': 'error', 'message': f'Erro ao apagar as marcas da coleta: {e}'}), 500
+
 @super_admin_bp.route('/criar', methods=['GET', 'POST'])
 @login_required
 @super_admin_required
@@ -0,0 +1,228 @@
+# cache_dados.py
+"""
+Cache dos DataFrames limpos por apartamento (tenant).
+
+Cada entrada é identificada por (tabela, apartamento_id, versao_dados, ...).
+A versão de dados de um apartamento só muda quando uma importação grava
+novos dados (ver `bump_data_version`), então uma entrada nunca precisa
+ser invalidada explicitamente: ela simplesmente deixa de ser consultada.
+
+- Camada 1: LRU em memória do processo, limitada por número de itens e MB.
+- Camada 2 (opcional): Redis, compartilhado entre processos/instâncias.
+  A versão de dados fica sempre no Redis quando REDIS_URL está definida,
+  para que uma importação feita pelo worker invalide o cache do web.
+  Enquanto o Redis não responde, a versão é desconhecida e o cache é
+  ignorado (tudo é recalculado), em vez de servir uma versão que pode já
+  ter sido trocada por outro processo.
+"""
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+REDIS_URL = os.getenv('REDIS_URL')
+CACHE_DF_MAX_ITENS = int(os.getenv('CACHE_DF_MAX_ITENS', '64'))
+CACHE_DF_MAX_MB = float(os.getenv('CACHE_DF_MAX_MB', '256'))
+CACHE_DF_TTL_SEGUNDOS = int(os.getenv('CACHE_DF_TTL_SEGUNDOS', '3600'))
+# Guardar também os DataFrames (pickle) no Redis. Desligado por padrão: só compensa
+# com várias instâncias web, e cada entrada ocupa memória do Redis.
+CACHE_DF_REDIS = os.getenv('CACHE_DF_REDIS', 'false').lower() in ('1', 'true', 'sim')
+CACHE_DF_REDIS_MAX_MB = float(os.getenv('CACHE_DF_REDIS_MAX_MB', '32'))
+
+_PREFIXO_VERSAO = 'dashboard:versao_dados'
+_PREFIXO_DF = 'dashboard:df'
+
+_lock = threading.Lock()
+_entradas = OrderedDict()  # chave -> (df, tamanho_bytes, expira_em)
+_total_bytes = 0
+_versoes_locais = {}
+
+_redis_conn = None
+if redis is not None and REDIS_URL:
+    try:
+        _redis_conn = redis.Redis.from_url(REDIS_URL, socket_timeout=2, socket_connect_timeout=2)
+    except Exception as e:
+        print(f"AVISO: Cache de dados sem Redis (URL inválida?). Erro: {e}")
+        _redis_conn = None
+
+
+def get_redis():
+    """Retorna a conexão Redis usada pelo cache, ou None se indisponível."""
+    return _redis_conn
+
+
+def get_data_version(apartamento_id: int) -> int:
+    """
+    Versão atual dos dados importados de um apartamento. None se ela fica no Redis e
+    ele não respondeu: quem usa a versão como chave de cache não deve usar o cache.
+    """
+    if _redis_conn is not None:
+        try:
+            valor = _redis_conn.get(f"{_PREFIXO_VERSAO}:{apartamento_id}")
+            return int(valor) if valor is not None else 0
+        except Exception as e:
+            print(f"AVISO: Falha ao ler versão de dados no Redis; cache ignorado. Erro: {e}")
+            return None
+    return _versoes_locais.get(apartamento_id, 0)
+
+
+def bump_data_version(apartamento_id: int) -> int:
+    """
+    Incrementa a versão de dados do apartamento. Deve ser chamada sempre que uma
+    importação (ou limpeza) altera as tabelas relFil* daquele apartamento.
+    """
+    nova_versao = None
+    if _redis_conn is not None:
+        try:
+            nova_versao = int(_redis_conn.incr(f"{_PREFIXO_VERSAO}:{apartamento_id}"))
+        except Exception as e:
+            print(f"AVISO: Falha ao incrementar versão de dados no Redis. Erro: {e}")
+
+    with _lock:
+        if nova_versao is None:
+            nova_versao = _versoes_locais.get(apartamento_id, 0) + 1
+        _versoes_locais[apartamento_id] = nova_versao
+        _remover_entradas_do_apartamento(apartamento_id)
+
+    print(f"[CACHE] Versão de dados do apartamento {apartamento_id} agora é {nova_versao}.")
+    return nova_versao
+
+
+def _remover_entradas_do_apartamento(apartamento_id: int):
+    """Libera a memória das entradas antigas do apartamento (chamar com _lock adquirido)."""
+    global _total_bytes
+    for chave in [c for c in _entradas if c[1] == apartamento_id]:
+        _, tamanho, _ = _entradas.pop(chave)
+        _total_bytes -= tamanho
+
+
+def _tamanho_df(df) -> int:
+    """Tamanho aproximado em bytes de um DataFrame ou de um dicionário/lista de DataFrames."""
+    if isinstance(df, dict):
+        return sum(_tamanho_df(v) for v in df.values())
+    if isinstance(df, (list, tuple)):
+        return sum(_tamanho_df(v) for v in df)
+    try:
+        return int(df.memory_usage(deep=True).sum())
+    except Exception:
+        return 0
+
+
+def copiar(valor):
+    """Cópia profunda de DataFrames (também dentro de dicionários), para o chamador poder alterá-los."""
+    if isinstance(valor, dict):
+        return {k: copiar(v) for k, v in valor.items()}
+    if hasattr(valor, 'copy'):
+        return valor.copy()
+    return valor
+
+
+def _chave_redis(chave) -> str:
+    return f"{_PREFIXO_DF}:" + ':'.join(str(parte) for parte in chave)
+
+
+def _guardar_local(chave, df):
+    global _total_bytes
+    tamanho = _tamanho_df(df)
+    limite_bytes = CACHE_DF_MAX_MB * 1024 * 1024
+    if tamanho > limite_bytes:
+        print(f"[CACHE] DataFrame {chave[0]} ({tamanho / 1048576:.1f} MB) maior que o limite do cache; não será guardado.")
+        return
+
+    with _lock:
+        if chave in _entradas:
+            _, tamanho_antigo, _ = _entradas.pop(chave)
+            _total_bytes -= tamanho_antigo
+        _entradas[chave] = (df, tamanho, time.time() + CACHE_DF_TTL_SEGUNDOS)
+        _total_bytes += tamanho
+        # Despejo LRU por quantidade e por memória
+        while _entradas and (len(_entradas) > CACHE_DF_MAX_ITENS or _total_bytes > limite_bytes):
+            _, (_, tamanho_removido, _) = _entradas.popitem(last=False)
+            _total_bytes -= tamanho_removido
+
+
+def _obter_local(chave):
+    global _total_bytes
+    with _lock:
+        entrada = _entradas.get(chave)
+        if entrada is None:
+            return None
+        df, tamanho, expira_em = entrada
+        if expira_em < time.time():
+            _entradas.pop(chave)
+            _total_bytes -= tamanho
+            return None
+        _entradas.move_to_end(chave)
+        return df
+
+
+def obter_ou_carregar_dataframe(tabela: str, apartamento_id: int, carregar, variante=()):
+    """
+    Retorna o DataFrame de `tabela` para o apartamento a partir do cache ou, em caso
+    de falta, chamando `carregar()` e guardando o resultado.
+
+    `variante` diferencia cargas parciais da mesma tabela (filtros, colunas).
+    O chamador sempre recebe uma cópia, podendo alterá-la livremente.
+    """
+    return obter_ou_calcular(tabela, apartamento_id, carregar, variante)
+
+
+def obter_ou_calcular(nome: str, apartamento_id: int, calcular, variante=()):
+    """
+    Versão genérica de obter_ou_carregar_dataframe: `calcular()` pode devolver um
+    DataFrame ou um dicionário de DataFrames (ex.: o bundle do dashboard).
+    Resultados None não são guardados. Sem versão de dados (Redis fora), calcula sem cache.
+    """
+    versao = get_data_version(apartamento_id)
+    if versao is None:
+        return calcular()
+    chave = (nome, apartamento_id, versao) + tuple(variante)
+
+    valor = _obter_local(chave)
+    if valor is not None:
+        return copiar(valor)
+
+    if CACHE_DF_REDIS and _redis_conn is not None:
+        try:
+            dados = _redis_conn.get(_chave_redis(chave))
+            if dados is not None:
+                valor = pickle.loads(dados)
+                _guardar_local(chave, valor)
+                return copiar(valor)
+        except Exception as e:
+            print(f"AVISO: Falha ao ler DataFrame do Redis. Erro: {e}")
+
+    valor = calcular()
+    if valor is None:
+        return valor
+
+    _guardar_local(chave, valor)
+    if CACHE_DF_REDIS and _redis_conn is not None:
+        try:
+            dados = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(dados) <= CACHE_DF_REDIS_MAX_MB * 1024 * 1024:
+                _redis_conn.setex(_chave_redis(chave), CACHE_DF_TTL_SEGUNDOS, dados)
+        except Exception as e:
+            print(f"AVISO: Falha ao guardar DataFrame no Redis. Erro: {e}")
+    return copiar(valor)
+
+
+def estatisticas_cache() -> dict:
+    """Resumo do cache em memória deste processo (para diagnóstico)."""
+    with _lock:
+        return {
+            'itens': len(_entradas),
+            'mb': round(_total_bytes / 1048576, 2),
+            'max_itens': CACHE_DF_MAX_ITENS,
+            'max_mb': CACHE_DF_MAX_MB,
+            'redis': _redis_conn is not None,
+        }
@@ -0,0 +1,118 @@
+# cache_resultados.py
+"""
+Cache no Redis dos resultados (JSON) dos endpoints de KPI e gráficos.
+
+Os dados devolvidos por esses endpoints dependem apenas dos dados importados do
+apartamento e dos filtros, então a chave é:
+    dashboard:resultado:<namespace>:<apartamento_id>:<versao_dados>:<hash dos filtros>
+Quando uma importação incrementa a versão de dados (cache_dados.bump_data_version),
+as entradas antigas deixam de ser consultadas e expiram pelo TTL.
+
+Sem REDIS_URL o cache fica desligado e os resultados são sempre recalculados.
+"""
+import datetime
+import decimal
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from werkzeug.http import http_date
+
+import cache_dados
+
+CACHE_RESULTADOS_TTL_SEGUNDOS = int(os.getenv('CACHE_RESULTADOS_TTL_SEGUNDOS', '900'))
+CACHE_RESULTADOS_MAX_KB = int(os.getenv('CACHE_RESULTADOS_MAX_KB', '512'))
+CACHE_RESULTADOS_ATIVO = os.getenv('CACHE_RESULTADOS_ATIVO', 'true').lower() in ('1', 'true', 'sim')
+
+_PREFIXO = 'dashboard:resultado'
+_CHAVE_ESTATISTICAS = 'dashboard:resultado:estatisticas'
+
+
+def _json_padrao(valor):
+    """Converte tipos do numpy/pandas para JSON, no mesmo formato que o jsonify do Flask usaria."""
+    if isinstance(valor, np.integer):
+        return int(valor)
+    if isinstance(valor, np.floating):
+        return float(valor)
+    if isinstance(valor, np.bool_):
+        return bool(valor)
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if valor is pd.NaT:
+        return None
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return http_date(valor)
+    if isinstance(valor, pd.Period):
+        return str(valor)
+    if isinstance(valor, decimal.Decimal):
+        return str(valor)
+    raise TypeError(f"Objeto do tipo {type(valor).__name__} não é serializável em JSON")
+
+
+def chave_resultado(namespace: str, apartamento_id: int, filtros: tuple) -> str:
+    """Monta a chave do resultado a partir da tupla de filtros já normalizada (None sem versão de dados)."""
+    versao = cache_dados.get_data_version(apartamento_id)
+    if versao is None:
+        return None
+    hash_filtros = hashlib.sha1(json.dumps(list(filtros), default=str).encode('utf-8')).hexdigest()
+    return f"{_PREFIXO}:{namespace}:{apartamento_id}:{versao}:{hash_filtros}"
+
+
+def _contar(namespace: str, evento: str):
+    redis_conn = cache_dados.get_redis()
+    try:
+        redis_conn.hincrby(_CHAVE_ESTATISTICAS, f"{namespace}:{evento}", 1)
+    except Exception:
+        pass
+
+
+def obter_ou_calcular_resultado(namespace: str, apartamento_id: int, filtros: tuple, calcular):
+    """
+    Retorna o resultado (já convertido para tipos JSON) do cache ou, em caso de falta,
+    chamando `calcular()` e guardando o JSON no Redis com TTL.
+    Resultados maiores que CACHE_RESULTADOS_MAX_KB não são guardados.
+    """
+    redis_conn = cache_dados.get_redis()
+    if not CACHE_RESULTADOS_ATIVO or redis_conn is None:
+        return json.loads(json.dumps(calcular(), default=_json_padrao))
+
+    chave = chave_resultado(namespace, apartamento_id, filtros)
+    if chave is None:
+        return json.loads(json.dumps(calcular(), default=_json_padrao))
+    try:
+        dados = redis_conn.get(chave)
+        if dados is not None:
+            _contar(namespace, 'hit')
+            return json.loads(dados)
+    except Exception as e:
+        print(f"AVISO: Falha ao ler resultado do cache ({namespace}). Erro: {e}")
+
+    _contar(namespace, 'miss')
+    dados = json.dumps(calcular(), default=_json_padrao)
+    if len(dados) <= CACHE_RESULTADOS_MAX_KB * 1024:
+        try:
+            redis_conn.setex(chave, CACHE_RESULTADOS_TTL_SEGUNDOS, dados)
+        except Exception as e:
+            print(f"AVISO: Falha ao guardar resultado no cache ({namespace}). Erro: {e}")
+    else:
+        print(f"[CACHE] Resultado de '{namespace}' ({len(dados) // 1024} KB) maior que o limite; não será guardado.")
+    return json.loads(dados)
+
+
+def estatisticas_resultados() -> dict:
+    """Contadores de acertos/faltas por namespace, lidos do Redis."""
+    redis_conn = cache_dados.get_redis()
+    if redis_conn is None:
+        return {}
+    try:
+        brutos = redis_conn.hgetall(_CHAVE_ESTATISTICAS)
+    except Exception as e:
+        print(f"AVISO: Falha ao ler estatísticas do cache de resultados. Erro: {e}")
+        return {}
+    estatisticas = {}
+    for campo, valor in brutos.items():
+        namespace, evento = campo.decode().rsplit(':', 1)
+        estatisticas.setdefault(namespace, {'hit': 0, 'miss': 0})[evento] = int(valor)
+    return estatisticas
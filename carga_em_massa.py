@@ -0,0 +1,185 @@
+# carga_em_massa.py
+"""
+Carga em massa das planilhas importadas (substitui to_sql + DELETE ... IN (SELECT DISTINCT CAST ...)).
+
+1. `carregar_staging`: cria uma tabela TEMP (só desta sessão, apagada no COMMIT) com
+   todas as colunas como TEXT e envia o DataFrame limpo por COPY FROM STDIN (CSV).
+   Tabelas temporárias não geram WAL.
+2. `descartar_inalterados`: compara o hash das linhas do staging com COLUNA_HASH das
+   linhas gravadas, chave a chave, e tira do staging as chaves sem mudança. Assim o
+   merge, o fato_diario, os veículos e o cache só veem chaves novas ou alteradas.
+3. `mesclar_staging`: um DELETE ... USING pela chave já convertida para o tipo da coluna
+   (usa o índice (apartamento_id, chave), ver a migração 9) e um único INSERT ... SELECT
+   com as conversões de tipo.
+
+As tabelas relFil* não têm restrição de unicidade (e as planilhas podem repetir chaves),
+por isso a troca (das chaves novas ou alteradas) é DELETE + INSERT e não INSERT ... ON CONFLICT.
+Tudo roda na transação da importação: se algo falhar, nada é gravado.
+
+Como o staging é privado da sessão, importações de apartamentos diferentes (ou de
+tabelas diferentes) rodam em paralelo em vários workers. Duas importações da mesma
+tabela para o mesmo apartamento são serializadas por `bloquear_destino`.
+"""
+import io
+
+from sqlalchemy import text
+
+import esquema
+from filtros_sql import _q
+
+TABELA_STAGING = 'temp_import'
+TABELA_CHAVES = 'temp_import_chaves'
+# Hash das colunas de negócio de cada linha (migração 11), gravado pelo merge
+COLUNA_HASH = 'hash_linha'
+
+_TIPOS_INTEIROS = {'integer', 'bigint', 'smallint'}
+_TIPOS_SEM_CONVERSAO = {'text', 'character varying', 'character', 'ARRAY', 'USER-DEFINED'}
+
+
+def tipos_colunas(conn, table_name: str) -> dict:
+    """nome em minúsculas -> (nome real, tipo) das colunas da tabela de destino (ver esquema.py)."""
+    return esquema.tipos_colunas(table_name, conn)
+
+
+def expressao_tipada(alias: str, coluna: str, tipo: str) -> str:
+    """Converte a coluna TEXT do staging para o tipo da coluna de destino."""
+    origem = f'{alias}.{_q(coluna)}'
+    if tipo in _TIPOS_SEM_CONVERSAO:
+        return origem
+    if tipo in _TIPOS_INTEIROS:
+        # O pandas costuma trazer inteiros como float ('12.0'): passa por NUMERIC, como o INSERT do to_sql fazia
+        return f'CAST(CAST({origem} AS NUMERIC) AS {tipo})'
+    return f'CAST({origem} AS {tipo})'
+
+
+def expressao_hash(alias: str, colunas: list, tipos: dict) -> str:
+    """md5 da linha com as colunas já convertidas (em ordem alfabética, para não depender da ordem da planilha)."""
+    valores = ', '.join(expressao_tipada(alias, c, tipos[c.lower()][1]) for c in sorted(colunas, key=str.lower))
+    return f'md5(ROW({valores})::text)'
+
+
+def bloquear_destino(conn, table_name: str, apartamento_id: int):
+    """Lock (até o fim da transação) da tabela de destino para o apartamento."""
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:tabela), :apt_id)"), {'tabela': table_name, 'apt_id': apartamento_id})
+
+
+def preparar_staging(conn, table_name: str, colunas_planilha: list, apartamento_id: int) -> dict:
+    """
+    Cria TABELA_STAGING com as colunas da planilha que existem em `table_name` (exceto
+    apartamento_id, informado no merge, e COLUNA_HASH, calculada no merge). Retorna {coluna da planilha: nome real}.
+    Antes, espera outras importações da mesma tabela e apartamento terminarem.
+    """
+    bloquear_destino(conn, table_name, apartamento_id)
+    tipos = tipos_colunas(conn, table_name)
+    mapa = {c: tipos[c.lower()][0] for c in colunas_planilha if c.lower() in tipos and c.lower() not in ('apartamento_id', COLUNA_HASH)}
+
+    definicao = ', '.join(f'{_q(c)} TEXT' for c in mapa.values())
+    conn.execute(text(f'CREATE TEMP TABLE {TABELA_STAGING} ({definicao}) ON COMMIT DROP'))
+    return mapa
+
+
+def copiar_para_staging(conn, df, mapa: dict) -> int:
+    """Envia as linhas de `df` para TABELA_STAGING por COPY (pode ser chamado uma vez por bloco)."""
+    buffer = io.StringIO()
+    df[list(mapa)].to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {TABELA_STAGING} ({', '.join(_q(c) for c in mapa.values())}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+    finally:
+        cursor.close()
+    return len(df)
+
+
+def carregar_staging(conn, table_name: str, df, apartamento_id: int) -> list:
+    """preparar_staging + copiar_para_staging para um DataFrame inteiro. Retorna os nomes reais das colunas."""
+    mapa = preparar_staging(conn, table_name, list(df.columns), apartamento_id)
+    copiar_para_staging(conn, df, mapa)
+    return list(mapa.values())
+
+
+def condicao_chaves_staging(conn, alias: str, table_name: str, key_columns: list) -> str:
+    """
+    Condição SQL (para WHERE) que seleciona as linhas de `alias` (tabela `table_name`)
+    cujas chaves estão no staging, comparando já no tipo da coluna.
+    """
+    tipos = tipos_colunas(conn, table_name)
+    comparacoes = ' AND '.join(
+        f'{alias}.{_q(tipos[c.lower()][0])} = {expressao_tipada("s", tipos[c.lower()][0], tipos[c.lower()][1])}'
+        for c in key_columns
+    )
+    return f'EXISTS (SELECT 1 FROM {TABELA_STAGING} s WHERE {comparacoes})'
+
+
+def descartar_inalterados(conn, table_name: str, apartamento_id: int, key_columns: list, colunas: list) -> dict:
+    """
+    Tira do staging as chaves cujas linhas (mesma quantidade e mesmos hashes) já estão
+    gravadas. As tabelas podem repetir chaves, então a comparação é pelo conjunto de
+    linhas de cada chave. Linhas gravadas sem hash (antes da migração 11 ou pela
+    importação avulsa) contam como alteradas.
+    Retorna {'novas', 'alteradas', 'inalteradas'} (em chaves), ou None se a tabela
+    não tem COLUNA_HASH (nesse caso o staging fica como está).
+    """
+    tipos = tipos_colunas(conn, table_name)
+    if COLUNA_HASH not in tipos:
+        return None
+    chaves = [tipos[c.lower()][0] for c in key_columns]
+    lista_chaves = ', '.join(_q(c) for c in chaves)
+    chaves_tipadas = ', '.join(f'{expressao_tipada("s", c, tipos[c.lower()][1])} AS {_q(c)}' for c in chaves)
+    posicoes = ', '.join(str(i) for i in range(1, len(chaves) + 1))
+    hash_staging = expressao_hash('s', colunas, tipos)
+    juncao = ' AND '.join(f't.{_q(c)} = n.{_q(c)}' for c in chaves)
+    conn.execute(text(f"""
+        CREATE TEMP TABLE {TABELA_CHAVES} ON COMMIT DROP AS
+        WITH novos AS (
+            SELECT {chaves_tipadas}, count(*) AS linhas, string_agg({hash_staging}, ',' ORDER BY {hash_staging}) AS hashes
+            FROM {TABELA_STAGING} s GROUP BY {posicoes}
+        ), atuais AS (
+            SELECT {', '.join(f't.{_q(c)}' for c in chaves)}, count(*) AS linhas,
+                   string_agg(coalesce(t.{_q(COLUNA_HASH)}, ''), ',' ORDER BY coalesce(t.{_q(COLUNA_HASH)}, '')) AS hashes
+            FROM {_q(table_name)} t JOIN novos n ON {juncao}
+            WHERE t.apartamento_id = :apt_id GROUP BY {posicoes}
+        )
+        SELECT {lista_chaves}, a.linhas IS NULL AS nova, a.linhas = n.linhas AND a.hashes = n.hashes AS inalterada
+        FROM novos n LEFT JOIN atuais a USING ({lista_chaves})
+    """), {'apt_id': apartamento_id})
+
+    novas, inalteradas, total = conn.execute(text(f"""
+        SELECT count(*) FILTER (WHERE nova), count(*) FILTER (WHERE inalterada), count(*) FROM {TABELA_CHAVES}
+    """)).one()
+    comparacoes = ' AND '.join(f'c.{_q(c)} = {expressao_tipada("s", c, tipos[c.lower()][1])}' for c in chaves)
+    conn.execute(text(f'DELETE FROM {TABELA_STAGING} s USING {TABELA_CHAVES} c WHERE c.inalterada AND {comparacoes}'))
+    return {'novas': novas, 'alteradas': total - novas - inalteradas, 'inalteradas': inalteradas}
+
+
+def mesclar_staging(conn, table_name: str, apartamento_id: int, key_columns: list, colunas: list) -> tuple:
+    """
+    Troca as linhas do apartamento cujas chaves estão no staging pelas do staging
+    (gravando COLUNA_HASH, se a tabela tiver). Retorna (removidas, inseridas).
+    """
+    tipos = tipos_colunas(conn, table_name)
+    chaves_tipadas = ', '.join(
+        f'{expressao_tipada("s", tipos[c.lower()][0], tipos[c.lower()][1])} AS {_q(tipos[c.lower()][0])}' for c in key_columns
+    )
+    juncao = ' AND '.join(f't.{_q(tipos[c.lower()][0])} = k.{_q(tipos[c.lower()][0])}' for c in key_columns)
+    sql_delete = text(f"""
+        DELETE FROM {_q(table_name)} t
+        USING (SELECT DISTINCT {chaves_tipadas} FROM {TABELA_STAGING} s) k
+        WHERE t.apartamento_id = :apt_id AND {juncao}
+    """)
+    removidas = conn.execute(sql_delete, {'apt_id': apartamento_id}).rowcount
+
+    destino = [_q(c) for c in colunas]
+    valores = [expressao_tipada('s', c, tipos[c.lower()][1]) for c in colunas]
+    if COLUNA_HASH in tipos:
+        destino.append(_q(COLUNA_HASH))
+        valores.append(expressao_hash('s', colunas, tipos))
+    sql_insert = text(f"""
+        INSERT INTO {_q(table_name)} (apartamento_id, {', '.join(destino)})
+        SELECT :apt_id, {', '.join(valores)} FROM {TABELA_STAGING} s
+    """)
+    inseridas = conn.execute(sql_insert, {'apt_id': apartamento_id}).rowcount
+    return removidas, inseridas
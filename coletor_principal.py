@@ -2,10 +2,12 @@
 
 import os
 import sys
-import time
 import logic
 import shutil
+import threading
 import database as db
+import watermarks_coleta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -15,11 +17,33 @@ from robos.coletor_fat_viagens import executar_coleta_fat_viagens
 from robos.coletor_contas_pagar import executar_coleta_contas_pagar
 from robos.coletor_contas_receber import executar_coleta_contas_receber
 from robos.coletor_acerto_motorista import executar_coleta_acerto_motorista
+from robos.sessao_coleta import SessaoColeta
+from robos.pool_navegadores import PoolNavegadores, esvaziar_pasta
+
+# Tempo máximo da coleta de um apartamento em executar_coletas_em_paralelo (todos os períodos dele)
+COLETA_APARTAMENTO_TIMEOUT = int(os.getenv('COLETA_APARTAMENTO_TIMEOUT', '3600'))
+
+# Relatório (nome do arquivo baixado, sem a extensão) -> robô que o coleta, na ordem de execução
+ROBOS = {
+    'relFilViagensCliente': executar_coleta_viagens,
+    'relFilDespesasGerais': executar_coleta_despesas,
+    'relFilViagensFatCliente': executar_coleta_fat_viagens,
+    'relFilContasPagarDet': executar_coleta_contas_pagar,
+    'relFilContasReceber': executar_coleta_contas_receber,
+    'relFilAcertoMot': executar_coleta_acerto_motorista,
+}
 
 # --- ALTERAÇÃO 1: Adiciona parâmetros de data ---
-def executar_todas_as_coletas(apartamento_id: int, start_date_str: str = None, end_date_str: str = None):
+def executar_todas_as_coletas(apartamento_id: int, start_date_str: str = None, end_date_str: str = None,
+                              navegador=None, processos: int = None, relatorios: list = None):
     """
     Executa cada robô. Se datas forem fornecidas, os robôs as usarão.
+    Com `navegador` (empréstimo do pool), usa o Chrome e a pasta de downloads dele;
+    `processos` é repassado à importação dos arquivos baixados; `relatorios`
+    restringe os robôs executados (chaves de ROBOS).
+
+    Com datas, os relatórios coletados e importados sem erro avançam a marca
+    d'água da coleta (ver watermarks_coleta.py). Retorna a lista deles.
     """
     # --- ALTERAÇÃO 2: Log mais informativo ---
     if start_date_str and end_date_str:
@@ -27,34 +51,126 @@ def executar_todas_as_coletas(apartamento_id: int, start_date_str: str = None, e
     else:
         db.logar_progresso(apartamento_id, f"--- ORQUESTRADOR: Iniciando coleta com datas da configuração ---")
 
-    pasta_principal = os.path.dirname(os.path.abspath(__file__))
-    pasta_downloads = os.path.join(pasta_principal, 'downloads', str(apartamento_id))
-    if os.path.exists(pasta_downloads):
-        shutil.rmtree(pasta_downloads)
+    if navegador is not None:
+        # A pasta do navegador emprestado continua em uso pelo Chrome: só é esvaziada
+        pasta_downloads = navegador.pasta_downloads
+        esvaziar_pasta(pasta_downloads)
+    else:
+        pasta_principal = os.path.dirname(os.path.abspath(__file__))
+        pasta_downloads = os.path.join(pasta_principal, 'downloads', str(apartamento_id))
+        if os.path.exists(pasta_downloads):
+            shutil.rmtree(pasta_downloads)
 
     robos_para_executar = [
-        executar_coleta_viagens,
-        executar_coleta_despesas,
-        executar_coleta_fat_viagens,
-        executar_coleta_contas_pagar,
-        executar_coleta_contas_receber,
-        executar_coleta_acerto_motorista
+        (relatorio, funcao_robo) for relatorio, funcao_robo in ROBOS.items()
+        if relatorios is None or relatorio in relatorios
     ]
 
-    for funcao_robo in robos_para_executar:
-        nome_do_robo = funcao_robo.__name__
-        try:
-            # --- ALTERAÇÃO 3: Repassa as datas para cada robô ---
-            funcao_robo(apartamento_id, start_date_str=start_date_str, end_date_str=end_date_str)
-            db.logar_progresso(apartamento_id, f">>> Robô {nome_do_robo} finalizado com sucesso.")
-        except Exception as e:
-            db.logar_progresso(apartamento_id, f">>> ERRO CRÍTICO ao executar {nome_do_robo}. Erro: {e}")
-        
-        time.sleep(2)
+    # Um só navegador, autenticado uma vez, para todos os robôs (ver robos/sessao_coleta.py)
+    coletados = []
+    with SessaoColeta(apartamento_id, navegador=navegador) as sessao:
+        for relatorio, funcao_robo in robos_para_executar:
+            nome_do_robo = funcao_robo.__name__
+            try:
+                # --- ALTERAÇÃO 3: Repassa as datas (e a sessão) para cada robô ---
+                if funcao_robo(apartamento_id, start_date_str=start_date_str, end_date_str=end_date_str, sessao=sessao):
+                    coletados.append(relatorio)
+                db.logar_progresso(apartamento_id, f">>> Robô {nome_do_robo} finalizado com sucesso.")
+            except Exception as e:
+                db.logar_progresso(apartamento_id, f">>> ERRO CRÍTICO ao executar {nome_do_robo}. Erro: {e}")
 
     db.logar_progresso(apartamento_id, "Todos os roteiros de coleta foram executados. Iniciando processamento dos arquivos baixados...")
-    logic.processar_downloads_na_pasta(apartamento_id)
+    resultados = logic.processar_downloads_na_pasta(apartamento_id, pasta_downloads=pasta_downloads, processos=processos) or {}
+    concluidos = [
+        relatorio for relatorio in coletados
+        if any(nome.startswith(relatorio + '.') and not isinstance(resultado, Exception) for nome, resultado in resultados.items())
+    ]
+    if start_date_str and end_date_str and concluidos:
+        try:
+            with db.engine.begin() as conn:
+                watermarks_coleta.registrar(conn, apartamento_id, concluidos, start_date_str, end_date_str)
+        except Exception as e:
+            db.logar_progresso(apartamento_id, f"Aviso: não foi possível registrar a marca d'água da coleta. Erro: {e}")
     db.logar_progresso(apartamento_id, "--- ORQUESTRADOR FINALIZADO COM SUCESSO ---")
+    return concluidos
+
+def executar_coletas_em_paralelo(periodos_por_apartamento: dict, tamanho_pool: int = None,
+                                 timeout_apartamento: int = None):
+    """
+    Coleta vários apartamentos ao mesmo tempo, cada um com um navegador emprestado
+    do pool (ver robos/pool_navegadores.py). `periodos_por_apartamento` é
+    {apartamento_id: [(data_inicial, data_final, relatorios), ...]}, como gerado
+    por watermarks_coleta.planejar.
+
+    Os períodos de um mesmo apartamento rodam em sequência no mesmo navegador
+    (mesma pasta de downloads e mesmo login no ERP); apartamentos diferentes rodam
+    em paralelo, até o tamanho do pool. Os demais esperam um navegador livre.
+
+    Cada apartamento tem o seu prazo (`timeout_apartamento`, padrão
+    COLETA_APARTAMENTO_TIMEOUT), contado a partir do empréstimo do navegador:
+    estourado, o navegador dele é fechado e os períodos restantes não rodam, sem
+    afetar os outros apartamentos. Retorna {apartamento_id: situação}.
+    """
+    timeout_apartamento = timeout_apartamento or COLETA_APARTAMENTO_TIMEOUT
+    pool = PoolNavegadores(tamanho_pool)
+
+    def _coletar_apartamento(apartamento_id, periodos):
+        with pool.emprestar() as navegador:
+            esgotado = threading.Event()
+
+            def _esgotar_prazo():
+                esgotado.set()
+                db.logar_progresso(apartamento_id, f">>> Coleta excedeu {timeout_apartamento} segundos. Fechando o navegador.")
+                # Os robôs em andamento falham no próximo comando ao navegador
+                navegador.fechar()
+
+            relogio = threading.Timer(timeout_apartamento, _esgotar_prazo)
+            relogio.daemon = True
+            relogio.start()
+            try:
+                for start_date_str, end_date_str, relatorios in periodos:
+                    if esgotado.is_set():
+                        break
+                    # Os apartamentos já rodam em paralelo: a importação de cada um fica num processo só
+                    executar_todas_as_coletas(
+                        apartamento_id, start_date_str, end_date_str,
+                        navegador=navegador, processos=1, relatorios=relatorios
+                    )
+            finally:
+                relogio.cancel()
+            if esgotado.is_set():
+                raise TimeoutError(f"tempo esgotado ({timeout_apartamento} segundos)")
+
+    situacoes = {}
+    executor = ThreadPoolExecutor(max_workers=pool.tamanho)
+    try:
+        futuros = {
+            executor.submit(_coletar_apartamento, apartamento_id, periodos): apartamento_id
+            for apartamento_id, periodos in periodos_por_apartamento.items()
+        }
+        for futuro in as_completed(futuros):
+            apartamento_id = futuros[futuro]
+            try:
+                futuro.result()
+                situacoes[apartamento_id] = 'concluída'
+                print(f"--> Coleta do apartamento {apartamento_id} concluída.")
+            except Exception as e:
+                situacoes[apartamento_id] = f"erro: {e}"
+                db.logar_progresso(apartamento_id, f">>> ERRO CRÍTICO na coleta do apartamento {apartamento_id}. Erro: {e}")
+        executor.shutdown()
+    except BaseException:
+        # Ex.: timeout do job no RQ. Os apartamentos que ainda não começaram são cancelados,
+        # e os que estão coletando param quando o pool fecha os navegadores (finally).
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        pool.fechar()
+
+    falhas = {apartamento_id: situacao for apartamento_id, situacao in situacoes.items() if situacao != 'concluída'}
+    print(f"--> Coleta em paralelo: {len(situacoes) - len(falhas)} de {len(situacoes)} apartamentos concluídos.")
+    for apartamento_id, situacao in falhas.items():
+        print(f"    -> Apartamento {apartamento_id}: {situacao}")
+    return situacoes
 
 if __name__ == '__main__':
     # ... (bloco de teste permanece o mesmo)
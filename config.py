@@ -159,4 +159,9 @@ TABLE_PRIMARY_KEYS = {
     "relFilContasPagarDet": ["codItemNota"],
     "relFilContasReceber": ["codDuplicataReceber"],
     "relFilAcertoMot": ["codAcertoMotorista"]
-}
\ No newline at end of file
+}
+
+# Linhas da planilha que entram na importação: (coluna, operador, valor), só aplicado se a coluna existir
+TABLE_ROW_FILTERS = {
+    "relFilDespesasGerais": [("VED", "!=", "E"), ("despesa", "==", "S")]
+}
@@ -13,22 +13,87 @@ import logic
 import database as db_module # Importa o módulo database.py
 import psycopg2
 import psycopg2.extras
+import cache_dados
+import fato_diario
+import filtros_sql
+import opcoes_filtro
+import veiculos
 
 
 # Substitua esta função em data_manager.py
 
-def get_data_as_dataframe(table_name: str, apartamento_id: int) -> pd.DataFrame:
+# Tabelas que só mudam por importação (e, portanto, pela versão de dados do apartamento)
+_TABELAS_CACHEAVEIS = {info['table'] for info in config.EXCEL_FILES_CONFIG.values()}
+
+def get_data_as_dataframe(table_name: str, apartamento_id: int, colunas: list = None) -> pd.DataFrame:
     """
     Busca todos os dados de uma tabela para um apartamento específico e padroniza os nomes das colunas,
     removendo espaços no início e no fim.
+    `colunas` (opcional) limita o SELECT às colunas informadas, resolvidas sem diferenciar maiúsculas;
+    nomes que não existem na tabela são ignorados.
+    As tabelas importadas (relFil*) são servidas do cache por (tabela, apartamento, versão de dados).
+    """
+    colunas_sql = _resolver_colunas(table_name, colunas)
+    if table_name in _TABELAS_CACHEAVEIS:
+        variante = ('colunas',) + tuple(colunas_sql) if colunas_sql else ()
+        df = cache_dados.obter_ou_carregar_dataframe(
+            table_name, apartamento_id, lambda: _carregar_dataframe(table_name, apartamento_id, colunas=colunas_sql), variante
+        )
+    else:
+        df = _carregar_dataframe(table_name, apartamento_id, colunas=colunas_sql)
+    return df if df is not None else pd.DataFrame()
+
+def get_filtered_dataframe(table_name: str, apartamento_id: int, start_date=None, end_date=None, placa_filter="Todos", filial_filter=None, tipo_negocio_filter="Todos", colunas: list = None) -> pd.DataFrame:
+    """
+    Carrega apenas as linhas de uma tabela relFil* que atendem aos filtros do dashboard.
+    Os filtros são aplicados no banco (ver filtros_sql) com a mesma semântica de apply_filters_to_df.
+    """
+    if not filtros_sql.filtros_ativos(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter) \
+            and table_name not in (filtros_sql.TABELA_FATURAMENTO, filtros_sql.TABELA_ACERTO):
+        return get_data_as_dataframe(table_name, apartamento_id, colunas)
+
+    colunas_sql = _resolver_colunas(table_name, colunas)
+    where_sql, params = filtros_sql.montar_filtro_sql(
+        table_name, apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter
+    )
+    variante = ('filtro',) + filtros_sql.assinatura_filtros(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
+    if colunas_sql:
+        variante += ('colunas',) + tuple(colunas_sql)
+    df = cache_dados.obter_ou_carregar_dataframe(
+        table_name, apartamento_id, lambda: _carregar_dataframe(table_name, apartamento_id, where_sql, params, colunas_sql), variante
+    )
+    return df if df is not None else pd.DataFrame()
+
+def _resolver_colunas(table_name: str, colunas: list) -> list:
+    """
+    Converte a lista de colunas pedida para os nomes reais da tabela (case-insensitive),
+    na ordem da tabela. Retorna [] (SELECT *) quando nada foi pedido ou a tabela não é conhecida.
+    """
+    if not colunas:
+        return []
+    colunas_tabela = db.get_table_columns(table_name)
+    if not colunas_tabela:
+        return []
+    pedidas = {c.lower() for c in colunas} | {'apartamento_id'}
+    return [col for col in colunas_tabela if col.lower() in pedidas]
+
+def _carregar_dataframe(table_name: str, apartamento_id: int, where_sql: str = None, params: dict = None, colunas: list = None):
+    """
+    Leitura efetiva da tabela no banco (sem cache).
+    Retorna None quando a tabela não existe ou a leitura falha, para que o erro não fique em cache.
     """
     if not db.table_exists(table_name):
         print(f"AVISO: Tabela '{table_name}' não existe. Retornando DataFrame vazio.")
-        return pd.DataFrame()
+        return None
     try:
         with db.engine.connect() as conn:
-            query = text(f'SELECT * FROM "{table_name}" WHERE apartamento_id = :apt_id')
-            df = pd.read_sql_query(query, conn, params={"apt_id": apartamento_id})
+            select_sql = ', '.join(f't."{col}"' for col in colunas) if colunas else 't.*'
+            if where_sql:
+                query = text(f'SELECT {select_sql} FROM "{table_name}" t WHERE {where_sql}')
+            else:
+                query = text(f'SELECT {select_sql} FROM "{table_name}" t WHERE t.apartamento_id = :apt_id')
+                params = {"apt_id": apartamento_id}
+            df = pd.read_sql_query(query, conn, params=params)
             
             # CORREÇÃO: Adicionado .strip() para limpar os espaços
             df.columns = [str(col).strip() for col in df.columns]
@@ -40,7 +105,7 @@ def get_data_as_dataframe(table_name: str, apartamento_id: int) -> pd.DataFrame:
             return df
     except Exception as e:
         print(f"ERRO CRÍTICO ao carregar dados da tabela '{table_name}': {e}")
-        return pd.DataFrame()
+        return None
 
 def _get_case_insensitive_column_map(df_columns):
     """Cria um dicionário para mapear nomes de colunas em minúsculas para seus nomes originais."""
@@ -281,55 +346,101 @@ def _get_final_expense_dataframes(df_viagens_cliente, df_despesas_filtrado, df_f
     
     return {'custos': df_custos_final, 'despesas': df_despesas_final, 'tipo_d': df_tipo_d}
 
-def _obter_dados_filtrados_mestre(apartamento_id: int, start_date: datetime, end_date: datetime, placa_filter: str, filial_filter: list, tipo_negocio_filter: str):
+# --- Colunas usadas por cada ponto de entrada (nomes resolvidos sem diferenciar maiúsculas) ---
+# Classificação de despesas, quebra e comissão (_get_final_expense_dataframes)
+_COLUNAS_DESPESAS_CLASSIFICACAO = ['despesa', 'serie', 'liquido', 'vlContabil', 'VED', 'descGrupoD', 'dataControle', 'nomeFil']
+_COLUNAS_VIAGENS_CUSTOS = ['numero', 'dataViagemMotorista', 'dataEmissao', 'valorQuebra', 'nomeFilial', 'nomeFil']
+_COLUNAS_ACERTO_COMISSAO = ['numero', 'tipoFrete', 'vlComissao', 'dataViagemMotorista']
+
+# O resumo lê os totais do fato_diario; das tabelas brutas só precisa da lista de conhecimentos e dos saldos
+COLUNAS_RESUMO = {
+    "relFilViagensFatCliente": ['numero', 'numConhec', 'freteEmpresa'],
+    "relFilContasPagarDet": ['codTransacao', 'liquidoItemNota'],
+    "relFilContasReceber": ['codTransacao', 'valorVenc'],
+}
+COLUNAS_FATURAMENTO_DETALHES = {
+    "relFilViagensCliente": _COLUNAS_VIAGENS_CUSTOS + ['placaVeiculo', 'cidOrigemFormat', 'cidDestinoFormat', 'pesoSaida', 'nomeMotorista', 'freteEmpresa', 'descricaoMercadoria'],
+    "relFilDespesasGerais": _COLUNAS_DESPESAS_CLASSIFICACAO,
+    "relFilViagensFatCliente": ['numero', 'freteEmpresa', 'nomeCliente', 'nomeFilial'],
+    "relFilAcertoMot": _COLUNAS_ACERTO_COMISSAO,
+}
+COLUNAS_DESPESAS_DETALHES = {
+    "relFilViagensCliente": _COLUNAS_VIAGENS_CUSTOS,
+    "relFilDespesasGerais": _COLUNAS_DESPESAS_CLASSIFICACAO + ['placaVeiculo', 'descItemD', 'quantidade'],
+    "relFilViagensFatCliente": ['numero'],
+    "relFilAcertoMot": _COLUNAS_ACERTO_COMISSAO,
+}
+COLUNAS_AUDITORIA_DESPESAS = {
+    "relFilViagensCliente": _COLUNAS_VIAGENS_CUSTOS,
+    "relFilDespesasGerais": _COLUNAS_DESPESAS_CLASSIFICACAO + ['descItemD'],
+    "relFilViagensFatCliente": ['numero'],
+    "relFilAcertoMot": _COLUNAS_ACERTO_COMISSAO,
+}
+
+def _unir_colunas(*mapas) -> dict:
+    unido = {}
+    for mapa in mapas:
+        for tabela, colunas in mapa.items():
+            unido.setdefault(tabela, [])
+            unido[tabela] += [c for c in colunas if c not in unido[tabela]]
+    return unido
+
+# O bundle atende aos detalhes e à auditoria, então carrega a união das colunas deles
+COLUNAS_BUNDLE = _unir_colunas(COLUNAS_FATURAMENTO_DETALHES, COLUNAS_DESPESAS_DETALHES, COLUNAS_AUDITORIA_DESPESAS)
+
+def obter_bundle_dashboard(apartamento_id: int, start_date: datetime, end_date: datetime, placa_filter: str, filial_filter: list, tipo_negocio_filter: str) -> dict:
+    """
+    Retorna o "bundle" do dashboard: os DataFrames filtrados e já classificados em
+    custos/despesas/tipo D, calculados uma única vez por (apartamento, filtros, versão de dados)
+    e compartilhados pelos detalhes de faturamento/despesas e pela auditoria.
+    Cada chamada devolve uma cópia própria, que pode ser alterada pelo chamador.
+    """
+    variante = filtros_sql.assinatura_filtros(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
+    return cache_dados.obter_ou_calcular(
+        'bundle_dashboard', apartamento_id,
+        lambda: _calcular_bundle_dashboard(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter),
+        variante
+    )
+
+def _calcular_bundle_dashboard(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter) -> dict:
+    print(f"[BUNDLE] Calculando dados do dashboard para o apartamento {apartamento_id}...")
+    bundle = _obter_dados_filtrados_mestre(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, colunas=COLUNAS_BUNDLE)
+    bundle["expense_data"] = _get_final_expense_dataframes(
+        bundle["df_viagens_cliente"].copy(), bundle["df_despesas_filtrado"].copy(),
+        bundle["df_flags"].copy(), bundle["df_acerto_motorista_raw"].copy()
+    )
+    return bundle
+
+def _usar_bundle(bundle, apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter) -> dict:
+    """Bundle recebido do chamador (copiado, pois os agregadores alteram os DataFrames) ou obtido do cache."""
+    if bundle is not None:
+        return cache_dados.copiar(bundle)
+    return obter_bundle_dashboard(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
+
+def _obter_dados_filtrados_mestre(apartamento_id: int, start_date: datetime, end_date: datetime, placa_filter: str, filial_filter: list, tipo_negocio_filter: str, colunas: dict = None):
     """
     Função mestre que carrega todos os dados brutos necessários e aplica filtros.
+    `colunas` mapeia tabela -> colunas usadas pelo chamador (ver COLUNAS_*). Quando informado,
+    só as tabelas presentes no mapa são lidas; as demais voltam como DataFrame vazio.
     """
-    # 1. Carrega todos os DataFrames brutos
-    df_viagens_raw = get_data_as_dataframe("relFilViagensCliente", apartamento_id)
-    df_fat_raw = get_data_as_dataframe("relFilViagensFatCliente", apartamento_id)
-    df_despesas_raw = get_data_as_dataframe("relFilDespesasGerais", apartamento_id)
-    df_contas_pagar_raw = get_data_as_dataframe("relFilContasPagarDet", apartamento_id)
-    df_contas_receber_raw = get_data_as_dataframe("relFilContasReceber", apartamento_id)
-    df_acerto_motorista_raw = get_data_as_dataframe("relFilAcertoMot", apartamento_id)
-    df_flags = get_all_group_flags(apartamento_id)
+    def _precisa(tabela):
+        return colunas is None or tabela in colunas
 
-    # 2. Pré-filtra por Tipo de Negócio (se aplicável)
-    df_despesas_pre_filtrado = df_despesas_raw
-    df_viagens_pre_filtrado = df_viagens_raw
-    
-    col_map_desp_raw = _get_case_insensitive_column_map(df_despesas_raw.columns)
-    col_map_viag_raw = _get_case_insensitive_column_map(df_viagens_raw.columns)
-
-    if tipo_negocio_filter and tipo_negocio_filter != "Todos":
-        if 'descnegocio' in col_map_desp_raw and not df_despesas_raw.empty:
-            df_despesas_pre_filtrado = df_despesas_raw[df_despesas_raw[col_map_desp_raw['descnegocio']] == tipo_negocio_filter].copy()
-
-        if 'tipofrete' in col_map_viag_raw and not df_viagens_raw.empty:
-            tipo_negocio_upper = tipo_negocio_filter.upper().strip()
-            if tipo_negocio_upper == 'FROTA':
-                placas_de_apoio = []
-                if 'veiculoproprio' in col_map_desp_raw and 'placaveiculo' in col_map_desp_raw:
-                    placas_de_apoio = df_despesas_raw[df_despesas_raw[col_map_desp_raw['veiculoproprio']] == 'F'][col_map_desp_raw['placaveiculo']].unique().tolist()
-                df_viagens_pre_filtrado = df_viagens_raw[(df_viagens_raw[col_map_viag_raw['tipofrete']] == 'P') | (df_viagens_raw[col_map_viag_raw['placaveiculo']].isin(placas_de_apoio))].copy()
-            elif 'AGENCIAMENTO' in tipo_negocio_upper:
-                df_viagens_pre_filtrado = df_viagens_raw[df_viagens_raw[col_map_viag_raw['tipofrete']].isin(['A', 'T'])].copy()
-            else:
-                df_viagens_pre_filtrado = pd.DataFrame(columns=df_viagens_raw.columns)
+    def _colunas(tabela):
+        return colunas.get(tabela) if colunas else None
 
-    # 3. Aplica os filtros principais (data, placa, filial) sobre os dados pré-filtrados
-    df_viagens_cliente = apply_filters_to_df(df_viagens_pre_filtrado, start_date, end_date, placa_filter, filial_filter)
-    df_despesas_filtrado = apply_filters_to_df(df_despesas_pre_filtrado, start_date, end_date, placa_filter, filial_filter)
+    # 1. Carrega os DataFrames já filtrados no banco (data, placa, filial e tipo de negócio)
+    filtros = dict(start_date=start_date, end_date=end_date, placa_filter=placa_filter, filial_filter=filial_filter, tipo_negocio_filter=tipo_negocio_filter)
+    df_viagens_cliente = get_filtered_dataframe("relFilViagensCliente", apartamento_id, **filtros, colunas=_colunas("relFilViagensCliente"))
+    df_despesas_filtrado = get_filtered_dataframe("relFilDespesasGerais", apartamento_id, **filtros, colunas=_colunas("relFilDespesasGerais"))
 
-    # 4. Filtra o faturamento e o acerto do motorista com base nas viagens já filtradas
-    viagens_filtradas_ids = df_viagens_cliente['numero'].unique() if not df_viagens_cliente.empty else []
-    
-    col_map_fat_temp = _get_case_insensitive_column_map(df_fat_raw.columns)
-    if 'permitefaturar' in col_map_fat_temp:
-        df_fat_raw = df_fat_raw[df_fat_raw[col_map_fat_temp['permitefaturar']] == 'S']
-    df_fat_filtrado = df_fat_raw[df_fat_raw['numero'].isin(viagens_filtradas_ids)]
-    
-    df_acerto_motorista_filtrado = df_acerto_motorista_raw[df_acerto_motorista_raw['numero'].isin(viagens_filtradas_ids)]
+    # 2. Faturamento (permiteFaturar = 'S') e acerto do motorista restritos às viagens filtradas
+    df_fat_filtrado = get_filtered_dataframe("relFilViagensFatCliente", apartamento_id, **filtros, colunas=_colunas("relFilViagensFatCliente"))
+    df_acerto_motorista_filtrado = get_filtered_dataframe("relFilAcertoMot", apartamento_id, **filtros, colunas=_colunas("relFilAcertoMot"))
+
+    df_contas_pagar_raw = get_data_as_dataframe("relFilContasPagarDet", apartamento_id, _colunas("relFilContasPagarDet")) if _precisa("relFilContasPagarDet") else pd.DataFrame()
+    df_contas_receber_raw = get_data_as_dataframe("relFilContasReceber", apartamento_id, _colunas("relFilContasReceber")) if _precisa("relFilContasReceber") else pd.DataFrame()
+    df_flags = get_all_group_flags(apartamento_id)
 
     # 5. Retorna o dicionário completo com todos os DataFrames necessários
     return {
@@ -339,31 +450,25 @@ def _obter_dados_filtrados_mestre(apartamento_id: int, start_date: datetime, end
         "df_contas_pagar_raw": df_contas_pagar_raw,
         "df_contas_receber_raw": df_contas_receber_raw,
         "df_flags": df_flags,
-        "df_despesas_raw": df_despesas_raw,
         "df_acerto_motorista_raw": df_acerto_motorista_filtrado
     }
    
 def get_dashboard_summary(apartamento_id: int, start_date: datetime = None, end_date: datetime = None, placa_filter: str = "Todos", filial_filter: list = None, tipo_negocio_filter: str = "Todos") -> dict:
     """
-    Calcula os KPIs para o dashboard principal usando a nova função mestre de filtragem.
+    Calcula os KPIs para o dashboard principal.
+    Faturamento, custos, despesas e tipo D vêm da tabela pré-agregada fato_diario.
     """
-    sync_expense_groups(apartamento_id)
-    
-    filtered_data = _obter_dados_filtrados_mestre(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
-    df_viagens_cliente = filtered_data["df_viagens_cliente"]
-    df_despesas_filtrado = filtered_data["df_despesas_filtrado"]
-    df_fat_filtrado = filtered_data["df_fat_filtrado"]
-    df_contas_pagar_raw = filtered_data["df_contas_pagar_raw"]
-    df_contas_receber_raw = filtered_data["df_contas_receber_raw"]
-    df_flags = filtered_data["df_flags"]
-    df_despesas_raw = filtered_data["df_despesas_raw"]
-    df_acerto_motorista_raw = filtered_data["df_acerto_motorista_raw"]
+    filtros = dict(start_date=start_date, end_date=end_date, placa_filter=placa_filter, filial_filter=filial_filter, tipo_negocio_filter=tipo_negocio_filter)
+    kpis = fato_diario.obter_kpis(apartamento_id, **filtros)
+    df_fat_filtrado = get_filtered_dataframe("relFilViagensFatCliente", apartamento_id, **filtros, colunas=COLUNAS_RESUMO["relFilViagensFatCliente"])
+    df_contas_pagar_raw = get_data_as_dataframe("relFilContasPagarDet", apartamento_id, COLUNAS_RESUMO["relFilContasPagarDet"])
+    df_contas_receber_raw = get_data_as_dataframe("relFilContasReceber", apartamento_id, COLUNAS_RESUMO["relFilContasReceber"])
 
     summary = {}
     col_map_fat = _get_case_insensitive_column_map(df_fat_filtrado.columns)
     
     if not df_fat_filtrado.empty and 'freteempresa' in col_map_fat:
-        summary['faturamento_total_viagens'] = df_fat_filtrado[col_map_fat['freteempresa']].sum()
+        summary['faturamento_total_viagens'] = kpis['faturamento']
         df_conhecimentos = df_fat_filtrado[['numero', 'numConhec']].drop_duplicates(subset=['numero']).copy()
         condicao = (pd.notna(df_conhecimentos['numConhec'])) & (df_conhecimentos['numConhec'] != 0)
         df_conhecimentos['display'] = df_conhecimentos['numero'].astype(str)
@@ -373,26 +478,9 @@ def get_dashboard_summary(apartamento_id: int, start_date: datetime = None, end_
         summary['faturamento_total_viagens'] = 0
         summary['faturamento_conhecimentos'] = []
 
-    expense_data = _get_final_expense_dataframes(df_viagens_cliente, df_despesas_filtrado, df_flags, df_acerto_motorista_raw)
-    df_custos = expense_data['custos']
-    df_despesas_gerais = expense_data['despesas']
-    summary['custo_total_viagem'] = df_custos['valor_calculado'].sum() if not df_custos.empty else 0
-    summary['total_despesas_gerais'] = df_despesas_gerais['valor_calculado'].sum() if not df_despesas_gerais.empty else 0
-    
-    df_despesas_sem_placa = apply_filters_to_df(df_despesas_raw, start_date, end_date, "Todos", filial_filter)
-    col_map_despesas_geral = _get_case_insensitive_column_map(df_despesas_sem_placa.columns)
-    df_tipo_d_bruto = pd.DataFrame()
-    if 'ved' in col_map_despesas_geral:
-        df_tipo_d_bruto = df_despesas_sem_placa[df_despesas_sem_placa[col_map_despesas_geral['ved']] == 'D'].copy()
-    
-    soma_bruta_tipo_d = 0
-    if not df_tipo_d_bruto.empty:
-        df_tipo_d_com_flags = pd.merge(df_tipo_d_bruto, df_flags, left_on=col_map_despesas_geral.get('descgrupod'), right_on='group_name', how='left')
-        df_tipo_d_final_para_soma = df_tipo_d_com_flags[df_tipo_d_com_flags['incluir_em_tipo_d'] == True].copy()
-        if not df_tipo_d_final_para_soma.empty:
-            if all(c in col_map_despesas_geral for c in ['serie', 'liquido', 'vlcontabil']):
-                 df_tipo_d_final_para_soma.loc[:, 'valor_calculado'] = np.where(df_tipo_d_final_para_soma[col_map_despesas_geral.get('serie')] == 'RQ', df_tipo_d_final_para_soma[col_map_despesas_geral.get('liquido')], df_tipo_d_final_para_soma[col_map_despesas_geral.get('vlcontabil')])
-                 soma_bruta_tipo_d = df_tipo_d_final_para_soma['valor_calculado'].sum()
+    summary['custo_total_viagem'] = kpis['custo']
+    summary['total_despesas_gerais'] = kpis['despesas']
+    soma_bruta_tipo_d = kpis['tipo_d']
 
     valor_final_tipo_d = soma_bruta_tipo_d
     if placa_filter and placa_filter != 'Todos':
@@ -429,61 +517,17 @@ def get_dashboard_summary(apartamento_id: int, start_date: datetime = None, end_
 
 def get_monthly_summary(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter) -> pd.DataFrame:
     """
-    Calcula os dados para o gráfico mensal/diário.
-    VERSÃO COMPLETA E CORRIGIDA.
+    Calcula os dados para o gráfico mensal/diário a partir da tabela fato_diario.
     """
     periodo_format = 'M'
     if start_date and end_date and (end_date - start_date).days <= 62:
         periodo_format = 'D'
 
-    # Busca todos os dados necessários já filtrados, incluindo o de acerto
-    filtered_data = _obter_dados_filtrados_mestre(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
-    df_viagens_cliente = filtered_data["df_viagens_cliente"]
-    df_despesas_filtrado = filtered_data["df_despesas_filtrado"]
-    df_fat_filtrado = filtered_data["df_fat_filtrado"]
-    df_flags = filtered_data["df_flags"]
-    df_acerto_motorista_raw = filtered_data["df_acerto_motorista_raw"]
-    
-    col_map_viagens_cli = _get_case_insensitive_column_map(df_viagens_cliente.columns)
-    col_map_fat = _get_case_insensitive_column_map(df_fat_filtrado.columns)
-    
-    faturamento = pd.Series(dtype=float)
-    if not df_viagens_cliente.empty and not df_fat_filtrado.empty and 'dataviagemmotorista' in col_map_viagens_cli and 'freteempresa' in col_map_fat:
-        df_viagens_essencial = df_viagens_cliente[[col_map_viagens_cli['numero'], col_map_viagens_cli['dataviagemmotorista']]]
-        df_fat_essencial = df_fat_filtrado[['numero', col_map_fat['freteempresa']]]
-        df_faturamento_para_grafico = pd.merge(df_viagens_essencial, df_fat_essencial, on='numero', how='inner')
-        df_faturamento_para_grafico['Periodo'] = pd.to_datetime(df_faturamento_para_grafico[col_map_viagens_cli['dataviagemmotorista']], errors='coerce').dt.to_period(periodo_format)
-        df_faturamento_para_grafico.dropna(subset=['Periodo'], inplace=True)
-        faturamento = df_faturamento_para_grafico.groupby('Periodo')[col_map_fat['freteempresa']].sum()
-    faturamento.name = 'Faturamento'
+    series = fato_diario.obter_series_periodicas(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, periodo_format)
+    faturamento = series['Faturamento']
+    custos_agrupados = series['Custo']
+    despesas_agrupadas = series['DespesasGerais']
 
-    # Passa o DataFrame 'df_acerto_motorista_raw' na chamada da função
-    expense_data = _get_final_expense_dataframes(df_viagens_cliente, df_despesas_filtrado, df_flags, df_acerto_motorista_raw)
-    df_custos = expense_data['custos']
-    df_despesas_gerais = expense_data['despesas']
-    
-    custos_agrupados = pd.Series(dtype=float)
-    if not df_custos.empty:
-        mapa_colunas_custo = _get_case_insensitive_column_map(df_custos.columns)
-        if 'datacontrole' in mapa_colunas_custo and 'valor_calculado' in mapa_colunas_custo:
-            nome_coluna_data = mapa_colunas_custo['datacontrole']
-            df_custos.loc[:, nome_coluna_data] = pd.to_datetime(df_custos[nome_coluna_data], errors='coerce')
-            df_custos.dropna(subset=[nome_coluna_data], inplace=True)
-            if not df_custos.empty:
-                custos_agrupados = df_custos.groupby(df_custos[nome_coluna_data].dt.to_period(periodo_format))[mapa_colunas_custo['valor_calculado']].sum()
-    custos_agrupados.name = 'Custo'
-    
-    despesas_agrupadas = pd.Series(dtype=float)
-    if not df_despesas_gerais.empty:
-        mapa_colunas_despesa = _get_case_insensitive_column_map(df_despesas_gerais.columns)
-        if 'datacontrole' in mapa_colunas_despesa and 'valor_calculado' in mapa_colunas_despesa:
-            nome_coluna_data = mapa_colunas_despesa['datacontrole']
-            df_despesas_gerais.loc[:, nome_coluna_data] = pd.to_datetime(df_despesas_gerais[nome_coluna_data], errors='coerce')
-            df_despesas_gerais.dropna(subset=[nome_coluna_data], inplace=True)
-            if not df_despesas_gerais.empty:
-                despesas_agrupadas = df_despesas_gerais.groupby(df_despesas_gerais[nome_coluna_data].dt.to_period(periodo_format))[mapa_colunas_despesa['valor_calculado']].sum()
-    despesas_agrupadas.name = 'DespesasGerais'
-        
     monthly_df = pd.concat([faturamento, custos_agrupados, despesas_agrupadas], axis=1).fillna(0)
     
     if not monthly_df.empty:
@@ -500,37 +544,20 @@ def sync_expense_groups(apartamento_id: int):
     """
     Sincroniza os grupos de despesa, adicionando novos grupos encontrados nos dados,
     mas NUNCA removendo os existentes.
+    A importação de despesas já sincroniza os grupos da planilha; esta função
+    varre a tabela inteira e fica para manutenção (ex.: sync_groups.py).
     """
     print(f"Sincronizando grupos de despesa para o apartamento {apartamento_id}...")
-    
-    df_despesas = get_data_as_dataframe("relFilDespesasGerais", apartamento_id)
-    col_map = _get_case_insensitive_column_map(df_despesas.columns)
-    
-    grupos_dinamicos = set()
-    if not df_despesas.empty and 'descgrupod' in col_map:
-        for grupo in df_despesas[col_map['descgrupod']].dropna().unique():
-            grupos_dinamicos.add(grupo)
-            
-    grupos_especiais = {'VALOR QUEBRA', 'COMISSÃO DE MOTORISTA'}
-    todos_os_grupos_encontrados = grupos_dinamicos.union(grupos_especiais)
-    
-    if not todos_os_grupos_encontrados:
-        print("Nenhum grupo de despesa para sincronizar.")
-        return
+    coluna_grupo = next((col for col in db.get_table_columns("relFilDespesasGerais") if col.lower() == 'descgrupod'), None)
 
     try:
-        with engine.connect() as conn:
-            with conn.begin() as trans:
-                sql_insert = text("""
-                    INSERT INTO "static_expense_groups" (apartamento_id, group_name, is_despesa)
-                    VALUES (:apt_id, :group_name, 'S')
-                    ON CONFLICT (apartamento_id, group_name) DO NOTHING
-                """)
-                for group_name in todos_os_grupos_encontrados:
-                    if group_name:
-                        conn.execute(sql_insert, {"apt_id": apartamento_id, "group_name": group_name})
+        with engine.begin() as conn:
+            grupos_inseridos = db.sincronizar_grupos_despesa(conn, apartamento_id, "relFilDespesasGerais", coluna_grupo)
+        # Grupos novos entram com flags padrão e mudam a classificação das despesas
+        if grupos_inseridos:
+            cache_dados.bump_data_version(apartamento_id)
 
-        print("Sincronização de grupos concluída: Novos grupos foram adicionados, existentes foram preservados.")
+        print(f"Sincronização de grupos concluída: {grupos_inseridos} novos grupos adicionados, existentes foram preservados.")
     except Exception as e:
         print(f"ERRO CRÍTICO durante a sincronização de grupos: {e}")
 
@@ -575,7 +602,7 @@ def update_all_group_flags(apartamento_id: int, update_data: dict):
                         "group_name": group_name, "apt_id": apartamento_id
                     })
         # --- FIM DA CORREÇÃO ---
-        sync_expense_groups(apartamento_id)
+        cache_dados.bump_data_version(apartamento_id)
         print(f"Flags de grupo atualizadas com sucesso para o apartamento {apartamento_id}.")
     except Exception as e:
         print(f"Erro ao atualizar flags de grupo de despesa: {e}")
@@ -583,45 +610,20 @@ def update_all_group_flags(apartamento_id: int, update_data: dict):
 
 
 def get_unique_filiais(apartamento_id: int) -> list[str]:
-    table_names = [
-        "relFilViagensFatCliente", 
-        "relFilDespesasGerais", 
-        "relFilContasPagarDet", 
-        "relFilContasReceber",
-        "relFilViagensCliente"
-    ]
-
-    all_dfs = [get_data_as_dataframe(name, apartamento_id) for name in table_names]
-    filiais = pd.Series(dtype=str)
-    
-    for df in all_dfs:
-        col_map = _get_case_insensitive_column_map(df.columns)
-        for col_lower in ['nomefilial', 'nomefil']:
-            if col_lower in col_map:
-                filiais_validas = df[col_map[col_lower]].dropna().astype(str)
-                filiais = pd.concat([filiais, filiais_validas])
-
-    if filiais.empty:
-        return ["Todos"]
-    
-    unique_filiais = sorted(list(set(f for f in filiais.unique() if f and f.strip())))
-
-    return ["Todos"] + unique_filiais
+    """Filiais de todas as tabelas importadas, com "Todos" na frente (ver opcoes_filtro)."""
+    return opcoes_filtro.listar_filiais(apartamento_id)
 
 
 
-def get_faturamento_details_dashboard_data(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter):
+def get_faturamento_details_dashboard_data(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, bundle: dict = None):
     """
     Prepara e calcula todos os dados para a página de Análise Detalhada de Faturamento.
     """
     dashboard_data = {}
     
-    filtered_data = _obter_dados_filtrados_mestre(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
+    filtered_data = _usar_bundle(bundle, apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
     df_viagens_cliente = filtered_data["df_viagens_cliente"]
-    df_despesas_filtrado = filtered_data["df_despesas_filtrado"]
     df_fat_filtrado = filtered_data["df_fat_filtrado"]
-    df_flags = filtered_data["df_flags"]
-    df_acerto_motorista_raw = filtered_data["df_acerto_motorista_raw"]
 
     if df_viagens_cliente.empty:
         return {}
@@ -640,7 +642,7 @@ def get_faturamento_details_dashboard_data(apartamento_id: int, start_date, end_
         df_faturamento_para_grafico['Periodo'] = pd.to_datetime(df_faturamento_para_grafico[col_map_viagens_cli['dataviagemmotorista']]).dt.to_period(periodo)
         fat_evolucao = df_faturamento_para_grafico.groupby('Periodo')[col_map_fat['freteempresa']].sum()
 
-    expense_data = _get_final_expense_dataframes(df_viagens_cliente, df_despesas_filtrado, df_flags, df_acerto_motorista_raw)
+    expense_data = filtered_data["expense_data"]
     df_custos = expense_data['custos']
     custo_evolucao = pd.Series(dtype=float)
     if not df_custos.empty:
@@ -869,35 +871,33 @@ def update_apartment_details(apartamento_id: int, nome_empresa: str, status: str
         return False, f"Ocorreu um erro ao atualizar o apartamento: {e}"
 
 def get_apartments_with_usage_stats():
-    data_tables = [info["table"] for info in config.EXCEL_FILES_CONFIG.values()]
+    """
+    Apartamentos com o total de registros importados e o intervalo do monitoramento,
+    numa única consulta: as contagens vêm de um UNION ALL de COUNT(*) ... GROUP BY
+    apartamento_id das tabelas importadas, e a configuração de um LEFT JOIN.
+    """
+    data_tables = list(dict.fromkeys(info["table"] for info in config.EXCEL_FILES_CONFIG.values()))
+    # Só as tabelas que existem (registro do esquema, sem ir ao banco)
+    data_tables = [table for table in data_tables if db.table_exists(table)]
+    contagens = ' UNION ALL '.join(
+        f'SELECT apartamento_id, COUNT(*) AS total FROM "{table}" GROUP BY apartamento_id' for table in data_tables
+    ) or 'SELECT NULL::integer AS apartamento_id, 0::bigint AS total'
+    query = f"""
+        WITH contagens AS ({contagens}),
+        totais AS (SELECT apartamento_id, SUM(total) AS total FROM contagens GROUP BY apartamento_id)
+        SELECT a.id, a.nome_empresa, a.status, a.data_criacao, a.slug,
+               COALESCE(t.total, 0)::bigint AS total_registos,
+               CASE WHEN cr.apartamento_id IS NULL THEN '' ELSE cr.valor END AS live_monitoring_interval_minutes
+        FROM apartamentos a
+        LEFT JOIN totais t ON t.apartamento_id = a.id
+        LEFT JOIN configuracoes_robo cr ON cr.apartamento_id = a.id AND cr.chave = 'live_monitoring_interval_minutes'
+    """
     try:
         with engine.connect() as conn:
-            # A query principal não muda
-            df_apartamentos = pd.read_sql('SELECT id, nome_empresa, status, data_criacao, slug FROM apartamentos', conn)
-            if df_apartamentos.empty:
-                return []
-            
-            apartamentos_list = df_apartamentos.to_dict(orient='records')
-
-            for apt in apartamentos_list:
-                total_registos = 0
-                apt_id = apt['id']
-                for table in data_tables:
-                    if db.table_exists(table):
-                        query_count = text(f'SELECT COUNT(*) FROM "{table}" WHERE "apartamento_id" = :apt_id')
-                        count = conn.execute(query_count, {"apt_id": apt_id}).scalar_one_or_none()
-                        if count:
-                            total_registos += count
-                apt['total_registos'] = total_registos
-
-                # --- INÍCIO DA CORREÇÃO (LÓGICA PARA BUSCAR O VALOR) ---
-                # Para cada apartamento, busca suas configurações de robô
-                configs = ler_configuracoes_robo(apt_id) 
-                # Adiciona o valor do intervalo ao dicionário do apartamento
-                apt['live_monitoring_interval_minutes'] = configs.get('live_monitoring_interval_minutes', '')
-                # --- FIM DA CORREÇÃO ---
-
-            return apartamentos_list
+            df_apartamentos = pd.read_sql(text(query), conn)
+        if df_apartamentos.empty:
+            return []
+        return df_apartamentos.to_dict(orient='records')
     except Exception as e:
         print(f"Erro ao buscar apartamentos com estatísticas de uso: {e}")
         return []
@@ -953,67 +953,27 @@ def get_unique_plates_with_types(apartamento_id: int) -> list:
     """
     Busca todas as placas únicas e as classifica em 'Próprio', 'Terceiro', 
     'Agregado', ou 'Apoio', retornando uma lista de dicionários.
+    A classificação é mantida pelas importações na tabela veiculos (ver veiculos.py).
     """
-    placas_classificadas = {}
-
-    # 1. Classifica veículos de 'relFilViagensCliente' (Próprio, Terceiro, Agregado)
-    df_viagens = get_data_as_dataframe("relFilViagensCliente", apartamento_id)
-    if not df_viagens.empty:
-        col_map_viagens = _get_case_insensitive_column_map(df_viagens.columns)
-        if all(c in col_map_viagens for c in ['placaveiculo', 'tipofrete']):
-            for index, row in df_viagens.iterrows():
-                placa = row[col_map_viagens['placaveiculo']]
-                tipo_frete = row[col_map_viagens['tipofrete']]
-                if placa and pd.notna(placa):
-                    placa_limpa = placa.strip()
-                    if tipo_frete == 'P':
-                        placas_classificadas[placa_limpa] = 'Próprio'
-                    elif tipo_frete == 'T':
-                        placas_classificadas[placa_limpa] = 'Terceiro'
-                    elif tipo_frete == 'A':
-                        placas_classificadas[placa_limpa] = 'Agregado'
-
-    # 2. Classifica veículos de 'relFilDespesasGerais' (Apoio)
-    df_despesas = get_data_as_dataframe("relFilDespesasGerais", apartamento_id)
-    if not df_despesas.empty:
-        col_map_despesas = _get_case_insensitive_column_map(df_despesas.columns)
-        if all(c in col_map_despesas for c in ['placaveiculo', 'veiculoproprio']):
-            df_apoio = df_despesas[df_despesas[col_map_despesas['veiculoproprio']] == 'F']
-            for placa in df_apoio[col_map_despesas['placaveiculo']].dropna().unique():
-                placa_limpa = placa.strip()
-                # Só adiciona se já não tiver uma classificação mais forte (ex: Próprio)
-                if placa_limpa not in placas_classificadas:
-                    placas_classificadas[placa_limpa] = 'Apoio'
-
-    # 3. Formata a saída para o frontend
-    lista_final = [{'placa': placa, 'tipo': tipo} for placa, tipo in placas_classificadas.items()]
-
-    # Ordena por tipo e depois por placa
-    lista_final.sort(key=lambda x: (x['tipo'], x['placa']))
-
-    return lista_final
+    return veiculos.listar_veiculos(apartamento_id)
 
 
 
 # SUBSTITUA ESTA FUNÇÃO EM data_manager.py
 
-def get_despesas_details_dashboard_data(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter):
+def get_despesas_details_dashboard_data(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, bundle: dict = None):
     """
     Prepara e calcula todos os dados para a página de Análise Detalhada de Despesas.
     VERSÃO COMPLETA E CORRIGIDA.
     """
     dashboard_data = {}
     
-    # 1. Usa a função mestre para buscar TODOS os dados necessários já filtrados
-    filtered_data = _obter_dados_filtrados_mestre(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
-    df_viagens_cliente = filtered_data["df_viagens_cliente"]
+    # 1. Usa o bundle do dashboard com TODOS os dados necessários já filtrados
+    filtered_data = _usar_bundle(bundle, apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
     df_despesas_filtrado = filtered_data["df_despesas_filtrado"]
-    df_flags = filtered_data["df_flags"]
-    df_acerto_motorista_raw = filtered_data["df_acerto_motorista_raw"]
-    df_despesas_raw = filtered_data["df_despesas_raw"]
 
-    # 2. Chama a função auxiliar para obter os DataFrames de custos e despesas classificados
-    expense_data = _get_final_expense_dataframes(df_viagens_cliente, df_despesas_filtrado, df_flags, df_acerto_motorista_raw)
+    # 2. DataFrames de custos e despesas já classificados no bundle
+    expense_data = filtered_data["expense_data"]
     df_custos = expense_data['custos']
     df_despesas_gerais = expense_data['despesas']
     df_tipo_d = expense_data['tipo_d']
@@ -1085,19 +1045,15 @@ def get_despesas_details_dashboard_data(apartamento_id: int, start_date, end_dat
 
     return dashboard_data
 
-def get_expense_audit_data(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter):
+def get_expense_audit_data(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, bundle: dict = None):
     """
     Prepara os dados para a auditoria de despesas, agrupando itens por categoria e grupo.
     """
-    # 1. Reutiliza a função mestre para buscar todos os dados já filtrados
-    filtered_data = _obter_dados_filtrados_mestre(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
-    df_viagens_cliente = filtered_data["df_viagens_cliente"]
-    df_despesas_filtrado = filtered_data["df_despesas_filtrado"]
-    df_flags = filtered_data["df_flags"]
-    df_acerto_motorista_raw = filtered_data["df_acerto_motorista_raw"]
+    # 1. Reutiliza o bundle do dashboard com todos os dados já filtrados
+    filtered_data = _usar_bundle(bundle, apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
 
-    # 2. Reutiliza a função que classifica as despesas
-    expense_data = _get_final_expense_dataframes(df_viagens_cliente, df_despesas_filtrado, df_flags, df_acerto_motorista_raw)
+    # 2. Reutiliza a classificação de despesas do bundle
+    expense_data = filtered_data["expense_data"]
     df_custos = expense_data.get('custos', pd.DataFrame())
     df_despesas_gerais = expense_data.get('despesas', pd.DataFrame())
     df_tipo_d = expense_data.get('tipo_d', pd.DataFrame())
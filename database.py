@@ -1,7 +1,5 @@
 # database.py
-from sqlalchemy import create_engine, text,inspect
-from sqlalchemy.exc import SQLAlchemyError
-import re
+from sqlalchemy import create_engine, text
 import shutil
 import os
 import pandas as pd
@@ -10,6 +8,14 @@ import glob
 from datetime import datetime
 import psycopg2.extras 
 import numpy as np
+from pandas.tseries.api import guess_datetime_format
+import cache_dados
+import carga_em_massa
+import esquema
+import fato_diario
+import import_pipeline
+import registro_importacoes
+import veiculos
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -54,43 +60,109 @@ def create_tables():
     print("AVISO: A criação de tabelas agora é gerenciada pelo Alembic.")
     pass
 
-def _clean_and_convert_data(df, table_key):
+# Tipos inferidos pelo pandas em que o acessor .str funciona (há células de texto na coluna)
+_TIPOS_COM_TEXTO = ('string', 'mixed', 'mixed-integer')
+_TEXTOS_NULOS = ['nan', 'nat']
+
+def _tem_textos(serie) -> bool:
+    return serie.dtype == 'object' and pd.api.types.infer_dtype(serie, skipna=True) in _TIPOS_COM_TEXTO
+
+def _por_valores_distintos(serie, converter):
     """
-    Limpa e converte os tipos de dados.
-    VERSÃO FINAL: Primeiro remove espaços de todas as colunas de texto.
+    Aplica `converter` (Series -> Series) só aos valores distintos da coluna e espalha o
+    resultado pelas linhas. As planilhas repetem muito os mesmos textos, datas e códigos.
     """
-    # --- ETAPA 1: REMOÇÃO DE ESPAÇOS EM TODAS AS CÉLULAS DE TEXTO (NOVA LÓGICA) ---
-    print(" -> Removendo espaços em branco de todas as células de texto...")
-    for col in df.select_dtypes(include=['object']).columns:
-        # Usa .loc para garantir que a modificação seja feita corretamente
-        df.loc[:, col] = df[col].astype(str).str.strip()
+    codigos, distintos = pd.factorize(serie)
+    convertidos = converter(pd.Series(distintos, dtype=serie.dtype)).to_numpy()
+    # O código -1 (célula vazia) aponta para o nulo acrescentado no fim
+    valores = np.concatenate([convertidos, np.array([np.nan], dtype=convertidos.dtype if convertidos.dtype.kind == 'f' else object)])
+    return pd.Series(valores[codigos], index=serie.index, name=serie.name)
 
-    # --- ETAPA 2: LIMPEZA AGRESSIVA DE 'nan' ---
-    df.replace(to_replace=re.compile(r'^\s*(nan|nat)\s*$', re.IGNORECASE), value=np.nan, regex=True, inplace=True)
-    
-    original_columns = df.columns.tolist()
-    df.columns = [str(col).strip() for col in original_columns]
+def _limpar_textos(serie):
+    limpa = serie.str.strip()
+    nulos = limpa.str.lower().isin(_TEXTOS_NULOS)
+    # .str devolve NaN nas células que não são texto: essas ficam como estavam
+    return limpa.where(limpa.notna(), serie).mask(nulos)
+
+def _numero_br(valor) -> float:
+    """'1.234,56' -> 1234.56. Números nativos passam direto; o que não for número vira NaN."""
+    try:
+        if isinstance(valor, str):
+            return float(valor.strip().replace('.', '').replace(',', '.'))
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _numeros_br(serie):
+    return serie.map(_numero_br).astype(np.float64)
+
+# Valores que o pandas ignora ao inferir o formato de uma coluna de datas
+_TEXTOS_DATA_IGNORADOS = ('', 'now', 'today')
+
+def _formato_data_do_arquivo(formatos_datas: dict, coluna: str, serie):
+    """
+    Formato de data de `coluna` para o arquivo inteiro, inferido (como no pd.to_datetime)
+    pelo primeiro valor preenchido do primeiro bloco que tiver algum. 'mixed' = célula a célula.
+    """
+    if coluna not in formatos_datas:
+        preenchidos = serie.dropna()
+        if preenchidos.dtype == object:
+            preenchidos = preenchidos[~preenchidos.isin(_TEXTOS_DATA_IGNORADOS)]
+        if preenchidos.empty:
+            return None
+        primeiro = preenchidos.iloc[0]
+        formato = guess_datetime_format(primeiro, dayfirst=True) if type(primeiro) is str else None
+        formatos_datas[coluna] = formato or 'mixed'
+    return formatos_datas[coluna]
+
+def _clean_and_convert_data(df, table_key, formatos_datas: dict = None):
+    """
+    Limpa e converte os tipos de dados, coluna a coluna:
+    - texto: strip só nas células de texto; 'nan' / 'NaT' digitados viram nulo
+      (sobre os valores distintos da coluna);
+    - datas, números e inteiros: só as colunas declaradas em config.TABLE_COLUMN_MAPS,
+      cada uma convertida uma única vez, também sobre os valores distintos (já fazem
+      o próprio strip).
+    As colunas mantêm os dtypes do pandas (nulos como NaN/NaT) até o COPY do staging.
+    Na leitura em blocos, `formatos_datas` (um dict por arquivo) guarda os formatos de
+    data inferidos no primeiro bloco, para que todos os blocos sejam lidos do mesmo jeito.
+    """
+    df.columns = [str(col).strip() for col in df.columns]
     col_maps = config.TABLE_COLUMN_MAPS.get(table_key, {})
-    
-    # --- ETAPA 3: CONVERSÃO DE TIPOS ---
-    date_columns_info = col_maps.get('date_formats', {})
-    for col_db, date_format in date_columns_info.items():
+    date_formats = col_maps.get('date_formats', {})
+    declaradas = set(date_formats) | set(col_maps.get('numeric', [])) | set(col_maps.get('integer', []))
+
+    # --- ETAPA 1: ESPAÇOS E TEXTOS NULOS ---
+    print(" -> Removendo espaços em branco de todas as células de texto...")
+    for col in df.columns[df.dtypes == 'object']:
+        if col not in declaradas and _tem_textos(df[col]):
+            df[col] = _por_valores_distintos(df[col], _limpar_textos)
+
+    # --- ETAPA 2: DATAS ---
+    for col_db, date_format in date_formats.items():
         if col_db in df.columns:
-            s = pd.to_datetime(df[col_db], errors='coerce', format=date_format, dayfirst=not date_format)
-            df[col_db] = s.dt.strftime('%Y-%m-%d')
+            def _converter_datas(s, col_db=col_db, date_format=date_format):
+                if _tem_textos(s):
+                    s = _limpar_textos(s)
+                if date_format is None and formatos_datas is not None:
+                    return pd.to_datetime(
+                        s, errors='coerce', format=_formato_data_do_arquivo(formatos_datas, col_db, s), dayfirst=True
+                    ).dt.strftime('%Y-%m-%d')
+                return pd.to_datetime(s, errors='coerce', format=date_format, dayfirst=not date_format).dt.strftime('%Y-%m-%d')
+            df[col_db] = _por_valores_distintos(df[col_db], _converter_datas)
 
+    # --- ETAPA 3: NÚMEROS NO FORMATO BRASILEIRO ('1.234,56') E INTEIROS ---
     for col_type in ['numeric', 'integer']:
         for col_db in col_maps.get(col_type, []):
             if col_db in df.columns:
-                if df[col_db].dtype == 'object':
-                    df[col_db] = df[col_db].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
-                df[col_db] = pd.to_numeric(df[col_db], errors='coerce').fillna(0)
-                if col_type == 'integer':
-                    df[col_db] = df[col_db].astype(int)
-    
-    # --- ETAPA 4: TRATAMENTO FINAL DE NULOS ---
-    df = df.astype(object).where(pd.notna(df), None)
-                    
+                serie = df[col_db]
+                if serie.dtype == 'object':
+                    serie = _por_valores_distintos(serie, _numeros_br)
+                else:
+                    serie = pd.to_numeric(serie, errors='coerce')
+                serie = serie.fillna(0)
+                df[col_db] = serie.astype('int64') if col_type == 'integer' else serie
+
     return df
 
 def get_db_connection():
@@ -100,92 +172,48 @@ def get_db_connection():
 
 
 def _validate_columns(excel_columns, table_name):
-    try:
-        with engine.connect() as conn:
-            query = text("SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = :table_name")
-            result = conn.execute(query, {'table_name': table_name})
-            db_columns_case_sensitive = {row[0] for row in result}
-    except SQLAlchemyError as e:
-        print(f"AVISO: Não foi possível ler colunas da tabela '{table_name}'. Erro: {e}")
-        return excel_columns, []
-    db_columns_lower = {col.lower() for col in db_columns_case_sensitive}
+    """Separa as colunas da planilha entre as que existem na tabela (sem diferenciar maiúsculas) e as extras."""
+    db_columns_lower = esquema.mapa_colunas(table_name)
+    if not db_columns_lower:
+        # Tabela que não existe no banco: nenhuma coluna é válida (como na consulta ao information_schema)
+        print(f"AVISO: A tabela '{table_name}' não tem colunas no banco.")
     extra_cols_names = [col for col in excel_columns if col.lower() not in db_columns_lower]
     valid_columns_original_case = [col for col in excel_columns if col.lower() in db_columns_lower]
     return valid_columns_original_case, extra_cols_names
 
 def import_excel_to_db(excel_source, sheet_name: str, table_name: str, key_columns: list, apartamento_id: int):
-    extra_columns = []
-    try:
-        df_novo = pd.read_excel(excel_source, sheet_name=sheet_name)
-        df_novo = _clean_and_convert_data(df_novo, table_name)
-        df_novo['apartamento_id'] = apartamento_id
-        valid_columns, extra_columns = _validate_columns(df_novo.columns.tolist(), table_name)
-        df_import = df_novo[valid_columns]
-        if df_import.empty:
-            print(f"Nenhum dado válido para importar para a tabela '{table_name}'.")
-            return extra_columns
-        with engine.begin() as conn:
-            print(f"Iniciando importação com atualização para a tabela '{table_name}'...")
-            df_import.to_sql('temp_import', conn, if_exists='replace', index=False)
-            where_clauses = [f'CAST("{col}" AS TEXT) IN (SELECT DISTINCT CAST("{col}" AS TEXT) FROM temp_import)' for col in key_columns]
-            where_str = ' AND '.join(where_clauses)
-            sql_delete = text(f'DELETE FROM "{table_name}" WHERE {where_str} AND "apartamento_id" = :apt_id;')
-            print(f" -> Removendo registros antigos/correspondentes para evitar duplicatas...")
-            result = conn.execute(sql_delete, {'apt_id': apartamento_id})
-            print(f" -> {result.rowcount} registros antigos foram removidos.")
-            print(f" -> Inserindo {len(df_import)} novos/atualizados registros...")
-            df_import.to_sql(table_name, conn, if_exists='append', index=False)
-            print(f" -> Importação para a tabela '{table_name}' concluída com sucesso.")
-        return extra_columns
-    except Exception as e:
-        print(f"Erro ao importar dados da planilha '{sheet_name}' para '{table_name}': {e}")
-        raise e
+    """Importa uma planilha pelo pipeline (import_pipeline.py). Retorna as colunas ignoradas."""
+    return import_pipeline.importar_planilha(excel_source, table_name, apartamento_id, sheet_name, key_columns)['extra_columns']
 
 
 def process_and_import_despesas(excel_source, sheet_name: str, table_name: str, apartamento_id: int):
-    extra_columns = []
-    try:
-        df_novo = pd.read_excel(excel_source, sheet_name=sheet_name)
-        df_novo = _clean_and_convert_data(df_novo, table_name)
-        df_novo['apartamento_id'] = apartamento_id
-
-        if 'VED' in df_novo.columns:
-            df_novo = df_novo[df_novo['VED'] != 'E']
-        if 'despesa' in df_novo.columns:
-            df_novo = df_novo[df_novo['despesa'] == 'S']
-        
-        valid_columns, extra_columns = _validate_columns(df_novo.columns.tolist(), table_name)
-        df_import = df_novo[valid_columns]
-        
-        if df_import.empty:
-            print(f"Nenhum dado válido para importar para a tabela '{table_name}'.")
-            return extra_columns
-            
-        key_columns = ['codItemNota']
-
-        with engine.begin() as conn:
-            print(f"Iniciando importação com atualização para a tabela '{table_name}'...")
-            
-            df_import.to_sql('temp_import', conn, if_exists='replace', index=False)
-            
-            where_clauses = [f'CAST("{col}" AS TEXT) IN (SELECT DISTINCT CAST("{col}" AS TEXT) FROM temp_import)' for col in key_columns]
-            where_str = ' AND '.join(where_clauses)
-            
-            sql_delete = text(f'DELETE FROM "{table_name}" WHERE {where_str} AND "apartamento_id" = :apt_id;')
-            print(f" -> Removendo registros antigos/correspondentes para evitar duplicatas...")
-            result = conn.execute(sql_delete, {'apt_id': apartamento_id})
-            print(f" -> {result.rowcount} registros antigos foram removidos.")
-            
-            print(f" -> Inserindo {len(df_import)} novos/atualizados registros...")
-            df_import.to_sql(table_name, conn, if_exists='append', index=False)
-            
-            print(f" -> Importação para a tabela '{table_name}' concluída com sucesso.")
-
-        return extra_columns
-    except Exception as e:
-        print(f"Erro ao processar e importar dados de despesas: {e}")
-        raise e
+    """Despesas: mesmo pipeline; os filtros de linhas (VED, despesa) vêm de config.TABLE_ROW_FILTERS."""
+    return import_pipeline.importar_planilha(excel_source, table_name, apartamento_id, sheet_name)['extra_columns']
     
+# Grupos que não vêm de descGrupoD, mas são gerados a partir das viagens e do acerto
+GRUPOS_ESPECIAIS = ['VALOR QUEBRA', 'COMISSÃO DE MOTORISTA']
+
+def sincronizar_grupos_despesa(conn, apartamento_id: int, tabela_origem: str, coluna_grupo: str = None) -> int:
+    """
+    Cadastra em static_expense_groups os grupos encontrados em `tabela_origem` (coluna descGrupoD)
+    e os grupos especiais, sem NUNCA remover os existentes. Roda como um único
+    INSERT ... SELECT DISTINCT dentro da transação `conn`. Retorna quantos grupos foram inseridos.
+    """
+    origens = ['SELECT unnest(CAST(:grupos_especiais AS TEXT[])) AS grupo']
+    if coluna_grupo:
+        # O staging da importação só tem linhas do próprio apartamento (e não tem a coluna apartamento_id)
+        filtro_apt = '' if tabela_origem == carga_em_massa.TABELA_STAGING else ' WHERE o.apartamento_id = :apt_id'
+        origens.append(f'SELECT CAST(o."{coluna_grupo}" AS TEXT) FROM "{tabela_origem}" o{filtro_apt}')
+    sql_insert = text(f"""
+        INSERT INTO "static_expense_groups" (apartamento_id, group_name, is_despesa)
+        SELECT DISTINCT :apt_id, g.grupo, 'S'
+        FROM ({' UNION ALL '.join(origens)}) g
+        WHERE g.grupo IS NOT NULL AND g.grupo <> ''
+        ON CONFLICT (apartamento_id, group_name) DO NOTHING
+    """)
+    result = conn.execute(sql_insert, {'apt_id': apartamento_id, 'grupos_especiais': GRUPOS_ESPECIAIS})
+    return result.rowcount
+
 def import_single_excel_to_db(filepath: str, file_key: str, apartamento_id: int):
     try:
         df = pd.read_excel(filepath)
@@ -194,12 +222,19 @@ def import_single_excel_to_db(filepath: str, file_key: str, apartamento_id: int)
         table_info = config.EXCEL_FILES_CONFIG[file_key]
         table_name = table_info['table']
         
-        with engine.connect() as conn:
-            inspector = inspect(engine)
-            db_columns = [col['name'] for col in inspector.get_columns(table_name)]
-            df_final = df[[col for col in df.columns if col in db_columns]]
+        db_columns = esquema.colunas(table_name)
+        df_final = df[[col for col in df.columns if col in db_columns]]
 
-        df_final.to_sql(table_name, con=engine, if_exists='append', index=False)
+        with engine.begin() as conn:
+            carga_em_massa.bloquear_destino(conn, table_name, apartamento_id)
+            registro_importacoes.invalidar(conn, apartamento_id, table_name)
+            df_final.to_sql(table_name, conn, if_exists='append', index=False)
+            fato_diario.atualizar_fonte_da_tabela(conn, table_name, apartamento_id)
+            veiculos.atualizar_tudo_da_tabela(conn, table_name, apartamento_id)
+            if table_name == 'relFilDespesasGerais':
+                coluna_grupo = next((col for col in df_final.columns if col.lower() == 'descgrupod'), None)
+                sincronizar_grupos_despesa(conn, apartamento_id, table_name, coluna_grupo)
+        cache_dados.bump_data_version(apartamento_id)
         
         print(f"Sucesso: Dados de '{os.path.basename(filepath)}' importados para a tabela '{table_name}'.")
         
@@ -208,140 +243,55 @@ def import_single_excel_to_db(filepath: str, file_key: str, apartamento_id: int)
         raise e
 
 def process_and_import_contas_pagar(excel_source, sheet_name: str, table_name: str, apartamento_id: int):
-    extra_columns = []
-    try:
-        df_novo = pd.read_excel(excel_source, sheet_name=sheet_name)
-        df_novo = _clean_and_convert_data(df_novo, table_name)
-        df_novo['apartamento_id'] = apartamento_id
-
-        valid_columns, extra_columns = _validate_columns(df_novo.columns.tolist(), table_name)
-        df_import = df_novo[valid_columns]
-        
-        if df_import.empty:
-            print(f"Nenhum dado válido para importar para a tabela '{table_name}'.")
-            return extra_columns
-            
-        key_columns = ['codItemNota']
-
-        with engine.begin() as conn:
-            print(f"Iniciando importação com atualização para a tabela '{table_name}'...")
-            
-            df_import.to_sql('temp_import', conn, if_exists='replace', index=False)
-            
-            where_clauses = [f'CAST("{col}" AS TEXT) IN (SELECT DISTINCT CAST("{col}" AS TEXT) FROM temp_import)' for col in key_columns]
-            where_str = ' AND '.join(where_clauses)
-            
-            sql_delete = text(f'DELETE FROM "{table_name}" WHERE {where_str} AND "apartamento_id" = :apt_id;')
-            print(f" -> Removendo registros antigos com base em 'codItemNota'...")
-            result = conn.execute(sql_delete, {'apt_id': apartamento_id})
-            print(f" -> {result.rowcount} registros antigos foram removidos.")
-            
-            print(f" -> Inserindo {len(df_import)} novos/atualizados registros...")
-            df_import.to_sql(table_name, conn, if_exists='append', index=False)
-            
-            print(f" -> Importação para a tabela '{table_name}' concluída com sucesso.")
-
-        return extra_columns
-    except Exception as e:
-        print(f"Erro ao processar e importar dados de Contas a Pagar: {e}")
-        raise e
+    return import_pipeline.importar_planilha(excel_source, table_name, apartamento_id, sheet_name)['extra_columns']
 
 def process_and_import_contas_receber(excel_source, sheet_name: str, table_name: str, apartamento_id: int):
-    extra_columns = []
-    try:
-        df_novo = pd.read_excel(excel_source, sheet_name=sheet_name)
-        df_novo = _clean_and_convert_data(df_novo, table_name)
-        df_novo['apartamento_id'] = apartamento_id
-
-        valid_columns, extra_columns = _validate_columns(df_novo.columns.tolist(), table_name)
-        df_import = df_novo[valid_columns]
-        
-        if df_import.empty:
-            print(f"Nenhum dado válido para importar para a tabela '{table_name}'.")
-            return extra_columns
-            
-        key_columns = ['codDuplicataReceber']
-
-        with engine.begin() as conn:
-            print(f"Iniciando importação com atualização para a tabela '{table_name}'...")
-            
-            df_import.to_sql('temp_import', conn, if_exists='replace', index=False)
-            
-            where_clauses = [f'CAST("{col}" AS TEXT) IN (SELECT DISTINCT CAST("{col}" AS TEXT) FROM temp_import)' for col in key_columns]
-            where_str = ' AND '.join(where_clauses)
-            
-            sql_delete = text(f'DELETE FROM "{table_name}" WHERE {where_str} AND "apartamento_id" = :apt_id;')
-            print(f" -> Removendo registros antigos com base em 'codDuplicataReceber'...")
-            result = conn.execute(sql_delete, {'apt_id': apartamento_id})
-            print(f" -> {result.rowcount} registros antigos foram removidos.")
-            
-            print(f" -> Inserindo {len(df_import)} novos/atualizados registros...")
-            df_import.to_sql(table_name, conn, if_exists='append', index=False)
-            
-            print(f" -> Importação para a tabela '{table_name}' concluída com sucesso.")
-
-        return extra_columns
-    except Exception as e:
-        print(f"Erro ao processar e importar dados de Contas a Receber: {e}")
-        raise e
+    return import_pipeline.importar_planilha(excel_source, table_name, apartamento_id, sheet_name)['extra_columns']
 
-def processar_downloads_na_pasta(apartamento_id: int):
+def processar_downloads_na_pasta(apartamento_id: int, pasta_downloads: str = None, processos: int = None):
     """
-    Processa todos os ficheiros Excel na pasta de downloads, LOGANDO cada passo
-    para o banco de dados.
+    Processa todos os ficheiros Excel na pasta de downloads (downloads/<apartamento>,
+    ou `pasta_downloads`), LOGANDO cada passo para o banco de dados.
+    Retorna {nome do arquivo: resultado da importação ou a exceção}.
     """
     logar_progresso(apartamento_id, f"--- INICIANDO PROCESSAMENTO PÓS-DOWNLOAD PARA APARTAMENTO {apartamento_id} ---")
     
-    pasta_principal = os.path.dirname(os.path.abspath(__file__))
-    pasta_downloads = os.path.join(pasta_principal, 'downloads', str(apartamento_id))
+    if pasta_downloads is None:
+        pasta_principal = os.path.dirname(os.path.abspath(__file__))
+        pasta_downloads = os.path.join(pasta_principal, 'downloads', str(apartamento_id))
 
     if not os.path.exists(pasta_downloads):
         logar_progresso(apartamento_id, f"Aviso: Pasta de downloads não encontrada: {pasta_downloads}")
-        return
+        return {}
 
-    for filename in os.listdir(pasta_downloads):
+    arquivos = []
+    for filename in sorted(os.listdir(pasta_downloads)):
         if filename.endswith(('.xls', '.xlsx')):
-            # Encontra a 'chave' do arquivo (ex: 'viagens', 'despesas') com base no nome do arquivo
-            file_key = {info['path']: key for key, info in config.EXCEL_FILES_CONFIG.items()}.get(filename)
-            
-            if file_key:
-                caminho_completo = os.path.join(pasta_downloads, filename)
-                try:
-                    table_info = config.EXCEL_FILES_CONFIG[file_key]
-                    sheet_name = table_info.get('sheet_name')
-                    table_name = table_info['table']
-                    
-                    # Usa a lógica de importação apropriada para cada tabela
-                    if table_name == 'relFilDespesasGerais':
-                        process_and_import_despesas(caminho_completo, sheet_name, table_name, apartamento_id)
-                    elif table_name == 'relFilContasPagarDet':
-                        process_and_import_contas_pagar(caminho_completo, sheet_name, table_name, apartamento_id)
-                    elif table_name == 'relFilContasReceber':
-                        process_and_import_contas_receber(caminho_completo, sheet_name, table_name, apartamento_id)
-                    else:
-                        # Para todas as outras tabelas, usa a importação padrão
-                        key_columns = config.TABLE_PRIMARY_KEYS.get(table_name)
-                        if not key_columns:
-                            logar_progresso(apartamento_id, f"ERRO: Chaves primárias não definidas para '{table_name}'.")
-                            continue
-                        import_excel_to_db(caminho_completo, sheet_name, table_name, key_columns, apartamento_id)
-                    
-                    os.unlink(caminho_completo)
-                    logar_progresso(apartamento_id, f"Ficheiro '{filename}' processado e removido com sucesso.")
-
-                except Exception as e:
-                    logar_progresso(apartamento_id, f"Falha ao processar '{filename}'. Erro: {e}")
+            if import_pipeline.chave_do_arquivo(filename):
+                arquivos.append((os.path.join(pasta_downloads, filename), filename))
             else:
                 logar_progresso(apartamento_id, f"Aviso: Ficheiro '{filename}' não reconhecido.")
 
+    # Um arquivo por tabela: as importações rodam em paralelo (ver import_pipeline.importar_arquivos)
+    resultados = import_pipeline.importar_arquivos(arquivos, apartamento_id, processos) if arquivos else {}
+    for caminho_completo, filename in arquivos:
+        resultado = resultados[filename]
+        if isinstance(resultado, Exception):
+            logar_progresso(apartamento_id, f"Falha ao processar '{filename}'. Erro: {resultado}")
+            continue
+        os.unlink(caminho_completo)
+        if resultado['ignorado']:
+            logar_progresso(apartamento_id, f"Ficheiro '{filename}' idêntico ao já importado; ignorado e removido.")
+        else:
+            logar_progresso(apartamento_id, f"Ficheiro '{filename}' processado e removido com sucesso ({resultado['inseridos']} registros).")
+
     logar_progresso(apartamento_id, "--- PROCESSAMENTO PÓS-DOWNLOAD FINALIZADO ---")
+    return resultados
 
 def table_exists(table_name: str) -> bool:
-    try:
-        with engine.connect() as conn:
-            query = text("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema = 'public' AND table_name = :table_name)")
-            result = conn.execute(query, {'table_name': table_name}).scalar()
-            return result or False
-    except SQLAlchemyError as e:
-        print(f"Erro ao verificar existência da tabela {table_name}: {e}")
-        return False
\ No newline at end of file
+    """Se a tabela existe (pelo registro do esquema, ver esquema.py)."""
+    return esquema.tabela_existe(table_name)
+
+def get_table_columns(table_name: str) -> list:
+    """Retorna os nomes reais (case-sensitive) das colunas de uma tabela, ou [] se ela não existir."""
+    return esquema.colunas(table_name)
@@ -0,0 +1,138 @@
+# esquema.py
+"""
+Registro do esquema do banco (tabelas e colunas do schema public), compartilhado
+pelo processo inteiro.
+
+O esquema só muda pelas migrações do Alembic, então ele é lido de uma vez
+(uma consulta ao information_schema) e guardado em memória. É recarregado:
+- quando a versão em alembic_version muda (conferida no máximo a cada
+  ESQUEMA_VERIFICACAO_SEGUNDOS, padrão 30);
+- quando passa ESQUEMA_TTL_SEGUNDOS (padrão 600) desde a última carga;
+- quando pedem uma tabela que não está no registro (no máximo a cada
+  ESQUEMA_VERIFICACAO_SEGUNDOS; com `conn`, a tabela é lida pela conexão de quem
+  chamou, que pode tê-la criado na própria transação).
+
+Os nomes das colunas no banco diferenciam maiúsculas e minúsculas e as planilhas
+nem sempre usam a mesma grafia: `mapa_colunas` e `resolver_coluna` fazem a
+resolução sem diferenciar, para a importação e para o data_manager.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from db_connection import engine
+
+ESQUEMA_TTL_SEGUNDOS = int(os.getenv('ESQUEMA_TTL_SEGUNDOS', '600'))
+ESQUEMA_VERIFICACAO_SEGUNDOS = int(os.getenv('ESQUEMA_VERIFICACAO_SEGUNDOS', '30'))
+
+_SQL_COLUNAS = text("""
+    SELECT c.table_name, c.column_name, c.data_type
+    FROM information_schema.columns c
+    JOIN information_schema.tables t ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = 'public' AND t.table_type = 'BASE TABLE'
+    ORDER BY c.table_name, c.ordinal_position
+""")
+
+_lock = threading.Lock()
+# tabela -> [(coluna, tipo)] na ordem da tabela
+_tabelas = {}
+_versao = None
+_carregado_em = 0.0
+_verificado_em = 0.0
+
+
+def _versao_alembic(conn):
+    try:
+        return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except SQLAlchemyError:
+        return None
+
+
+def _carregar():
+    """Lê tabelas, colunas e a versão do Alembic (chamar com _lock)."""
+    global _tabelas, _versao, _carregado_em, _verificado_em
+    tabelas = {}
+    with engine.connect() as conn:
+        for tabela, coluna, tipo in conn.execute(_SQL_COLUNAS):
+            tabelas.setdefault(tabela, []).append((coluna, tipo))
+        versao = _versao_alembic(conn)
+    agora = time.monotonic()
+    _tabelas, _versao, _carregado_em, _verificado_em = tabelas, versao, agora, agora
+    print(f"[ESQUEMA] {len(tabelas)} tabelas carregadas (migração {versao}).")
+
+
+def _atualizar_se_preciso():
+    global _verificado_em
+    agora = time.monotonic()
+    if _carregado_em and agora - _carregado_em < ESQUEMA_TTL_SEGUNDOS and agora - _verificado_em < ESQUEMA_VERIFICACAO_SEGUNDOS:
+        return
+    with _lock:
+        agora = time.monotonic()
+        if not _carregado_em or agora - _carregado_em >= ESQUEMA_TTL_SEGUNDOS:
+            _carregar()
+            return
+        if agora - _verificado_em < ESQUEMA_VERIFICACAO_SEGUNDOS:
+            return
+        with engine.connect() as conn:
+            versao = _versao_alembic(conn)
+        if versao != _versao:
+            _carregar()
+        else:
+            _verificado_em = agora
+
+
+_SQL_COLUNAS_TABELA = text("""
+    SELECT column_name, data_type FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = :table_name
+    ORDER BY ordinal_position
+""")
+
+
+def _colunas_com_tipos(table_name: str, conn=None) -> list:
+    try:
+        _atualizar_se_preciso()
+        if table_name in _tabelas:
+            return _tabelas[table_name]
+        if conn is not None:
+            # A tabela pode ter sido criada na transação de quem chamou: lê por ela, sem guardar no registro
+            return [tuple(row) for row in conn.execute(_SQL_COLUNAS_TABELA, {'table_name': table_name})]
+        with _lock:
+            if table_name not in _tabelas and time.monotonic() - _carregado_em >= ESQUEMA_VERIFICACAO_SEGUNDOS:
+                _carregar()
+    except SQLAlchemyError as e:
+        print(f"Erro ao ler o esquema do banco: {e}")
+    return _tabelas.get(table_name, [])
+
+
+def invalidar():
+    """Força a releitura do esquema no próximo acesso."""
+    global _carregado_em
+    with _lock:
+        _carregado_em = 0.0
+
+
+def tabela_existe(table_name: str, conn=None) -> bool:
+    return bool(_colunas_com_tipos(table_name, conn))
+
+
+def colunas(table_name: str, conn=None) -> list:
+    """Nomes reais (case-sensitive) das colunas, na ordem da tabela; [] se a tabela não existe."""
+    return [coluna for coluna, _ in _colunas_com_tipos(table_name, conn)]
+
+
+def mapa_colunas(table_name: str, conn=None) -> dict:
+    """nome em minúsculas -> nome real."""
+    return {coluna.lower(): coluna for coluna, _ in _colunas_com_tipos(table_name, conn)}
+
+
+def tipos_colunas(table_name: str, conn=None) -> dict:
+    """nome em minúsculas -> (nome real, tipo do information_schema)."""
+    return {coluna.lower(): (coluna, tipo) for coluna, tipo in _colunas_com_tipos(table_name, conn)}
+
+
+def resolver_coluna(table_name: str, nome: str, conn=None):
+    """Nome real de `nome` na tabela (sem diferenciar maiúsculas), ou None."""
+    return mapa_colunas(table_name, conn).get(str(nome).strip().lower())
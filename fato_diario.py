@@ -0,0 +1,505 @@
+# fato_diario.py
+"""
+Tabela fato_diario: valores do dashboard pré-agregados por dia.
+
+Cada linha soma (valor) e conta (quantidade) os registros brutos de uma
+combinação (apartamento, fonte, categoria, dia, placa, filial, grupo, negócio):
+- fonte 'viagens' (relFilViagensCliente + faturamento + acerto do motorista):
+  categorias 'viagem' (só contagem), 'faturamento' (freteEmpresa com permiteFaturar = 'S'),
+  'quebra' (valorQuebra > 0) e 'comissao' (vlComissao do acerto, tipoFrete = 'P');
+- fonte 'despesas' (relFilDespesasGerais): 'despesa', 'tipo_d' (VED = 'D'),
+  'tipo_d_nao_despesa' e 'nao_despesa' (despesa <> 'S').
+
+`dia` é a data usada pelo filtro do dashboard (a mesma de filtros_sql) e
+`dia_lancamento` a data usada nos gráficos. As flags dos grupos
+(static_expense_groups) não são gravadas aqui: entram por JOIN na consulta,
+então alterar uma flag não exige recalcular a tabela.
+
+As importações chamam `dias_afetados` antes de apagar os registros antigos e
+`atualizar_dias_afetados` depois de inserir os novos, dentro da mesma transação:
+só os dias tocados pela planilha são recalculados.
+"""
+import pandas as pd
+from sqlalchemy import text
+
+import cache_dados
+import carga_em_massa
+import config
+import database as db
+import esquema
+import filtros_sql
+from filtros_sql import _q
+
+FONTE_VIAGENS = 'viagens'
+FONTE_DESPESAS = 'despesas'
+
+CATEGORIAS_CUSTO_DESPESA = ('despesa', 'quebra', 'comissao')
+CATEGORIAS_TIPO_D = ('tipo_d', 'tipo_d_nao_despesa')
+
+GRUPO_QUEBRA = 'VALOR QUEBRA'
+GRUPO_COMISSAO = 'COMISSÃO DE MOTORISTA'
+
+# Tabela importada -> fonte do fato que ela alimenta
+_FONTE_POR_TABELA = {
+    filtros_sql.TABELA_VIAGENS: FONTE_VIAGENS,
+    filtros_sql.TABELA_FATURAMENTO: FONTE_VIAGENS,
+    filtros_sql.TABELA_ACERTO: FONTE_VIAGENS,
+    filtros_sql.TABELA_DESPESAS: FONTE_DESPESAS,
+}
+_TABELA_BASE_POR_FONTE = {
+    FONTE_VIAGENS: filtros_sql.TABELA_VIAGENS,
+    FONTE_DESPESAS: filtros_sql.TABELA_DESPESAS,
+}
+
+_COLUNAS_INSERT = 'apartamento_id, fonte, categoria, dia, dia_lancamento, placa, filial, filial_alternativa, grupo, negocio, tipo_frete, valor, quantidade'
+
+# (apartamento_id, versao_dados) já verificados por garantir_fato_diario neste processo
+_apartamentos_verificados = set()
+
+
+# --- Construção ---
+
+def _mapa_colunas(conn, table_name: str) -> dict:
+    """Colunas da tabela (ver esquema.py; uma tabela criada na transação da importação é lida por `conn`)."""
+    return esquema.mapa_colunas(table_name, conn)
+
+
+def _primeira(col_map: dict, candidatas) -> str:
+    return next((col_map[c.lower()] for c in candidatas if c.lower() in col_map), None)
+
+
+def _texto(alias: str, coluna) -> str:
+    return f'CAST({alias}.{_q(coluna)} AS TEXT)' if coluna else 'CAST(NULL AS TEXT)'
+
+
+def _data(alias: str, coluna) -> str:
+    return f'CAST({alias}.{_q(coluna)} AS DATE)' if coluna else 'CAST(NULL AS DATE)'
+
+
+def _numero(alias: str, coluna) -> str:
+    return f'CAST({alias}.{_q(coluna)} AS DOUBLE PRECISION)' if coluna else 'CAST(0 AS DOUBLE PRECISION)'
+
+
+def _filtro_dias(expressao_data: str, dias) -> str:
+    """Restringe as linhas brutas aos dias informados (None = todos; NULL entra como um 'dia' a mais)."""
+    if dias is None:
+        return ''
+    partes = ['%s = ANY(:dias)' % expressao_data]
+    if dias.get('sem_data'):
+        partes.append(f'{expressao_data} IS NULL')
+    return ' AND (' + ' OR '.join(partes) + ')'
+
+
+def _sql_despesas(conn, dias) -> str:
+    cols = _mapa_colunas(conn, filtros_sql.TABELA_DESPESAS)
+    if not cols:
+        return None
+    col_data = _primeira(cols, filtros_sql.COLUNAS_DATA_FILTRO)
+    eh_despesa = f"COALESCE(d.{_q(cols['despesa'])} = 'S', FALSE)" if 'despesa' in cols else 'TRUE'
+    eh_tipo_d = f"COALESCE(d.{_q(cols['ved'])} = 'D', FALSE)" if 'ved' in cols else 'FALSE'
+
+    # Mesma regra de valor_calculado do data_manager
+    if all(c in cols for c in ['serie', 'liquido', 'vlcontabil']):
+        valor = f"CASE WHEN d.{_q(cols['serie'])} = 'RQ' THEN {_numero('d', cols['liquido'])} ELSE {_numero('d', cols['vlcontabil'])} END"
+    else:
+        valor = _numero('d', cols.get('vlcontabil'))
+
+    return f"""
+        SELECT :apt_id, '{FONTE_DESPESAS}', categoria, dia, dia_lancamento, placa, filial, filial_alternativa, grupo, negocio,
+               CAST(NULL AS TEXT), SUM(valor), COUNT(*)
+        FROM (
+            SELECT CASE WHEN {eh_despesa} THEN (CASE WHEN {eh_tipo_d} THEN 'tipo_d' ELSE 'despesa' END)
+                        ELSE (CASE WHEN {eh_tipo_d} THEN 'tipo_d_nao_despesa' ELSE 'nao_despesa' END) END AS categoria,
+                   {_data('d', col_data)} AS dia,
+                   {_data('d', cols.get('datacontrole'))} AS dia_lancamento,
+                   {_texto('d', _primeira(cols, config.FILTER_COLUMN_MAPS['placa']))} AS placa,
+                   {_texto('d', cols.get('nomefilial'))} AS filial,
+                   {_texto('d', cols.get('nomefil'))} AS filial_alternativa,
+                   {_texto('d', cols.get('descgrupod'))} AS grupo,
+                   {_texto('d', cols.get('descnegocio'))} AS negocio,
+                   {valor} AS valor
+            FROM {_q(filtros_sql.TABELA_DESPESAS)} d
+            WHERE d.apartamento_id = :apt_id{_filtro_dias(_data('d', col_data), dias) if col_data else ''}
+        ) x
+        GROUP BY categoria, dia, dia_lancamento, placa, filial, filial_alternativa, grupo, negocio
+    """
+
+
+def _sql_viagens(conn, dias) -> str:
+    cols = _mapa_colunas(conn, filtros_sql.TABELA_VIAGENS)
+    if not cols:
+        return None
+    col_data = _primeira(cols, filtros_sql.COLUNAS_DATA_FILTRO)
+    expressoes = [
+        (_data('v', col_data), 'dia'),
+        (_texto('v', _primeira(cols, config.FILTER_COLUMN_MAPS['placa'])), 'placa'),
+        (_texto('v', cols.get('nomefilial')), 'filial'),
+        (_texto('v', cols.get('nomefil')), 'filial_alternativa'),
+        (_texto('v', cols.get('tipofrete')), 'tipo_frete'),
+    ]
+    atributos = ','.join(f"\n                   {expressao} AS {nome}" for expressao, nome in expressoes)
+    filtro_v = f"v.apartamento_id = :apt_id{_filtro_dias(_data('v', col_data), dias) if col_data else ''}"
+
+    # Faturamento e comissão são filtrados pelo número da viagem (o isin do data_manager):
+    # cada número conta uma vez, numa só das suas linhas em viagens (a primeira por data,
+    # placa e filial), mesmo que ele se repita. O número é a chave de importação de
+    # viagens, então as linhas repetidas são sempre recalculadas juntas.
+    if 'numero' in cols:
+        ordem = ', '.join([f"CAST(v.{_q(cols['numero'])} AS TEXT)"] + [expressao for expressao, _ in expressoes]
+                          + [_data('v', cols.get('dataviagemmotorista'))])
+        viagens_por_numero = f"""(
+                SELECT DISTINCT ON (CAST(v.{_q(cols['numero'])} AS TEXT)) v.*
+                FROM {_q(filtros_sql.TABELA_VIAGENS)} v
+                WHERE v.apartamento_id = :apt_id AND v.{_q(cols['numero'])} IS NOT NULL
+                ORDER BY {ordem}
+            ) v"""
+
+    # Cada parte devolve: categoria, dia, placa, filial, filial_alternativa, tipo_frete, dia_lancamento, grupo, valor
+    partes = [f"""
+            SELECT 'viagem' AS categoria,{atributos}, CAST(NULL AS DATE) AS dia_lancamento, CAST(NULL AS TEXT) AS grupo, CAST(0 AS DOUBLE PRECISION) AS valor
+            FROM {_q(filtros_sql.TABELA_VIAGENS)} v WHERE {filtro_v}"""]
+
+    cols_fat = _mapa_colunas(conn, filtros_sql.TABELA_FATURAMENTO)
+    if 'numero' in cols and 'numero' in cols_fat and 'freteempresa' in cols_fat:
+        permite = f" AND f.{_q(cols_fat['permitefaturar'])} = 'S'" if 'permitefaturar' in cols_fat else ''
+        partes.append(f"""
+            SELECT 'faturamento',{atributos}, {_data('v', cols.get('dataviagemmotorista'))}, CAST(NULL AS TEXT), {_numero('f', cols_fat['freteempresa'])}
+            FROM {viagens_por_numero}
+            JOIN {_q(filtros_sql.TABELA_FATURAMENTO)} f ON f.apartamento_id = v.apartamento_id
+                 AND CAST(f.{_q(cols_fat['numero'])} AS TEXT) = CAST(v.{_q(cols['numero'])} AS TEXT){permite}
+            WHERE {filtro_v}""")
+
+    if 'valorquebra' in cols:
+        datas_quebra = [c for c in (cols.get('dataviagemmotorista'), cols.get('dataemissao')) if c]
+        data_quebra = f"CAST(COALESCE({', '.join('v.' + _q(c) for c in datas_quebra)}) AS DATE)" if datas_quebra else 'CAST(NULL AS DATE)'
+        partes.append(f"""
+            SELECT 'quebra',{atributos}, {data_quebra}, '{GRUPO_QUEBRA}', {_numero('v', cols['valorquebra'])}
+            FROM {_q(filtros_sql.TABELA_VIAGENS)} v
+            WHERE {filtro_v} AND v.{_q(cols['valorquebra'])} > 0""")
+
+    cols_acerto = _mapa_colunas(conn, filtros_sql.TABELA_ACERTO)
+    if 'numero' in cols and all(c in cols_acerto for c in ['tipofrete', 'vlcomissao', 'numero', 'dataviagemmotorista']):
+        # Comissão agregada por viagem; a data é a primeira data de viagem do acerto
+        partes.append(f"""
+            SELECT 'comissao',{atributos}, a.dia_comissao, '{GRUPO_COMISSAO}', a.valor
+            FROM {viagens_por_numero}
+            JOIN (
+                SELECT CAST(ac.{_q(cols_acerto['numero'])} AS TEXT) AS numero,
+                       SUM({_numero('ac', cols_acerto['vlcomissao'])}) AS valor,
+                       CAST(MIN(ac.{_q(cols_acerto['dataviagemmotorista'])}) AS DATE) AS dia_comissao
+                FROM {_q(filtros_sql.TABELA_ACERTO)} ac
+                WHERE ac.apartamento_id = :apt_id AND ac.{_q(cols_acerto['tipofrete'])} = 'P'
+                GROUP BY CAST(ac.{_q(cols_acerto['numero'])} AS TEXT)
+            ) a ON a.numero = CAST(v.{_q(cols['numero'])} AS TEXT)
+            WHERE {filtro_v} AND a.valor > 0""")
+
+    uniao = ' UNION ALL '.join(partes)
+    return f"""
+        SELECT :apt_id, '{FONTE_VIAGENS}', categoria, dia, dia_lancamento, placa, filial, filial_alternativa, grupo,
+               CAST(NULL AS TEXT), tipo_frete, SUM(valor), COUNT(*)
+        FROM ({uniao}
+        ) x
+        GROUP BY categoria, dia, dia_lancamento, placa, filial, filial_alternativa, grupo, tipo_frete
+    """
+
+
+_SQL_POR_FONTE = {FONTE_VIAGENS: _sql_viagens, FONTE_DESPESAS: _sql_despesas}
+
+
+def _bloquear(conn, apartamento_id: int):
+    """Serializa as atualizações do fato de um mesmo apartamento (liberado no fim da transação)."""
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('fato_diario'), :apt_id)"), {'apt_id': apartamento_id})
+
+
+def _tem_linhas(conn, apartamento_id: int) -> bool:
+    query = text("SELECT EXISTS (SELECT 1 FROM fato_diario WHERE apartamento_id = :apt_id)")
+    return bool(conn.execute(query, {'apt_id': apartamento_id}).scalar())
+
+
+def _recalcular_fonte(conn, apartamento_id: int, fonte: str, dias=None) -> int:
+    """Apaga e recalcula as linhas de uma fonte (todos os dias, ou só os de `dias`)."""
+    params = {'apt_id': apartamento_id, 'fonte': fonte}
+    where_delete = 'apartamento_id = :apt_id AND fonte = :fonte'
+    if dias is not None:
+        params['dias'] = sorted(dias['dias'])
+        where_delete += _filtro_dias('dia', dias)
+    conn.execute(text(f'DELETE FROM fato_diario WHERE {where_delete}'), params)
+
+    sql_select = _SQL_POR_FONTE[fonte](conn, dias)
+    if not sql_select:
+        return 0
+    params.pop('fonte')
+    result = conn.execute(text(f'INSERT INTO fato_diario ({_COLUNAS_INSERT}) {sql_select}'), params)
+    return result.rowcount
+
+
+def reconstruir(conn, apartamento_id: int):
+    """Recalcula todo o fato do apartamento. Deve rodar dentro de uma transação."""
+    _bloquear(conn, apartamento_id)
+    total = sum(_recalcular_fonte(conn, apartamento_id, fonte) for fonte in _SQL_POR_FONTE)
+    print(f" -> fato_diario reconstruído para o apartamento {apartamento_id}: {total} linhas.")
+
+
+def dias_afetados(conn, table_name: str, apartamento_id: int, key_columns: list):
+    """
+    Dias do fato tocados pelos registros de `table_name` cujas chaves estão no staging da importação.
+    Chamar antes do DELETE (dias antigos) e depois do INSERT (dias novos).
+    Retorna None para tabelas que não alimentam o fato.
+    """
+    fonte = _FONTE_POR_TABELA.get(table_name)
+    if fonte is None:
+        return None
+
+    cols = _mapa_colunas(conn, table_name)
+    cols_base = _mapa_colunas(conn, _TABELA_BASE_POR_FONTE[fonte])
+    col_data = _primeira(cols_base, filtros_sql.COLUNAS_DATA_FILTRO)
+    if not cols or not col_data or not all(c.lower() in cols for c in key_columns):
+        # Sem como localizar os dias: recalcula a fonte inteira
+        return {'fonte': fonte, 'dias': set(), 'sem_data': False, 'tudo': True}
+
+    condicao_chaves = carga_em_massa.condicao_chaves_staging(conn, 't', table_name, key_columns)
+    if table_name == _TABELA_BASE_POR_FONTE[fonte]:
+        query = f'SELECT DISTINCT {_data("t", col_data)} FROM {_q(table_name)} t WHERE t.apartamento_id = :apt_id AND {condicao_chaves}'
+    else:
+        # Faturamento e acerto entram no fato pelos dias das viagens de mesmo número
+        if 'numero' not in cols or 'numero' not in cols_base:
+            return {'fonte': fonte, 'dias': set(), 'sem_data': False, 'tudo': True}
+        query = (
+            f'SELECT DISTINCT {_data("v", col_data)} FROM {_q(_TABELA_BASE_POR_FONTE[fonte])} v '
+            f'WHERE v.apartamento_id = :apt_id AND CAST(v.{_q(cols_base["numero"])} AS TEXT) IN ('
+            f'SELECT CAST(t.{_q(cols["numero"])} AS TEXT) FROM {_q(table_name)} t WHERE t.apartamento_id = :apt_id AND {condicao_chaves})'
+        )
+    dias = [row[0] for row in conn.execute(text(query), {'apt_id': apartamento_id})]
+    return {'fonte': fonte, 'dias': {d for d in dias if d is not None}, 'sem_data': any(d is None for d in dias), 'tudo': False}
+
+
+def juntar_dias(*afetados):
+    """Junta resultados de `dias_afetados` de uma mesma fonte (ex.: antes e depois do merge)."""
+    afetados = [a for a in afetados if a is not None]
+    if not afetados:
+        return None
+    return {
+        'fonte': afetados[0]['fonte'],
+        'dias': set().union(*(a['dias'] for a in afetados)),
+        'sem_data': any(a['sem_data'] for a in afetados),
+        'tudo': any(a['tudo'] for a in afetados),
+    }
+
+
+def recalcular_dias(conn, apartamento_id: int, afetados):
+    """
+    Recalcula os dias de `afetados` (ver `juntar_dias`) na fonte correspondente.
+    Se o apartamento ainda não tem fato, reconstrói tudo.
+    """
+    if afetados is None:
+        return
+    _bloquear(conn, apartamento_id)
+    if not _tem_linhas(conn, apartamento_id):
+        reconstruir(conn, apartamento_id)
+        return
+
+    if afetados['tudo']:
+        linhas = _recalcular_fonte(conn, apartamento_id, afetados['fonte'])
+    else:
+        if not afetados['dias'] and not afetados['sem_data']:
+            return
+        linhas = _recalcular_fonte(conn, apartamento_id, afetados['fonte'], afetados)
+    print(f" -> fato_diario ({afetados['fonte']}): {linhas} linhas recalculadas.")
+
+
+def atualizar_dias_afetados(conn, table_name: str, apartamento_id: int, key_columns: list, antes):
+    """
+    Junta os dias de antes da importação com os de depois e recalcula só esses dias
+    da fonte correspondente. Se o apartamento ainda não tem fato, reconstrói tudo.
+    """
+    if antes is None:
+        return
+    recalcular_dias(conn, apartamento_id, juntar_dias(antes, dias_afetados(conn, table_name, apartamento_id, key_columns)))
+
+
+def atualizar_fonte_da_tabela(conn, table_name: str, apartamento_id: int):
+    """Recalcula a fonte inteira alimentada por `table_name` (importações sem chave, só append)."""
+    fonte = _FONTE_POR_TABELA.get(table_name)
+    if fonte is None:
+        return
+    _bloquear(conn, apartamento_id)
+    if not _tem_linhas(conn, apartamento_id):
+        reconstruir(conn, apartamento_id)
+        return
+    linhas = _recalcular_fonte(conn, apartamento_id, fonte)
+    print(f" -> fato_diario ({fonte}): {linhas} linhas recalculadas.")
+
+
+def garantir_fato_diario(apartamento_id: int):
+    """
+    Constrói o fato de um apartamento que já tinha dados antes da tabela existir.
+    Verificado uma vez por versão de dados em cada processo (a cada chamada, sem versão).
+    """
+    chave = (apartamento_id, cache_dados.get_data_version(apartamento_id))
+    if chave in _apartamentos_verificados:
+        return
+    with db.engine.begin() as conn:
+        if not _tem_linhas(conn, apartamento_id):
+            _bloquear(conn, apartamento_id)
+            if not _tem_linhas(conn, apartamento_id):
+                print(f"[FATO] Construindo fato_diario do apartamento {apartamento_id}...")
+                reconstruir(conn, apartamento_id)
+    if chave[1] is not None:
+        _apartamentos_verificados.add(chave)
+
+
+# --- Consulta ---
+
+def _condicoes_fonte(fonte: str, alias: str, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, params: dict) -> list:
+    """
+    Mesmas regras de filtros_sql, aplicadas sobre as linhas do fato de uma fonte.
+    Os filtros só valem se a tabela bruta tiver a coluna correspondente.
+    """
+    col_map = filtros_sql._mapa_colunas(_TABELA_BASE_POR_FONTE[fonte])
+
+    def _base(a):
+        condicoes = [f"{a}.apartamento_id = :apt_id", f"{a}.fonte = '{fonte}'"]
+        if (start_date or end_date) and any(c in col_map for c in filtros_sql.COLUNAS_DATA_FILTRO):
+            if start_date:
+                params['dia_inicio'] = start_date.date()
+                condicoes.append(f'{a}.dia >= :dia_inicio')
+            if end_date:
+                params['dia_fim'] = end_date.date()
+                condicoes.append(f'{a}.dia <= :dia_fim')
+        if placa_filter and placa_filter != "Todos" and _primeira(col_map, config.FILTER_COLUMN_MAPS['placa']):
+            params['placa'] = placa_filter.strip().upper()
+            condicoes.append(f'UPPER(TRIM({a}.placa)) = :placa')
+        condicoes += _condicao_tipo_negocio(fonte, a, col_map, tipo_negocio_filter, params)
+        return condicoes
+
+    condicoes = _base(alias)
+    if filial_filter:
+        params['filiais'] = [f.upper() for f in filial_filter]
+        # Só as linhas 'viagem' representam todas as viagens; nas despesas toda linha conta
+        restricao = " AND f_fl.categoria = 'viagem'" if fonte == FONTE_VIAGENS else ''
+        ramos = []
+        for coluna, nome_bruto in (('filial', 'nomefilial'), ('filial_alternativa', 'nomefil')):
+            if nome_bruto not in col_map:
+                continue
+            where = ' AND '.join(_base('f_fl')) + restricao + f' AND f_fl.{coluna} IS NOT NULL'
+            ramos.append(f'WHEN EXISTS (SELECT 1 FROM fato_diario f_fl WHERE {where}) THEN UPPER(TRIM({alias}.{coluna})) = ANY(:filiais)')
+        if ramos:
+            condicoes.append(f"(CASE {' '.join(ramos)} ELSE TRUE END)")
+    return condicoes
+
+
+def _condicao_tipo_negocio(fonte: str, alias: str, col_map: dict, tipo_negocio_filter, params: dict) -> list:
+    if not tipo_negocio_filter or tipo_negocio_filter == "Todos":
+        return []
+    if fonte == FONTE_DESPESAS:
+        if 'descnegocio' not in col_map:
+            return []
+        params['tipo_negocio'] = tipo_negocio_filter
+        return [f'{alias}.negocio = :tipo_negocio']
+
+    if 'tipofrete' not in col_map:
+        return []
+    tipo_negocio_upper = tipo_negocio_filter.upper().strip()
+    if tipo_negocio_upper == 'FROTA':
+        col_map_desp = filtros_sql._mapa_colunas(filtros_sql.TABELA_DESPESAS)
+        if 'placaveiculo' in col_map and 'veiculoproprio' in col_map_desp and 'placaveiculo' in col_map_desp:
+            return [
+                f"({alias}.tipo_frete = 'P' OR {alias}.placa IN ("
+                f"SELECT CAST(ap.{_q(col_map_desp['placaveiculo'])} AS TEXT) FROM {_q(filtros_sql.TABELA_DESPESAS)} ap "
+                f"WHERE ap.apartamento_id = :apt_id AND ap.{_q(col_map_desp['veiculoproprio'])} = 'F'))"
+            ]
+        return [f"{alias}.tipo_frete = 'P'"]
+    if 'AGENCIAMENTO' in tipo_negocio_upper:
+        return [f"{alias}.tipo_frete IN ('A', 'T')"]
+    return ['1 = 0']
+
+
+def _where_filtros(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, params: dict) -> str:
+    ramos = []
+    for fonte in (FONTE_VIAGENS, FONTE_DESPESAS):
+        condicoes = _condicoes_fonte(fonte, 'f', start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, params)
+        ramos.append('(' + ' AND '.join(condicoes) + ')')
+    return 'f.apartamento_id = :apt_id AND (' + ' OR '.join(ramos) + ')'
+
+
+_FROM_COM_FLAGS = """
+    FROM fato_diario f
+    LEFT JOIN static_expense_groups g ON g.apartamento_id = f.apartamento_id AND g.group_name = f.grupo
+"""
+_CUSTO = f"f.categoria IN {CATEGORIAS_CUSTO_DESPESA} AND COALESCE(g.is_custo_viagem, 'N') = 'S'"
+_DESPESA = f"f.categoria IN {CATEGORIAS_CUSTO_DESPESA} AND COALESCE(g.is_despesa, 'N') = 'S'"
+
+
+def obter_kpis(apartamento_id: int, start_date=None, end_date=None, placa_filter="Todos", filial_filter=None, tipo_negocio_filter="Todos") -> dict:
+    """
+    Faturamento, custo de viagem, despesas gerais e soma bruta do tipo D para os filtros.
+    O tipo D (rateado entre os veículos próprios) considera só data e filial.
+    """
+    garantir_fato_diario(apartamento_id)
+    params = {'apt_id': apartamento_id}
+    where = _where_filtros(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, params)
+    query = f"""
+        SELECT COALESCE(SUM(CASE WHEN f.categoria = 'faturamento' THEN f.valor END), 0) AS faturamento,
+               COALESCE(SUM(CASE WHEN {_CUSTO} THEN f.valor END), 0) AS custo,
+               COALESCE(SUM(CASE WHEN {_DESPESA} THEN f.valor END), 0) AS despesas
+        {_FROM_COM_FLAGS}
+        WHERE {where}
+    """
+
+    kpis = {'faturamento': 0, 'custo': 0, 'despesas': 0, 'tipo_d': 0}
+    with db.engine.connect() as conn:
+        linha = conn.execute(text(query), params).mappings().first()
+        kpis.update({k: float(linha[k]) for k in ('faturamento', 'custo', 'despesas')})
+
+        col_map_desp = filtros_sql._mapa_colunas(filtros_sql.TABELA_DESPESAS)
+        if all(c in col_map_desp for c in ['ved', 'serie', 'liquido', 'vlcontabil']):
+            params_d = {'apt_id': apartamento_id}
+            condicoes_d = _condicoes_fonte(FONTE_DESPESAS, 'f', start_date, end_date, "Todos", filial_filter, "Todos", params_d)
+            query_d = f"""
+                SELECT COALESCE(SUM(f.valor), 0)
+                {_FROM_COM_FLAGS}
+                WHERE {' AND '.join(condicoes_d)} AND f.categoria IN {CATEGORIAS_TIPO_D} AND g.incluir_em_tipo_d = TRUE
+            """
+            kpis['tipo_d'] = float(conn.execute(text(query_d), params_d).scalar())
+    return kpis
+
+
+def obter_series_periodicas(apartamento_id: int, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, periodo_format: str = 'M') -> dict:
+    """
+    Séries de Faturamento, Custo e DespesasGerais por período ('D' ou 'M') de
+    dia_lancamento, indexadas por pd.Period. Períodos sem lançamentos ficam de fora.
+    """
+    garantir_fato_diario(apartamento_id)
+    params = {'apt_id': apartamento_id}
+    where = _where_filtros(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, params)
+    periodo = 'f.dia_lancamento' if periodo_format == 'D' else "CAST(DATE_TRUNC('month', f.dia_lancamento) AS DATE)"
+    condicoes_series = {
+        'Faturamento': "f.categoria = 'faturamento'",
+        'Custo': _CUSTO,
+        'DespesasGerais': _DESPESA,
+    }
+    colunas = ',\n'.join(
+        f'SUM(CASE WHEN {cond} THEN f.quantidade END) AS "qtd_{nome}", COALESCE(SUM(CASE WHEN {cond} THEN f.valor END), 0) AS "{nome}"'
+        for nome, cond in condicoes_series.items()
+    )
+    query = f"""
+        SELECT {periodo} AS periodo, {colunas}
+        {_FROM_COM_FLAGS}
+        WHERE {where} AND f.dia_lancamento IS NOT NULL
+        GROUP BY 1
+    """
+    with db.engine.connect() as conn:
+        df = pd.read_sql_query(text(query), conn, params=params)
+
+    series = {}
+    for nome in condicoes_series:
+        df_serie = df[df[f'qtd_{nome}'].notna()]
+        serie = pd.Series(
+            df_serie[nome].astype(float).values,
+            index=pd.to_datetime(df_serie['periodo']).dt.to_period(periodo_format),
+            dtype=float,
+        )
+        serie.index.name = None
+        serie.name = nome
+        series[nome] = serie
+    return series
@@ -0,0 +1,163 @@
+# fila_importacao.py
+"""
+Importação das planilhas enviadas pelo upload em segundo plano (RQ).
+
+A rota /upload só grava os arquivos na pasta de spool
+(IMPORTACAO_PASTA_UPLOADS/<apartamento>/<lote>) e enfileira `importar_lote` na
+fila 'default' com o caminho dela; quem importa é o worker, que apaga a pasta no
+fim. O job leva só o caminho, nunca o conteúdo das planilhas (que iria parar no
+Redis). O andamento de cada arquivo (etapa atual do import_pipeline e tempos por
+etapa) fica em job.meta e é lido por /api/import_status/<job>.
+
+A fila é o padrão sempre que o Redis responde (`fila_disponivel`); a importação
+na própria requisição fica só como alternativa: sem Redis, quando o
+enfileiramento falha ou com IMPORTACAO_ASSINCRONA=0.
+
+A pasta de spool precisa ser a mesma para o web e para o worker (no
+docker-compose os dois montam o diretório do projeto; em hospedagens com um
+disco por serviço, aponte IMPORTACAO_PASTA_UPLOADS para um volume compartilhado).
+"""
+import os
+import shutil
+import time
+import uuid
+
+import redis
+from rq import Queue, get_current_job
+from rq.exceptions import NoSuchJobError
+from rq.job import Job
+from werkzeug.utils import secure_filename
+
+import import_pipeline
+
+IMPORTACAO_ASSINCRONA = os.getenv('IMPORTACAO_ASSINCRONA', '1') == '1'
+PASTA_UPLOADS = os.getenv(
+    'IMPORTACAO_PASTA_UPLOADS',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads_importacao')
+)
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Intervalo mínimo entre gravações do andamento no Redis
+_INTERVALO_PROGRESSO = 0.5
+
+
+def _conexao():
+    return redis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+
+
+def fila_disponivel(redis_conn=None) -> bool:
+    """True se o upload deve ir para a fila: IMPORTACAO_ASSINCRONA ligada e o Redis respondendo."""
+    if not IMPORTACAO_ASSINCRONA:
+        return False
+    redis_conn = redis_conn or _conexao()
+    if redis_conn is None:
+        return False
+    try:
+        return bool(redis_conn.ping())
+    except redis.RedisError as e:
+        print(f"AVISO: Redis indisponível; o upload será importado na própria requisição. Erro: {e}")
+        return False
+
+
+def enfileirar_uploads(arquivos: list, apartamento_id: int, redis_conn=None) -> str:
+    """
+    Grava os arquivos enviados (FileStorage do Flask, já com nome reconhecido) numa
+    pasta do lote no spool e enfileira a importação. Retorna o id do job.
+    Se o enfileiramento falhar, a pasta é apagada e a exceção sobe.
+    """
+    redis_conn = redis_conn or _conexao()
+    if redis_conn is None:
+        raise RuntimeError("Serviço de fila (Redis) não está disponível.")
+
+    lote = uuid.uuid4().hex
+    pasta = os.path.join(PASTA_UPLOADS, str(apartamento_id), lote)
+    os.makedirs(pasta, exist_ok=True)
+    try:
+        nomes = []
+        for arquivo in arquivos:
+            # O nome decide a tabela de destino (config.EXCEL_FILES_CONFIG), então é mantido
+            nome = secure_filename(os.path.basename(arquivo.filename))
+            arquivo.save(os.path.join(pasta, nome))
+            nomes.append(nome)
+
+        meta = {
+            'apartamento_id': apartamento_id,
+            'arquivos': {nome: {'status': 'na_fila', 'etapa': None, 'tempos': {}} for nome in nomes},
+        }
+        q = Queue(connection=redis_conn)
+        job = q.enqueue(importar_lote, pasta, nomes, apartamento_id, job_id=lote, meta=meta, job_timeout=1800)
+    except Exception:
+        shutil.rmtree(pasta, ignore_errors=True)
+        raise
+    print(f"Upload de {len(nomes)} planilhas do apartamento {apartamento_id} enfileirado (job {job.id}).")
+    return job.id
+
+
+def _gravar_andamento(job, forcar: bool = False):
+    agora = time.monotonic()
+    if forcar or agora - job.meta.get('_gravado_em', 0) >= _INTERVALO_PROGRESSO:
+        job.meta['_gravado_em'] = agora
+        job.save_meta()
+
+
+def importar_lote(pasta: str, nomes: list, apartamento_id: int) -> dict:
+    """Job do RQ: importa os arquivos do lote (em `pasta`, no spool), um por vez, registrando o andamento em job.meta."""
+    job = get_current_job()
+    andamento = job.meta['arquivos'] if job else {nome: {} for nome in nomes}
+
+    def _progresso_de(nome):
+        def _progresso(etapa, tempos):
+            andamento[nome].update(etapa=etapa, tempos={k: round(v, 2) for k, v in tempos.items()})
+            if job:
+                _gravar_andamento(job)
+        return _progresso
+
+    try:
+        for nome in nomes:
+            caminho = os.path.join(pasta, nome)
+            andamento[nome].update(status='importando')
+            if job:
+                _gravar_andamento(job, forcar=True)
+            try:
+                if not os.path.isfile(caminho):
+                    raise FileNotFoundError(
+                        f'"{nome}" não está no spool do worker ({pasta}): IMPORTACAO_PASTA_UPLOADS '
+                        'precisa ser a mesma pasta para o web e para o worker.'
+                    )
+                # Upload manual: importa mesmo que o arquivo já conste no registro de importações
+                resultado = import_pipeline.importar_arquivo(
+                    caminho, nome, apartamento_id, forcar=True, progresso=_progresso_de(nome)
+                )
+                if resultado is None:
+                    raise ValueError(f'Nome de ficheiro "{nome}" não reconhecido.')
+                andamento[nome].update(
+                    status='concluido', etapa=None,
+                    tempos={k: round(v, 2) for k, v in resultado['tempos'].items()},
+                    extra_columns=resultado['extra_columns'],
+                    novos=resultado['novos'], alterados=resultado['alterados'], inalterados=resultado['inalterados'],
+                )
+            except Exception as e:
+                andamento[nome].update(status='erro', mensagem=str(e))
+            if job:
+                _gravar_andamento(job, forcar=True)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return andamento
+
+
+def status_do_lote(job_id: str, apartamento_id: int, redis_conn=None):
+    """Estado do job e andamento por arquivo, ou None se o job não existe (ou é de outro apartamento)."""
+    redis_conn = redis_conn or _conexao()
+    if redis_conn is None:
+        return None
+    try:
+        job = Job.fetch(job_id, connection=redis_conn)
+    except NoSuchJobError:
+        return None
+    if job.meta.get('apartamento_id') != apartamento_id:
+        return None
+    return {
+        'job': job.id,
+        'status': job.get_status(),
+        'arquivos': job.meta.get('arquivos', {}),
+    }
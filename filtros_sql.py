@@ -0,0 +1,190 @@
+# filtros_sql.py
+"""
+Tradução dos filtros do dashboard (ver blueprints/helpers.parse_filters) em
+cláusulas WHERE parametrizadas sobre as tabelas relFil*.
+
+Reproduz no banco as mesmas regras que eram aplicadas em memória por
+data_manager.apply_filters_to_df e pelo pré-filtro de tipo de negócio:
+- data: primeira coluna existente entre dataControle / dataViagemMotorista / dataVenc,
+  comparada por dia (intervalo fechado); linhas sem data ficam de fora (ver
+  _condicao_data);
+- placa: comparação sem espaços e sem diferenciar maiúsculas;
+- filial: usa a primeira coluna entre nomeFilial / nomeFil que tenha algum valor
+  dentro do recorte já filtrado (mesma regra de "coluna inteligente");
+- tipo de negócio: descNegocio nas despesas; tipoFrete (e placas de apoio) nas viagens;
+- faturamento e acerto do motorista: apenas as viagens que passaram pelos filtros.
+"""
+from datetime import timedelta
+
+import config
+
+TABELA_VIAGENS = "relFilViagensCliente"
+TABELA_DESPESAS = "relFilDespesasGerais"
+TABELA_FATURAMENTO = "relFilViagensFatCliente"
+TABELA_ACERTO = "relFilAcertoMot"
+
+# Mesma ordem de prioridade usada em apply_filters_to_df
+COLUNAS_DATA_FILTRO = ['datacontrole', 'dataviagemmotorista', 'datavenc']
+
+
+def _mapa_colunas(table_name: str) -> dict:
+    # Import tardio: database importa os módulos de importação, que usam este módulo
+    import database as db
+    return {col.lower(): col for col in db.get_table_columns(table_name)}
+
+
+def _q(nome: str) -> str:
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def filtros_ativos(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter) -> bool:
+    """Indica se há algum filtro que precise virar cláusula SQL."""
+    return bool(
+        start_date or end_date
+        or (placa_filter and placa_filter != "Todos")
+        or filial_filter
+        or (tipo_negocio_filter and tipo_negocio_filter != "Todos")
+    )
+
+
+def assinatura_filtros(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter) -> tuple:
+    """Tupla estável que identifica um conjunto de filtros (usada como chave de cache)."""
+    return (
+        start_date.date().isoformat() if start_date else '',
+        end_date.date().isoformat() if end_date else '',
+        (placa_filter or 'Todos').strip().upper(),
+        ','.join(sorted(f.upper() for f in (filial_filter or []))),
+        tipo_negocio_filter or 'Todos',
+    )
+
+
+def _condicao_data(alias: str, col_map: dict, start_date, end_date, params: dict) -> list:
+    if not (start_date or end_date):
+        return []
+    col_data = next((col_map[c] for c in COLUNAS_DATA_FILTRO if c in col_map), None)
+    if not col_data:
+        return []
+
+    # Linhas com a data nula (vazia ou inválida na importação) ficam de fora, como no
+    # dropna de apply_filters_to_df. O _fix_invalid_dates não as preenche antes: as
+    # chaves de date_formats no config (ex.: 'dataControle') não batem com o mapa em
+    # minúsculas dele, então nenhuma coluna passa pelo ffill. Se isso mudar, as linhas
+    # nulas precisam entrar aqui com a data que o ffill daria a elas.
+    expressao = f'{alias}.{_q(col_data)}'
+    condicoes = []
+    if start_date:
+        params['data_inicio'] = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        condicoes.append(f'{expressao} >= :data_inicio')
+    if end_date:
+        params['data_fim_exclusiva'] = end_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        condicoes.append(f'{expressao} < :data_fim_exclusiva')
+    return condicoes
+
+
+def _condicao_placa(alias: str, col_map: dict, placa_filter, params: dict) -> list:
+    if not placa_filter or placa_filter == "Todos":
+        return []
+    placa_col = next((col_map[c.lower()] for c in config.FILTER_COLUMN_MAPS.get("placa", []) if c.lower() in col_map), None)
+    if not placa_col:
+        return []
+    params['placa'] = placa_filter.strip().upper()
+    return [f'UPPER(TRIM(CAST({alias}.{_q(placa_col)} AS TEXT))) = :placa']
+
+
+def _condicao_tipo_negocio(table_name: str, alias: str, col_map: dict, tipo_negocio_filter, params: dict) -> list:
+    if not tipo_negocio_filter or tipo_negocio_filter == "Todos":
+        return []
+
+    if table_name == TABELA_DESPESAS:
+        if 'descnegocio' not in col_map:
+            return []
+        params['tipo_negocio'] = tipo_negocio_filter
+        return [f'{alias}.{_q(col_map["descnegocio"])} = :tipo_negocio']
+
+    if table_name == TABELA_VIAGENS:
+        if 'tipofrete' not in col_map:
+            return []
+        tipo_frete = f'{alias}.{_q(col_map["tipofrete"])}'
+        tipo_negocio_upper = tipo_negocio_filter.upper().strip()
+        if tipo_negocio_upper == 'FROTA':
+            col_map_desp = _mapa_colunas(TABELA_DESPESAS)
+            if 'placaveiculo' in col_map and 'veiculoproprio' in col_map_desp and 'placaveiculo' in col_map_desp:
+                # Veículos de apoio: placas com veiculoProprio = 'F' nas despesas
+                return [
+                    f"({tipo_frete} = 'P' OR {alias}.{_q(col_map['placaveiculo'])} IN ("
+                    f"SELECT ap.{_q(col_map_desp['placaveiculo'])} FROM {_q(TABELA_DESPESAS)} ap "
+                    f"WHERE ap.apartamento_id = :apt_id AND ap.{_q(col_map_desp['veiculoproprio'])} = 'F'))"
+                ]
+            return [f"{tipo_frete} = 'P'"]
+        if 'AGENCIAMENTO' in tipo_negocio_upper:
+            return [f"{tipo_frete} IN ('A', 'T')"]
+        return ['1 = 0']
+
+    return []
+
+
+def _condicao_filial(table_name: str, alias: str, col_map: dict, filial_filter, condicoes_base_alias2: list, alias2: str, params: dict) -> list:
+    if not filial_filter:
+        return []
+    colunas = [col_map[c.lower()] for c in config.FILTER_COLUMN_MAPS.get("filial", []) if c.lower() in col_map]
+    if not colunas:
+        return []
+    params['filiais'] = [f.upper() for f in filial_filter]
+
+    def _compara(coluna):
+        return f'UPPER(TRIM(CAST({alias}.{_q(coluna)} AS TEXT))) = ANY(:filiais)'
+
+    def _tem_dados(coluna):
+        where = ' AND '.join([f'{alias2}.apartamento_id = :apt_id'] + condicoes_base_alias2 + [f'{alias2}.{_q(coluna)} IS NOT NULL'])
+        return f'EXISTS (SELECT 1 FROM {_q(table_name)} {alias2} WHERE {where})'
+
+    # Primeira coluna com dados no recorte vence; se nenhuma tiver dados, não filtra por filial.
+    ramos = ' '.join(f'WHEN {_tem_dados(col)} THEN {_compara(col)}' for col in colunas)
+    return [f'(CASE {ramos} ELSE TRUE END)']
+
+
+def _condicoes_tabela(table_name: str, alias: str, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, params: dict) -> list:
+    col_map = _mapa_colunas(table_name)
+
+    def _base(a):
+        return (
+            _condicao_tipo_negocio(table_name, a, col_map, tipo_negocio_filter, params)
+            + _condicao_data(a, col_map, start_date, end_date, params)
+            + _condicao_placa(a, col_map, placa_filter, params)
+        )
+
+    alias2 = f'{alias}_fl'
+    return _base(alias) + _condicao_filial(table_name, alias, col_map, filial_filter, _base(alias2), alias2, params)
+
+
+def montar_filtro_sql(table_name: str, apartamento_id: int, start_date=None, end_date=None, placa_filter="Todos", filial_filter=None, tipo_negocio_filter="Todos", alias: str = 't'):
+    """
+    Monta a cláusula WHERE (sem a palavra WHERE) e os parâmetros para carregar
+    `table_name` já filtrada. A tabela deve ser referenciada com o apelido `alias`.
+
+    Faturamento e acerto do motorista são restringidos às viagens filtradas;
+    o faturamento também exige permiteFaturar = 'S'.
+    """
+    params = {'apt_id': apartamento_id}
+    condicoes = [f'{alias}.apartamento_id = :apt_id']
+
+    if table_name in (TABELA_FATURAMENTO, TABELA_ACERTO):
+        col_map = _mapa_colunas(table_name)
+        if table_name == TABELA_FATURAMENTO and 'permitefaturar' in col_map:
+            condicoes.append(f"{alias}.{_q(col_map['permitefaturar'])} = 'S'")
+        col_map_viag = _mapa_colunas(TABELA_VIAGENS)
+        if 'numero' in col_map and 'numero' in col_map_viag:
+            condicoes_viagens = ['v.apartamento_id = :apt_id'] + _condicoes_tabela(
+                TABELA_VIAGENS, 'v', start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, params
+            )
+            condicoes.append(
+                f'CAST({alias}.{_q(col_map["numero"])} AS TEXT) IN ('
+                f'SELECT CAST(v.{_q(col_map_viag["numero"])} AS TEXT) FROM {_q(TABELA_VIAGENS)} v '
+                f'WHERE {" AND ".join(condicoes_viagens)})'
+            )
+        else:
+            condicoes.append('1 = 0')
+    else:
+        condicoes += _condicoes_tabela(table_name, alias, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter, params)
+
+    return ' AND '.join(condicoes), params
@@ -0,0 +1,382 @@
+# import_pipeline.py
+"""
+Pipeline único de importação das planilhas (viagens, faturamento, despesas,
+contas a pagar/receber e acerto do motorista).
+
+As etapas são sempre as mesmas e cada uma é cronometrada:
+  ler -> limpar -> filtrar -> projetar -> comparar -> staging -> mesclar
+As seis primeiras rodam bloco a bloco (ver leitor_planilhas.py), então a memória
+não cresce com o tamanho do arquivo; o merge roda uma vez, sobre o staging completo.
+O que muda de uma tabela para outra vem da configuração:
+- config.EXCEL_FILES_CONFIG: arquivo, aba e tabela de destino;
+- config.TABLE_PRIMARY_KEYS: chave usada para substituir os registros antigos;
+- config.TABLE_ROW_FILTERS: linhas da planilha que entram (ex.: despesas com VED != 'E').
+Arquivos e blocos já importados são ignorados na etapa "comparar" (ver registro_importacoes.py).
+
+As funções antigas de database.py (import_excel_to_db, process_and_import_*)
+apenas chamam `importar_planilha`.
+
+`importar_arquivos` importa os arquivos baixados de um apartamento (um por tabela)
+em paralelo, num pool de processos: cada tabela na sua transação, e fato_diario,
+veiculos e grupos de despesa atualizados uma única vez, no fim.
+"""
+import operator
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+from sqlalchemy import text
+
+import cache_dados
+import carga_em_massa
+import config
+import database as db
+import db_connection
+import fato_diario
+import filtros_sql
+import leitor_planilhas
+import registro_importacoes
+import veiculos
+
+ETAPAS = ('ler', 'limpar', 'filtrar', 'projetar', 'comparar', 'staging', 'mesclar')
+
+_OPERADORES = {'==': operator.eq, '!=': operator.ne}
+
+# Processos da importação paralela (IMPORTACAO_PROCESSOS no .env); 1 importa um arquivo por vez
+IMPORTACAO_PROCESSOS = int(os.getenv('IMPORTACAO_PROCESSOS', str(os.cpu_count() or 1)))
+
+
+@contextmanager
+def _cronometrar(tempos: dict, etapa: str, progresso=None):
+    """Soma o tempo do bloco `with` em tempos[etapa]; `progresso(etapa, tempos)` é avisado no início."""
+    if progresso:
+        progresso(etapa, tempos)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tempos[etapa] = tempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+
+def _formatar_tempos(tempos: dict) -> str:
+    return ' | '.join(f"{etapa} {tempos[etapa]:.2f}s" for etapa in ETAPAS if etapa in tempos)
+
+
+def chave_do_arquivo(filename: str):
+    """Chave de config.EXCEL_FILES_CONFIG pelo nome do arquivo (ex.: 'relFilDespesasGerais.xls' -> 'despesas')."""
+    return next((key for key, info in config.EXCEL_FILES_CONFIG.items() if info['path'] == filename), None)
+
+
+def filtrar_linhas(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """Aplica os filtros de config.TABLE_ROW_FILTERS (só os de colunas presentes na planilha)."""
+    for coluna, op, valor in config.TABLE_ROW_FILTERS.get(table_name, []):
+        if coluna in df.columns:
+            df = df[_OPERADORES[op](df[coluna], valor)]
+    return df
+
+
+def _derivados_vazios() -> dict:
+    # placas None: nenhuma tabela que alimenta veiculos foi alterada
+    return {'dias': [], 'placas': None, 'grupos': None}
+
+
+def _tem_derivados(derivados: dict) -> bool:
+    return bool(derivados['dias'] or derivados['placas'] is not None or derivados['grupos'])
+
+
+def atualizar_derivados(conn, apartamento_id: int, derivados: dict):
+    """
+    Atualiza o que é derivado das tabelas importadas: dias do fato_diario (juntando
+    os de mesma fonte), placas de veiculos e grupos de despesa.
+    `derivados` vem de `_mesclar` (ou de `juntar_derivados`, na importação paralela).
+    """
+    por_fonte = {}
+    for dias in derivados['dias']:
+        por_fonte[dias['fonte']] = fato_diario.juntar_dias(por_fonte.get(dias['fonte']), dias)
+    for dias in por_fonte.values():
+        fato_diario.recalcular_dias(conn, apartamento_id, dias)
+    if derivados['placas'] is not None:
+        veiculos.reclassificar_placas(conn, apartamento_id, derivados['placas'])
+    if derivados['grupos']:
+        tabela_origem, coluna_grupo = derivados['grupos']
+        grupos_novos = db.sincronizar_grupos_despesa(conn, apartamento_id, tabela_origem, coluna_grupo)
+        print(f" -> {grupos_novos} novos grupos de despesa cadastrados.")
+
+
+def juntar_derivados(lista: list) -> dict:
+    """Junta os derivados de várias importações (uma por tabela) para uma única atualização."""
+    juntos = _derivados_vazios()
+    for derivados in lista:
+        juntos['dias'] += derivados['dias']
+        if derivados['placas'] is not None:
+            juntos['placas'] = (juntos['placas'] or set()) | derivados['placas']
+        juntos['grupos'] = juntos['grupos'] or derivados['grupos']
+    return juntos
+
+
+def _mesclar(conn, table_name: str, apartamento_id: int, key_columns: list, colunas: list, adiar_derivados: bool) -> tuple:
+    """
+    Tira do staging as chaves inalteradas e troca os registros pelo staging. Em seguida
+    atualiza fato_diario, veiculos e os grupos de despesa (só para as chaves novas ou
+    alteradas), a não ser com `adiar_derivados`: nesse caso quem chamou faz isso depois,
+    com `atualizar_derivados`.
+    Retorna (removidos, inseridos, delta, derivados).
+    """
+    derivados = _derivados_vazios()
+    delta = carga_em_massa.descartar_inalterados(conn, table_name, apartamento_id, key_columns, colunas)
+    if delta is not None:
+        print(f" -> Delta: {delta['novas']} chaves novas, {delta['alteradas']} alteradas, {delta['inalteradas']} inalteradas.")
+        if not delta['novas'] and not delta['alteradas']:
+            return 0, 0, delta, derivados
+    dias_antes = fato_diario.dias_afetados(conn, table_name, apartamento_id, key_columns)
+    placas_antes = veiculos.placas_afetadas(conn, table_name, apartamento_id, key_columns)
+    removidos, inseridos = carga_em_massa.mesclar_staging(conn, table_name, apartamento_id, key_columns, colunas)
+    print(f" -> {removidos} registros antigos foram removidos; {inseridos} registros inseridos.")
+
+    if dias_antes is not None:
+        derivados['dias'].append(fato_diario.juntar_dias(dias_antes, fato_diario.dias_afetados(conn, table_name, apartamento_id, key_columns)))
+    if placas_antes is not None:
+        derivados['placas'] = placas_antes | veiculos.placas_afetadas(conn, table_name, apartamento_id, key_columns)
+    if table_name == filtros_sql.TABELA_DESPESAS:
+        coluna_grupo = next((col for col in colunas if col.lower() == 'descgrupod'), None)
+        # Adiado, o staging já não existe: os grupos são lidos da própria tabela
+        origem = table_name if adiar_derivados else carga_em_massa.TABELA_STAGING
+        derivados['grupos'] = (origem, coluna_grupo)
+
+    if not adiar_derivados:
+        atualizar_derivados(conn, apartamento_id, derivados)
+    return removidos, inseridos, delta, derivados
+
+
+def _blocos_cronometrados(tempos: dict, blocos, progresso=None):
+    """Itera os blocos do leitor somando o tempo de leitura em tempos['ler']."""
+    iterador = iter(blocos)
+    while True:
+        with _cronometrar(tempos, 'ler', progresso):
+            bloco = next(iterador, None)
+        if bloco is None:
+            return
+        yield bloco
+
+
+def _normalizar_chave(valor) -> str:
+    # Blocos diferentes podem trazer a mesma chave como 12, 12.0 ou '12'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _chaves_do_bloco(df: pd.DataFrame, key_columns: list) -> set:
+    colunas = {str(c).lower(): c for c in df.columns}
+    valores = [df[colunas[c.lower()]].map(_normalizar_chave) for c in key_columns]
+    return set(zip(*valores))
+
+
+def _enviar_blocos(conn, excel_source, sheet_name, table_name: str, apartamento_id: int,
+                   key_columns: list, estado: dict, pular_blocos: bool) -> bool:
+    """
+    Lê, limpa e envia os blocos ao staging. Com `pular_blocos`, blocos já importados
+    (ver registro_importacoes) ficam de fora. Retorna False se uma chave de bloco
+    pulado também aparece num bloco enviado: o merge apagaria as linhas do bloco
+    pulado, então a importação precisa ser refeita sem pular blocos.
+    """
+    tempos = estado['tempos']
+    chaves_puladas, chaves_enviadas = set(), set()
+    progresso = estado['progresso']
+    for df in _blocos_cronometrados(tempos, leitor_planilhas.ler_em_blocos(excel_source, sheet_name), progresso):
+        with _cronometrar(tempos, 'limpar', progresso):
+            df = db._clean_and_convert_data(df, table_name, estado['formatos_datas'])
+        with _cronometrar(tempos, 'filtrar', progresso):
+            df = filtrar_linhas(df, table_name)
+        with _cronometrar(tempos, 'projetar', progresso):
+            if estado['valid_columns'] is None:
+                estado['valid_columns'], estado['extra_columns'] = db._validate_columns(df.columns.tolist(), table_name)
+            df = df[estado['valid_columns']]
+        if df.empty:
+            continue
+        with _cronometrar(tempos, 'comparar', progresso):
+            hash_bloco = registro_importacoes.hash_do_bloco(df)
+            estado['blocos'].append((hash_bloco, len(df)))
+            if pular_blocos:
+                if registro_importacoes.ja_importado(conn, apartamento_id, table_name, registro_importacoes.TIPO_BLOCO, hash_bloco):
+                    estado['blocos_ignorados'] += 1
+                    chaves_puladas |= _chaves_do_bloco(df, key_columns)
+                    continue
+                chaves_enviadas |= _chaves_do_bloco(df, key_columns)
+        with _cronometrar(tempos, 'staging', progresso):
+            if estado['mapa'] is None:
+                estado['mapa'] = carga_em_massa.preparar_staging(conn, table_name, estado['valid_columns'], apartamento_id)
+            estado['linhas'] += carga_em_massa.copiar_para_staging(conn, df, estado['mapa'])
+    return chaves_puladas.isdisjoint(chaves_enviadas)
+
+
+def importar_planilha(excel_source, table_name: str, apartamento_id: int, sheet_name=0,
+                      key_columns: list = None, forcar: bool = False, adiar_derivados: bool = False,
+                      progresso=None) -> dict:
+    """
+    Importa uma planilha para `table_name`, substituindo os registros do apartamento
+    com as mesmas chaves. A planilha é lida, limpa e enviada ao staging em blocos
+    (leitor_planilhas.TAMANHO_BLOCO linhas); o merge roda uma vez, no fim.
+
+    Um arquivo idêntico a um já importado para a tabela é ignorado, assim como os
+    blocos de linhas idênticos a blocos já importados (ver registro_importacoes.py).
+    `forcar=True` importa tudo mesmo assim. No merge, só as chaves novas ou com
+    linhas alteradas são gravadas (ver carga_em_massa.descartar_inalterados).
+    Com `adiar_derivados`, fato_diario, veiculos e grupos de despesa não são atualizados
+    aqui: o que precisa ser recalculado volta em 'derivados' (ver `atualizar_derivados`).
+    `progresso(etapa, tempos)`, se informado, é chamado a cada etapa (ver fila_importacao.py).
+    Retorna {'tabela', 'extra_columns', 'removidos', 'inseridos', 'novos', 'alterados',
+    'inalterados', 'ignorado', 'blocos_ignorados', 'derivados', 'tempos'}
+    (novos/alterados/inalterados em chaves).
+    """
+    key_columns = key_columns or config.TABLE_PRIMARY_KEYS.get(table_name)
+    if not key_columns:
+        raise ValueError(f"Chaves primárias não definidas para a tabela '{table_name}'.")
+
+    resultado = {'tabela': table_name, 'extra_columns': [], 'removidos': 0, 'inseridos': 0,
+                 'novos': 0, 'alterados': 0, 'inalterados': 0,
+                 'ignorado': False, 'blocos_ignorados': 0, 'derivados': _derivados_vazios(), 'tempos': {}}
+    tempos = resultado['tempos']
+    estado = {'tempos': tempos, 'progresso': progresso, 'formatos_datas': {}, 'valid_columns': None, 'extra_columns': [], 'mapa': None}
+    try:
+        with _cronometrar(tempos, 'comparar', progresso):
+            hash_arquivo = registro_importacoes.hash_do_arquivo(excel_source)
+        posicao = None if isinstance(excel_source, (str, os.PathLike)) else excel_source.tell()
+        with db.engine.begin() as conn:
+            print(f"Iniciando importação com atualização para a tabela '{table_name}'...")
+            # O lock vem antes da consulta ao registro: outra importação da mesma tabela pode estar gravando
+            carga_em_massa.bloquear_destino(conn, table_name, apartamento_id)
+            if not forcar and registro_importacoes.ja_importado(conn, apartamento_id, table_name, registro_importacoes.TIPO_ARQUIVO, hash_arquivo):
+                print(f" -> Arquivo idêntico ao já importado para '{table_name}'. Nada a fazer.")
+                resultado['ignorado'] = True
+                return resultado
+
+            for pular_blocos in ((False,) if forcar else (True, False)):
+                estado.update(linhas=0, blocos=[], blocos_ignorados=0)
+                if _enviar_blocos(conn, excel_source, sheet_name, table_name, apartamento_id, key_columns, estado, pular_blocos):
+                    break
+                print(" -> Chaves repetidas entre blocos alterados e inalterados; refazendo a leitura sem pular blocos...")
+                conn.execute(text(f'TRUNCATE {carga_em_massa.TABELA_STAGING}'))
+                if posicao is not None:
+                    excel_source.seek(posicao)
+            resultado['extra_columns'] = estado['extra_columns']
+            resultado['blocos_ignorados'] = estado['blocos_ignorados']
+            if resultado['blocos_ignorados']:
+                print(f" -> {resultado['blocos_ignorados']} blocos idênticos aos já importados foram mantidos como estão.")
+
+            linhas = estado['linhas']
+            if linhas:
+                print(f" -> {linhas} registros enviados ao staging.")
+                with _cronometrar(tempos, 'mesclar', progresso):
+                    resultado['removidos'], resultado['inseridos'], delta, resultado['derivados'] = _mesclar(
+                        conn, table_name, apartamento_id, key_columns, list(estado['mapa'].values()), adiar_derivados
+                    )
+                if delta is not None:
+                    resultado.update(novos=delta['novas'], alterados=delta['alteradas'], inalterados=delta['inalteradas'])
+            elif not resultado['blocos_ignorados']:
+                print(f"Nenhum dado válido para importar para a tabela '{table_name}'.")
+
+            if resultado['removidos'] or resultado['inseridos']:
+                # Registros de outros arquivos podem ter sido substituídos pelo merge
+                registro_importacoes.invalidar(conn, apartamento_id, table_name)
+            for hash_bloco, linhas_bloco in estado['blocos']:
+                registro_importacoes.registrar(conn, apartamento_id, table_name, registro_importacoes.TIPO_BLOCO, hash_bloco, linhas_bloco)
+            registro_importacoes.registrar(
+                conn, apartamento_id, table_name, registro_importacoes.TIPO_ARQUIVO, hash_arquivo,
+                sum(linhas_bloco for _, linhas_bloco in estado['blocos'])
+            )
+        if resultado['removidos'] or resultado['inseridos']:
+            cache_dados.bump_data_version(apartamento_id)
+
+        print(f" -> Importação para a tabela '{table_name}' concluída com sucesso. Tempos: {_formatar_tempos(tempos)}")
+        return resultado
+    except Exception as e:
+        print(f"Erro ao importar dados para '{table_name}' (tempos até a falha: {_formatar_tempos(tempos)}): {e}")
+        raise e
+
+
+def importar_arquivo(excel_source, filename: str, apartamento_id: int, forcar: bool = False,
+                     adiar_derivados: bool = False, progresso=None) -> dict:
+    """Importa um arquivo reconhecido pelo nome (ver config.EXCEL_FILES_CONFIG). Retorna None se o nome não for reconhecido."""
+    file_key = chave_do_arquivo(os.path.basename(filename))
+    if not file_key:
+        return None
+    table_info = config.EXCEL_FILES_CONFIG[file_key]
+    return importar_planilha(excel_source, table_info['table'], apartamento_id, table_info.get('sheet_name', 0),
+                             forcar=forcar, adiar_derivados=adiar_derivados, progresso=progresso)
+
+
+def _iniciar_processo():
+    # Os pools de conexões herdados do processo pai não podem ser usados no filho:
+    # o do database e o do db_connection (usado pelo esquema.py)
+    db.engine.dispose(close=False)
+    db_connection.engine.dispose(close=False)
+
+
+def _importar_no_processo(caminho: str, filename: str, apartamento_id: int) -> dict:
+    return importar_arquivo(caminho, filename, apartamento_id, adiar_derivados=True)
+
+
+def importar_arquivos(arquivos: list, apartamento_id: int, processos: int = None) -> dict:
+    """
+    Importa os arquivos [(caminho, nome do arquivo)] de um apartamento, um processo por
+    arquivo (até `processos`, padrão IMPORTACAO_PROCESSOS). Cada tabela é gravada na
+    sua transação; no fim, fato_diario, veiculos e grupos de despesa são atualizados
+    uma vez, juntando o que cada importação alterou.
+    Retorna {nome do arquivo: resultado de `importar_arquivo` ou a exceção}. Se nem a
+    atualização dos derivados nem a reconstrução deles der certo, os arquivos que
+    alteraram as tabelas voltam com a exceção.
+    """
+    processos = min(processos or IMPORTACAO_PROCESSOS, len(arquivos))
+    if processos <= 1:
+        resultados = {}
+        for caminho, filename in arquivos:
+            try:
+                resultados[filename] = importar_arquivo(caminho, filename, apartamento_id)
+            except Exception as e:
+                resultados[filename] = e
+        return resultados
+
+    print(f"Importando {len(arquivos)} arquivos do apartamento {apartamento_id} em {processos} processos...")
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as pool:
+        futuros = {filename: pool.submit(_importar_no_processo, caminho, filename, apartamento_id) for caminho, filename in arquivos}
+    resultados = {}
+    for filename, futuro in futuros.items():
+        try:
+            resultados[filename] = futuro.result()
+        except Exception as e:
+            resultados[filename] = e
+
+    importados = [r for r in resultados.values() if isinstance(r, dict)]
+    derivados = juntar_derivados([r['derivados'] for r in importados])
+    if _tem_derivados(derivados):
+        try:
+            with db.engine.begin() as conn:
+                atualizar_derivados(conn, apartamento_id, derivados)
+        except Exception as e:
+            # As tabelas já foram gravadas e a próxima importação não verá mudança nelas:
+            # reconstrói os derivados inteiros para não deixá-los desatualizados
+            print(f"Erro ao atualizar os derivados da importação ({e}). Reconstruindo fato_diario e veiculos...")
+            try:
+                with db.engine.begin() as conn:
+                    fato_diario.reconstruir(conn, apartamento_id)
+                    veiculos.reconstruir(conn, apartamento_id)
+                    if derivados['grupos']:
+                        db.sincronizar_grupos_despesa(conn, apartamento_id, *derivados['grupos'])
+            except Exception as erro_reconstrucao:
+                # Os arquivos que alteraram as tabelas voltam como falha, como os erros de importação
+                print(f"Erro ao reconstruir fato_diario e veiculos do apartamento {apartamento_id}: {erro_reconstrucao}")
+                falha = RuntimeError(
+                    f"Registros gravados, mas fato_diario, veiculos e grupos de despesa não foram atualizados: {erro_reconstrucao}"
+                )
+                for filename, resultado in resultados.items():
+                    if isinstance(resultado, dict) and _tem_derivados(resultado['derivados']):
+                        resultados[filename] = falha
+    if any(r['removidos'] or r['inseridos'] for r in importados):
+        # Sem Redis, a versão de dados mudada nos processos do pool não chega a este processo
+        cache_dados.bump_data_version(apartamento_id)
+    print(f" -> Importação paralela concluída em {time.perf_counter() - inicio:.2f}s.")
+    return resultados
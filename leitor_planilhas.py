@@ -0,0 +1,163 @@
+# leitor_planilhas.py
+"""
+Leitura das planilhas exportadas pelo ERP em blocos de linhas, para que a
+memória da importação dependa do tamanho do bloco e não do tamanho do arquivo.
+
+- .xlsx: openpyxl em modo read_only (as linhas são lidas do XML sob demanda);
+- .xls: xlrd com on_demand=True (só a aba pedida é carregada; o formato
+  binário não permite ler uma aba pela metade, mas ele é limitado a 65.536 linhas);
+- outros formatos: pd.read_excel do arquivo inteiro, entregue em blocos.
+
+Cada bloco passa pelo mesmo TextParser usado pelo pd.read_excel (com a linha de
+cabeçalho repetida), então nomes de colunas e nulos saem como antes. Os tipos,
+porém, NÃO são inferidos pelo TextParser: ele só vê o bloco, e cada bloco
+inferiria os seus (um texto '00131492349' virava 131492349 no bloco em que a
+coluna parecia numérica; uma coluna de inteiros virava float, '123.0', só no
+bloco que tinha células vazias). As colunas ficam como object, com cada célula
+no tipo que o leitor da planilha deu a ela (texto, int, float, data), e a
+conversão das colunas declaradas é feita uma vez só, em
+database._clean_and_convert_data. Assim o mesmo valor sai igual em qualquer
+bloco, e o hash_linha não muda quando as linhas trocam de bloco.
+"""
+import math
+import os
+from datetime import time
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+# Linhas por bloco (IMPORTACAO_TAMANHO_BLOCO no .env)
+TAMANHO_BLOCO = int(os.getenv('IMPORTACAO_TAMANHO_BLOCO', '50000'))
+
+_ASSINATURA_XLS = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_ASSINATURA_ZIP = b'PK\x03\x04'
+
+
+def _formato(excel_source):
+    """'xls', 'xlsx' ou None, pelos primeiros bytes (os arquivos do ERP nem sempre têm a extensão certa)."""
+    if isinstance(excel_source, (str, os.PathLike)):
+        with open(excel_source, 'rb') as arquivo:
+            inicio = arquivo.read(8)
+    else:
+        posicao = excel_source.tell()
+        inicio = excel_source.read(8)
+        excel_source.seek(posicao)
+    if inicio.startswith(_ASSINATURA_XLS):
+        return 'xls'
+    if inicio.startswith(_ASSINATURA_ZIP):
+        return 'xlsx'
+    return None
+
+
+def _linhas_xlsx(excel_source, sheet_name):
+    """Linhas convertidas como no leitor openpyxl do pandas (vazio -> '', inteiros sem o '.0')."""
+    from openpyxl import load_workbook
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    def _converter(cell):
+        if cell.value is None:
+            return ''
+        if cell.data_type == TYPE_ERROR:
+            return np.nan
+        if cell.data_type == TYPE_NUMERIC:
+            inteiro = int(cell.value)
+            return inteiro if inteiro == cell.value else float(cell.value)
+        return cell.value
+
+    if isinstance(excel_source, (str, os.PathLike)):
+        # Aberto aqui: o openpyxl recusa caminhos terminados em .xls, mesmo com conteúdo xlsx
+        arquivo = open(excel_source, 'rb')
+    else:
+        arquivo = excel_source
+    book = load_workbook(arquivo, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = book[sheet_name] if isinstance(sheet_name, str) else book.worksheets[sheet_name]
+        sheet.reset_dimensions()
+        vazias = []
+        for row in sheet.rows:
+            linha = [_converter(cell) for cell in row]
+            while linha and linha[-1] == '':
+                linha.pop()
+            if not linha:
+                # Linhas vazias só são entregues se vier alguma linha com dados depois (como no pandas)
+                vazias.append(linha)
+                continue
+            yield from vazias
+            vazias = []
+            yield linha
+    finally:
+        book.close()
+        if arquivo is not excel_source:
+            arquivo.close()
+
+
+def _linhas_xls(excel_source, sheet_name):
+    """Linhas convertidas como no leitor xlrd do pandas (datas, booleanos, inteiros sem o '.0')."""
+    import xlrd
+    from xlrd import XL_CELL_BOOLEAN, XL_CELL_DATE, XL_CELL_ERROR, XL_CELL_NUMBER, xldate
+
+    if isinstance(excel_source, (str, os.PathLike)):
+        book = xlrd.open_workbook(excel_source, on_demand=True)
+    else:
+        book = xlrd.open_workbook(file_contents=excel_source.read(), on_demand=True)
+    epoch1904 = book.datemode
+
+    def _converter(valor, tipo):
+        if tipo == XL_CELL_DATE:
+            try:
+                valor = xldate.xldate_as_datetime(valor, epoch1904)
+            except OverflowError:
+                return valor
+            # Datas na época do Excel são só horários
+            if valor.timetuple()[0:3] == ((1904, 1, 1) if epoch1904 else (1899, 12, 31)):
+                valor = time(valor.hour, valor.minute, valor.second, valor.microsecond)
+        elif tipo == XL_CELL_ERROR:
+            valor = np.nan
+        elif tipo == XL_CELL_BOOLEAN:
+            valor = bool(valor)
+        elif tipo == XL_CELL_NUMBER and math.isfinite(valor):
+            inteiro = int(valor)
+            if inteiro == valor:
+                valor = inteiro
+        return valor
+
+    try:
+        sheet = book.sheet_by_name(sheet_name) if isinstance(sheet_name, str) else book.sheet_by_index(sheet_name)
+        for i in range(sheet.nrows):
+            yield [_converter(valor, tipo) for valor, tipo in zip(sheet.row_values(i), sheet.row_types(i))]
+    finally:
+        book.release_resources()
+
+
+def _montar_bloco(cabecalho: list, linhas: list) -> pd.DataFrame:
+    # Ajusta cada linha à largura do cabeçalho (o pandas completa as linhas curtas com '')
+    largura = len(cabecalho)
+    linhas = [linha[:largura] + [''] * (largura - len(linha)) for linha in linhas]
+    # dtype=object: sem inferência de tipos por bloco (ver o cabeçalho do módulo)
+    return TextParser([cabecalho] + linhas, header=0, skip_blank_lines=False, dtype=object).read()
+
+
+def ler_em_blocos(excel_source, sheet_name=0, tamanho_bloco: int = None):
+    """Gera DataFrames de até `tamanho_bloco` linhas da aba `sheet_name`, todos com as mesmas colunas."""
+    tamanho_bloco = tamanho_bloco or TAMANHO_BLOCO
+    formato = _formato(excel_source)
+    if formato is None:
+        df = pd.read_excel(excel_source, sheet_name=sheet_name)
+        for inicio in range(0, max(len(df), 1), tamanho_bloco):
+            yield df.iloc[inicio:inicio + tamanho_bloco]
+        return
+
+    linhas = _linhas_xlsx(excel_source, sheet_name) if formato == 'xlsx' else _linhas_xls(excel_source, sheet_name)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        return
+    bloco, entregues = [], 0
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= tamanho_bloco:
+            yield _montar_bloco(cabecalho, bloco)
+            bloco, entregues = [], entregues + 1
+    # Uma aba só com o cabeçalho ainda gera um bloco (vazio, com as colunas)
+    if bloco or not entregues:
+        yield _montar_bloco(cabecalho, bloco)
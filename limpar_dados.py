@@ -3,6 +3,7 @@ import os
 from sqlalchemy import text
 import shutil # Importação necessária para remover pastas
 import config
+import cache_dados
 
 # Importa a conexão centralizada com o banco de dados
 try:
@@ -43,7 +44,11 @@ def limpar_dados_importados(apartamento_id: int):
     
     tabelas_dependentes = [
         "static_expense_groups", 
-        "tb_logs_robo" 
+        "tb_logs_robo",
+        "fato_diario",
+        "veiculos",
+        "registro_importacoes",
+        "coleta_watermarks"
     ]
     
     tabelas_para_limpar = tabelas_importadas + tabelas_dependentes
@@ -65,6 +70,7 @@ def limpar_dados_importados(apartamento_id: int):
                         print(f"Aviso: Não foi possível limpar a tabela '{tabela}'. Erro: {e}")
             
             print("\nLimpeza de dados no banco de dados concluída com sucesso!")
+        cache_dados.bump_data_version(apartamento_id)
         
         # Chama a função para limpar a pasta de downloads após a limpeza do banco
         limpar_pasta_downloads(apartamento_id)
@@ -1,6 +1,10 @@
 # Forçando a atualização para o deploy
 import database as db
 import data_manager as dm
+import cache_resultados
+import filtros_sql
+import import_pipeline
+import opcoes_filtro
 import psycopg2
 from sqlalchemy import text
 import database as db_module
@@ -17,7 +21,11 @@ import psycopg2
 
 def get_dashboard_summary(apartamento_id: int, start_date=None, end_date=None, placa_filter="Todos", filial_filter=None, tipo_negocio_filter="Todos"):
     print(f">>> [LOGIC] Chamando get_dashboard_summary para o apartamento ID: {apartamento_id}")
-    summary_data = dm.get_dashboard_summary(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
+    summary_data = cache_resultados.obter_ou_calcular_resultado(
+        'summary', apartamento_id,
+        filtros_sql.assinatura_filtros(start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter),
+        lambda: dm.get_dashboard_summary(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
+    )
     print(f"<<< [LOGIC] Retornando dados do summary: {'Dados calculados' if summary_data else 'Vazio'}")
     return summary_data
 
@@ -67,12 +75,12 @@ def _import_all_data(apartamento_id: int):
         excel_path = os.path.join(base_path, file_info["path"])
         if os.path.exists(excel_path):
             print(f"-> Importando '{excel_path}'...")
-            db.import_excel_to_db(excel_path, file_info["sheet_name"], file_info["table_name"], apartamento_id=apartamento_id)
+            import_pipeline.importar_planilha(excel_path, file_info["table"], apartamento_id, file_info["sheet_name"])
         else:
             render_path = os.path.join("/app", file_info["path"])
             if os.path.exists(render_path):
                 print(f"-> Importando '{render_path}' (ambiente Render)...")
-                db.import_excel_to_db(render_path, file_info["sheet_name"], file_info["table_name"], apartamento_id=apartamento_id)
+                import_pipeline.importar_planilha(render_path, file_info["table"], apartamento_id, file_info["sheet_name"])
             else:
                 print(f"-> AVISO: Arquivo '{file_info['path']}' não encontrado, importação ignorada.")
     print("--- IMPORTAÇÃO DE DADOS (DO REPOSITÓRIO) CONCLUÍDA. ---")
@@ -89,6 +97,41 @@ def get_expense_audit_data(apartamento_id: int, start_date, end_date, placa_filt
     print(f">>> [LOGIC] Chamando get_expense_audit_data para o apartamento ID: {apartamento_id}")
     return dm.get_expense_audit_data(apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
 
+# Partes que podem ser pedidas ao endpoint combinado do dashboard
+PARTES_BUNDLE_DASHBOARD = ['summary', 'monthly', 'faturamento', 'despesas', 'audit']
+
+def get_dashboard_bundle(apartamento_id: int, start_date=None, end_date=None, placa_filter="Todos", filial_filter=None, tipo_negocio_filter="Todos", partes=None):
+    """
+    Calcula várias visões do dashboard (resumo, gráfico mensal, detalhes e auditoria).
+    Resumo e gráfico leem a tabela fato_diario; detalhes e auditoria compartilham
+    uma única carga/classificação dos dados filtrados (o bundle).
+    """
+    print(f">>> [LOGIC] Chamando get_dashboard_bundle para o apartamento ID: {apartamento_id}")
+    partes = [p for p in (partes or PARTES_BUNDLE_DASHBOARD) if p in PARTES_BUNDLE_DASHBOARD]
+    filtros = (apartamento_id, start_date, end_date, placa_filter, filial_filter, tipo_negocio_filter)
+
+    bundle = None
+    if any(p in partes for p in ('faturamento', 'despesas', 'audit')):
+        bundle = dm.obter_bundle_dashboard(*filtros)
+
+    calculos = {
+        'summary': lambda: dm.get_dashboard_summary(*filtros),
+        'monthly': lambda: dm.get_monthly_summary(*filtros).to_dict(orient='records'),
+        'faturamento': lambda: dm.get_faturamento_details_dashboard_data(*filtros, bundle=bundle),
+        'despesas': lambda: dm.get_despesas_details_dashboard_data(*filtros, bundle=bundle),
+        'audit': lambda: dm.get_expense_audit_data(*filtros, bundle=bundle),
+    }
+    resultado = {}
+    for parte in partes:
+        # Uma parte com erro não derruba as demais
+        try:
+            resultado[parte] = calculos[parte]()
+        except Exception as e:
+            print(f"ERRO ao calcular a parte '{parte}' do dashboard: {e}")
+            resultado[parte] = {"error": str(e)}
+    print(f"<<< [LOGIC] Retornando bundle do dashboard com as partes: {', '.join(resultado)}")
+    return resultado
+
 def ler_configuracoes_robo(apartamento_id: int):
     print(f">>> [LOGIC] Chamando ler_configuracoes_robo para o apartamento ID: {apartamento_id}")
     return dm.ler_configuracoes_robo(apartamento_id)
@@ -97,9 +140,9 @@ def salvar_configuracoes_robo(apartamento_id: int, configs: dict):
     print(f">>> [LOGIC] Chamando salvar_configuracoes_robo para o apartamento ID: {apartamento_id}")
     return dm.salvar_configuracoes_robo(apartamento_id, configs)
 
-def processar_downloads_na_pasta(apartamento_id: int):
+def processar_downloads_na_pasta(apartamento_id: int, pasta_downloads: str = None, processos: int = None):
     print(f">>> [LOGIC] Chamando processar_downloads_na_pasta para o apartamento ID: {apartamento_id}")
-    return db.processar_downloads_na_pasta(apartamento_id)
+    return db.processar_downloads_na_pasta(apartamento_id, pasta_downloads=pasta_downloads, processos=processos)
 
 # --- Função de Log de Atualizações (se mantida) ---
 def get_last_updates():
@@ -180,10 +223,12 @@ def get_despesas_por_filial_e_grupo(apartamento_id: int, start_date, end_date, f
 def get_unique_negocios(apartamento_id: int):
     """Busca os valores únicos de 'descNegocio' da tabela de despesas."""
     print(f">>> [LOGIC] Chamando get_unique_negocios para o apartamento ID: {apartamento_id}")
-    df_despesas = dm.get_data_as_dataframe("relFilDespesasGerais", apartamento_id)
-    if not df_despesas.empty and 'descNegocio' in df_despesas.columns:
-        return sorted([negocio for negocio in df_despesas['descNegocio'].dropna().unique() if negocio])
-    return []
+    return opcoes_filtro.listar_negocios(apartamento_id)
+
+def get_filter_options(apartamento_id: int):
+    """Placas, filiais e tipos de negócio para os filtros do dashboard."""
+    print(f">>> [LOGIC] Chamando get_filter_options para o apartamento ID: {apartamento_id}")
+    return opcoes_filtro.obter_opcoes_filtro(apartamento_id)
 
 
 def get_relatorio_viagem_data(apartamento_id: int, numero: int, dias_janela: int): # ALTERADO AQUI
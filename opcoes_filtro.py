@@ -0,0 +1,75 @@
+# opcoes_filtro.py
+"""
+Opções dos filtros do dashboard (placas, filiais e tipos de negócio).
+
+Cada lista sai de um SELECT DISTINCT no banco (as colunas têm índice, ver a
+migração 8) ou da tabela veiculos, e fica no cache por versão de dados do
+apartamento: só é recalculada depois de uma importação.
+"""
+from sqlalchemy import text
+
+import cache_dados
+import database as db
+import veiculos
+from filtros_sql import _q
+
+# Tabelas de onde saem as filiais (mesma lista usada antes por data_manager.get_unique_filiais)
+TABELAS_FILIAIS = [
+    "relFilViagensFatCliente",
+    "relFilDespesasGerais",
+    "relFilContasPagarDet",
+    "relFilContasReceber",
+    "relFilViagensCliente",
+]
+TABELA_NEGOCIOS = "relFilDespesasGerais"
+
+
+def _colunas_existentes(table_name: str, nomes: list) -> list:
+    col_map = {col.lower(): col for col in db.get_table_columns(table_name)}
+    return [col_map[n] for n in nomes if n in col_map]
+
+
+def _valores_distintos(apartamento_id: int, origens: list) -> set:
+    """Valores distintos (não nulos) de várias (tabela, coluna) em uma única consulta."""
+    if not origens:
+        return set()
+    partes = [
+        f'SELECT DISTINCT CAST({_q(coluna)} AS TEXT) AS valor FROM {_q(tabela)} WHERE apartamento_id = :apt_id AND {_q(coluna)} IS NOT NULL'
+        for tabela, coluna in origens
+    ]
+    with db.engine.connect() as conn:
+        return {row[0] for row in conn.execute(text(' UNION '.join(partes)), {'apt_id': apartamento_id})}
+
+
+def _calcular_filiais(apartamento_id: int) -> list:
+    origens = [
+        (tabela, coluna)
+        for tabela in TABELAS_FILIAIS
+        for coluna in _colunas_existentes(tabela, ['nomefilial', 'nomefil'])
+    ]
+    filiais = sorted(f for f in _valores_distintos(apartamento_id, origens) if f and f.strip())
+    return ["Todos"] + filiais
+
+
+def _calcular_negocios(apartamento_id: int) -> list:
+    origens = [(TABELA_NEGOCIOS, coluna) for coluna in _colunas_existentes(TABELA_NEGOCIOS, ['descnegocio'])]
+    return sorted(n for n in _valores_distintos(apartamento_id, origens) if n)
+
+
+def listar_filiais(apartamento_id: int) -> list:
+    """["Todos"] seguido das filiais (nomeFilial / nomeFil) de todas as tabelas importadas."""
+    return cache_dados.obter_ou_calcular('opcoes_filiais', apartamento_id, lambda: _calcular_filiais(apartamento_id))
+
+
+def listar_negocios(apartamento_id: int) -> list:
+    """Valores de descNegocio das despesas, ordenados."""
+    return cache_dados.obter_ou_calcular('opcoes_negocios', apartamento_id, lambda: _calcular_negocios(apartamento_id))
+
+
+def obter_opcoes_filtro(apartamento_id: int) -> dict:
+    """Todas as opções de filtro do dashboard de uma vez."""
+    return {
+        "placas": veiculos.listar_veiculos(apartamento_id),
+        "filiais": listar_filiais(apartamento_id),
+        "tipos_negocio": listar_negocios(apartamento_id),
+    }
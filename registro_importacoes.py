@@ -0,0 +1,84 @@
+# registro_importacoes.py
+"""
+Registro das planilhas já importadas (tabela registro_importacoes, migração 10).
+
+A sincronização diária baixa de novo todos os meses do ano, e os meses fechados
+chegam idênticos ao que foi importado na véspera. Para não apagar e reinserir
+esses registros toda noite, cada importação guarda:
+- o hash (sha256) do arquivo: um arquivo idêntico a um já importado é ignorado;
+- o hash de cada bloco de linhas já limpo (combinando o hash de cada linha):
+  um bloco idêntico a um já importado não vai para o staging, e os registros
+  dele ficam como estão no banco.
+
+As entradas são por apartamento e tabela e valem enquanto os registros gravados
+forem os delas. Uma importação que altera a tabela (o merge troca linhas) apaga
+as entradas da tabela antes de registrar as suas: um arquivo mais antigo
+importado de novo depois disso não é ignorado, e os registros dele voltam. (Ele
+ainda passa pela comparação linha a linha de carga_em_massa.descartar_inalterados,
+então as chaves que não mudaram não são regravadas.) A limpeza de dados do
+apartamento (limpar_dados.py) e a importação avulsa por to_sql também apagam as
+entradas, para que a importação seguinte grave tudo de novo.
+"""
+import hashlib
+import os
+
+import pandas as pd
+from sqlalchemy import text
+
+TIPO_ARQUIVO = 'arquivo'
+TIPO_BLOCO = 'bloco'
+
+_TAMANHO_LEITURA = 1024 * 1024
+
+
+def hash_do_arquivo(excel_source) -> str:
+    """sha256 do conteúdo do arquivo (caminho ou arquivo aberto; a posição de leitura é restaurada)."""
+    sha = hashlib.sha256()
+    if isinstance(excel_source, (str, os.PathLike)):
+        with open(excel_source, 'rb') as arquivo:
+            for parte in iter(lambda: arquivo.read(_TAMANHO_LEITURA), b''):
+                sha.update(parte)
+    else:
+        posicao = excel_source.tell()
+        for parte in iter(lambda: excel_source.read(_TAMANHO_LEITURA), b''):
+            sha.update(parte)
+        excel_source.seek(posicao)
+    return sha.hexdigest()
+
+
+def hash_do_bloco(df: pd.DataFrame) -> str:
+    """sha256 dos nomes das colunas e do hash de cada linha do bloco (já limpo e projetado)."""
+    sha = hashlib.sha256('\x1f'.join(map(str, df.columns)).encode())
+    sha.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+def ja_importado(conn, apartamento_id: int, table_name: str, tipo: str, hash_conteudo: str) -> bool:
+    query = text("""
+        SELECT EXISTS (
+            SELECT 1 FROM registro_importacoes
+            WHERE apartamento_id = :apt_id AND tabela = :tabela AND tipo = :tipo AND hash = :hash
+        )
+    """)
+    params = {'apt_id': apartamento_id, 'tabela': table_name, 'tipo': tipo, 'hash': hash_conteudo}
+    return bool(conn.execute(query, params).scalar())
+
+
+def registrar(conn, apartamento_id: int, table_name: str, tipo: str, hash_conteudo: str, linhas: int):
+    """Grava (ou renova a data de) uma entrada. Roda na transação da importação."""
+    query = text("""
+        INSERT INTO registro_importacoes (apartamento_id, tabela, tipo, hash, linhas)
+        VALUES (:apt_id, :tabela, :tipo, :hash, :linhas)
+        ON CONFLICT (apartamento_id, tabela, tipo, hash)
+        DO UPDATE SET linhas = EXCLUDED.linhas, importado_em = now()
+    """)
+    conn.execute(query, {'apt_id': apartamento_id, 'tabela': table_name, 'tipo': tipo, 'hash': hash_conteudo, 'linhas': linhas})
+
+
+def invalidar(conn, apartamento_id: int, table_name: str = None):
+    """Apaga as entradas do apartamento (de uma tabela ou de todas)."""
+    filtro_tabela = ' AND tabela = :tabela' if table_name else ''
+    conn.execute(
+        text(f'DELETE FROM registro_importacoes WHERE apartamento_id = :apt_id{filtro_tabela}'),
+        {'apt_id': apartamento_id, 'tabela': table_name}
+    )
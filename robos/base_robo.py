@@ -1,19 +1,21 @@
 # robos/base_robo.py (VERSÃO REATORADA E CENTRALIZADA)
 
 import os
-import time
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import WebDriverException
 import database as db
+import robos.espera_download as espera_download
+import robos.esperas as esperas
 
-def configurar_driver(apartamento_id: int):
+def configurar_driver(apartamento_id: int, pasta_downloads: str = None):
     """
-    Cria e retorna uma instância configurada do Chrome WebDriver e o caminho da pasta de downloads.
+    Cria e retorna uma instância configurada do Chrome WebDriver e o caminho da pasta de downloads
+    (downloads/<apartamento> ou a `pasta_downloads` informada, usada pelo pool de navegadores).
     """
     chrome_options = Options()
     # Descomente a linha abaixo para rodar em modo "visível" durante o desenvolvimento
@@ -28,8 +30,9 @@ def configurar_driver(apartamento_id: int):
     chrome_options.add_argument(f'user-agent={user_agent}')
     
     # Define o caminho absoluto para a pasta de downloads
-    pasta_principal = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    pasta_downloads = os.path.join(pasta_principal, 'downloads', str(apartamento_id))
+    if pasta_downloads is None:
+        pasta_principal = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        pasta_downloads = os.path.join(pasta_principal, 'downloads', str(apartamento_id))
     os.makedirs(pasta_downloads, exist_ok=True)
     
     prefs = {'download.default_directory': pasta_downloads}
@@ -39,6 +42,12 @@ def configurar_driver(apartamento_id: int):
     driver.set_page_load_timeout(300)
     return driver, pasta_downloads
 
+# Pop-ups que o ERP às vezes mostra antes do login, na ordem em que aparecem
+POPUPS_LOGIN = [
+    (By.XPATH, "//button[contains(text(), 'Limpar Cache e Continuar')]"),
+    (By.XPATH, "//button[text()='Fechar']"),
+]
+
 def fazer_login(driver, wait, configs):
     """Executa a etapa de login no site."""
     URL_LOGIN = configs.get('URL_LOGIN')
@@ -47,84 +56,89 @@ def fazer_login(driver, wait, configs):
     
     db.logar_progresso(configs['apartamento_id'], f"Acessando: {URL_LOGIN}")
     driver.get(URL_LOGIN)
-    time.sleep(1)
+    esperas.aguardar(driver, esperas.rede_ociosa(), "login: página")
     
-    # Lida com pop-ups comuns
-    try:
-        WebDriverWait(driver, 3).until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Limpar Cache e Continuar')]"))).click()
-        time.sleep(1)
-    except: pass
-    try:
-        WebDriverWait(driver, 5).until(EC.element_to_be_clickable((By.XPATH, "//button[text()='Fechar']"))).click()
-        time.sleep(1)
-    except: pass
+    # Lida com pop-ups comuns: com a página já carregada, só os que estão na tela
+    # (antes eram 3 s + 5 s de espera fixa, mesmo sem pop-up)
+    for _ in POPUPS_LOGIN:
+        popup = esperas.algum_visivel(*POPUPS_LOGIN)(driver)
+        if not popup:
+            break
+        try:
+            popup[1].click()
+        except WebDriverException:
+            break
+        esperas.aguardar(driver, EC.invisibility_of_element(popup[1]), "login: pop-up", timeout=10, obrigatorio=False)
+        # O próximo pop-up pode vir do AJAX disparado por este
+        esperas.aguardar(driver, esperas.rede_ociosa(), "login: pop-up (rede)", timeout=10, obrigatorio=False)
         
     db.logar_progresso(configs['apartamento_id'], "Preenchendo credenciais...")
-    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "input[id='formCad:nome']"))).send_keys(USUARIO)
+    esperas.aguardar(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, "input[id='formCad:nome']")), "login: formulário").send_keys(USUARIO)
     driver.find_element(By.CSS_SELECTOR, "input[id='formCad:senha']").send_keys(SENHA)
-    wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "input[id='formCad:entrar']"))).click()
+    botao_entrar = esperas.aguardar(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, "input[id='formCad:entrar']")), "login: botão")
+    botao_entrar.click()
+    # A página de login é substituída pela inicial
+    esperas.aguardar(driver, EC.staleness_of(botao_entrar), "login: envio")
+    esperas.aguardar(driver, esperas.rede_ociosa(), "login: página inicial")
     db.logar_progresso(configs['apartamento_id'], "Login realizado com sucesso.")
-    time.sleep(2)
 
 def navegar_para_relatorio(driver, wait, actions, codigo_relatorio, apartamento_id):
     """Navega no menu até a tela do relatório especificado."""
     db.logar_progresso(apartamento_id, "Navegando até 'Cadastro de Exportações'...")
-    menu_exp_imp = wait.until(EC.visibility_of_element_located((By.XPATH, "//div[contains(@id, '_label') and contains(text(), 'Exp./Imp.')]")))
+    menu_exp_imp = esperas.aguardar(driver, EC.visibility_of_element_located((By.XPATH, "//div[contains(@id, '_label') and contains(text(), 'Exp./Imp.')]")), "menu")
     actions.move_to_element(menu_exp_imp).perform()
-    time.sleep(1)
     
-    submenu_cadastro = wait.until(EC.element_to_be_clickable((By.XPATH, "//*[contains(text(), 'Cadastro de Exportações')]")))
+    submenu_cadastro = esperas.aguardar(driver, EC.element_to_be_clickable((By.XPATH, "//*[contains(text(), 'Cadastro de Exportações')]")), "submenu")
     submenu_cadastro.click()
-    time.sleep(1)
     
     db.logar_progresso(apartamento_id, f"Pesquisando pelo código de relatório '{codigo_relatorio}'...")
-    campo_codigo = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "input[id='formexpFil:ExpFil_codExp']")))
+    campo_codigo = esperas.aguardar(driver, EC.element_to_be_clickable((By.CSS_SELECTOR, "input[id='formexpFil:ExpFil_codExp']")), "cadastro de exportações")
+    esperas.aguardar(driver, esperas.rede_ociosa(), "cadastro de exportações: carga")
     campo_codigo.clear()
     campo_codigo.send_keys(codigo_relatorio)
-    time.sleep(1)
     
     actions.key_down(Keys.CONTROL).send_keys(Keys.ENTER).key_up(Keys.CONTROL).perform()
-    time.sleep(1)
+    # A lista é refeita por AJAX: antes dela voltar, pode haver outras linhas com o código
+    esperas.aguardar(driver, esperas.rede_ociosa(), "pesquisa")
     
-    link_relatorio = wait.until(EC.element_to_be_clickable((By.XPATH, f"//tr[contains(., '{codigo_relatorio}')]//a")))
+    link_relatorio = esperas.aguardar(driver, EC.element_to_be_clickable((By.XPATH, f"//tr[contains(., '{codigo_relatorio}')]//a")), "relatório na lista")
     link_relatorio.click()
-    time.sleep(1)
     
     db.logar_progresso(apartamento_id, "Acessando a área de exportação de dados...")
-    wait.until(EC.element_to_be_clickable((By.LINK_TEXT, "Exportar Dados"))).click()
-    time.sleep(5)
+    abas_antes = len(driver.window_handles)
+    esperas.aguardar(driver, EC.element_to_be_clickable((By.LINK_TEXT, "Exportar Dados")), "exportar dados").click()
 
-    # Lógica para mudar para nova aba ou iframe
-    todas_as_abas = driver.window_handles
-    if len(todas_as_abas) > 1:
-        driver.switch_to.window(todas_as_abas[-1])
+    # Lógica para mudar para nova aba ou iframe (antes: 5 s fixos e depois a conferência)
+    destino = esperas.aguardar(driver, esperas.nova_aba_ou_iframe(abas_antes), "aba ou iframe da exportação")
+    if destino == 'aba':
+        driver.switch_to.window(driver.window_handles[-1])
         db.logar_progresso(apartamento_id, "Foco alterado para a nova aba.")
     else:
         db.logar_progresso(apartamento_id, "Nenhuma nova aba detectada. Procurando por iframe...")
-        wait.until(EC.frame_to_be_available_and_switch_to_it(0))
+        esperas.aguardar(driver, EC.frame_to_be_available_and_switch_to_it(0), "iframe")
         db.logar_progresso(apartamento_id, "Foco alterado para o iframe.")
         
-    link_element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "a[onclick*=\"formCad:j_idt7\"]")))
+    link_element = esperas.aguardar(driver, EC.presence_of_element_located((By.CSS_SELECTOR, "a[onclick*=\"formCad:j_idt7\"]")), "exportação")
     onclick_script = link_element.get_attribute("onclick")
     driver.execute_script(onclick_script)
-    time.sleep(1)
+    esperas.aguardar(driver, esperas.rede_ociosa(), "formulário do relatório")
     db.logar_progresso(apartamento_id, "Tela de preenchimento do formulário alcançada.")
 
 def esperar_download_concluir(pasta_downloads, nome_arquivo_esperado, apartamento_id, tempo_max_seg=300):
-    """Monitora a pasta de downloads e aguarda a conclusão do arquivo."""
-    caminho_do_arquivo = os.path.join(pasta_downloads, nome_arquivo_esperado)
-    tempo_inicial = time.time()
-    
+    """Aguarda a conclusão do arquivo na pasta de downloads (por eventos; ver robos/espera_download.py)."""
     db.logar_progresso(apartamento_id, f"Aguardando download do arquivo '{nome_arquivo_esperado}'...")
-    
-    while time.time() - tempo_inicial < tempo_max_seg:
-        arquivo_temporario_existe = any(f.endswith('.crdownload') for f in os.listdir(pasta_downloads))
-        if os.path.exists(caminho_do_arquivo) and not arquivo_temporario_existe:
-            db.logar_progresso(apartamento_id, "-> Download concluído com sucesso!")
-            return True
-        
-        time.sleep(5)
-        
-    mensagem_erro = f"O download do arquivo '{nome_arquivo_esperado}' não foi concluído em {tempo_max_seg} segundos."
-    db.logar_progresso(apartamento_id, mensagem_erro)
-    raise Exception(mensagem_erro)
\ No newline at end of file
+
+    try:
+        download = espera_download.esperar_arquivo(pasta_downloads, nome_arquivo_esperado, tempo_max_seg)
+    except TimeoutError as e:
+        mensagem_erro = str(e)
+        db.logar_progresso(apartamento_id, mensagem_erro)
+        raise Exception(mensagem_erro)
+
+    kb = download['bytes'] / 1024
+    db.logar_progresso(
+        apartamento_id,
+        f"-> Download concluído com sucesso! {kb:.0f} KB em {download['segundos']:.1f} s "
+        f"({kb / max(download['segundos'], 0.001):.0f} KB/s, {download['modo']})."
+    )
+    return True
@@ -0,0 +1,134 @@
+# robos/espera_download.py
+"""
+Espera de downloads do Chrome por eventos do sistema de arquivos.
+
+O Chrome grava o download em '<nome>.crdownload' e, ao terminar, fecha o arquivo
+e o renomeia para o nome final. Em vez de listar a pasta a cada 5 segundos, a
+espera acorda a cada evento da pasta (inotify do Linux, via ctypes, sem
+dependência nova) e termina assim que o arquivo esperado existe, não há
+'.crdownload' pendente e o tamanho ficou estável.
+
+Sem inotify (outro sistema, limite de watches esgotado), a pasta é consultada
+com intervalos curtos que crescem aos poucos (de 0,1 s até
+DOWNLOAD_INTERVALO_MAXIMO, padrão 1 s).
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+
+DOWNLOAD_INTERVALO_MAXIMO = float(os.getenv('DOWNLOAD_INTERVALO_MAXIMO', '1'))
+# Quanto tempo o tamanho do arquivo final precisa ficar igual para o download valer como concluído
+_ESTABILIDADE_SEGUNDOS = 0.2
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_MASCARA = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+
+def _carregar_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, 'inotify_init1') and hasattr(libc, 'inotify_add_watch') else None
+
+
+_libc = _carregar_libc()
+
+
+class ObservadorPasta:
+    """Descritor inotify de uma pasta; `esperar` bloqueia até o próximo evento nela (ou o timeout)."""
+
+    def __init__(self, pasta: str):
+        if _libc is None:
+            raise OSError("inotify não está disponível neste sistema.")
+        self.fd = _libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        if _libc.inotify_add_watch(self.fd, os.fsencode(pasta), _MASCARA) < 0:
+            erro = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(erro, f"inotify_add_watch falhou para {pasta}")
+
+    def esperar(self, timeout: float) -> bool:
+        prontos, _, _ = select.select([self.fd], [], [], timeout)
+        if not prontos:
+            return False
+        # Os eventos só servem para acordar: o estado da pasta é conferido por quem chamou
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def fechar(self):
+        os.close(self.fd)
+
+
+def _abrir_observador(pasta: str):
+    try:
+        return ObservadorPasta(pasta)
+    except OSError as e:
+        print(f"[DOWNLOAD] inotify indisponível ({e}); usando consulta da pasta.")
+        return None
+
+
+def _tamanho_final(pasta: str, caminho: str):
+    """Tamanho do arquivo se ele existe e não há download pendente na pasta; senão None."""
+    if any(nome.endswith('.crdownload') for nome in os.listdir(pasta)):
+        return None
+    try:
+        return os.path.getsize(caminho)
+    except OSError:
+        return None
+
+
+def esperar_arquivo(pasta: str, nome_arquivo: str, tempo_max_seg: float = 300) -> dict:
+    """
+    Espera o download de `nome_arquivo` terminar em `pasta`. Retorna
+    {'segundos', 'bytes', 'modo'} ou levanta TimeoutError.
+    """
+    caminho = os.path.join(pasta, nome_arquivo)
+    inicio = time.monotonic()
+    os.makedirs(pasta, exist_ok=True)
+    # O observador é criado antes da primeira conferência, para não perder um evento entre as duas
+    observador = _abrir_observador(pasta)
+    intervalo = 0.1
+    candidato = None
+    try:
+        while True:
+            tamanho = _tamanho_final(pasta, caminho)
+            agora = time.monotonic()
+            if tamanho is None:
+                candidato = None
+            elif candidato is None or candidato[0] != tamanho:
+                candidato = (tamanho, agora)
+            elif agora - candidato[1] >= _ESTABILIDADE_SEGUNDOS:
+                return {
+                    'segundos': agora - inicio,
+                    'bytes': tamanho,
+                    'modo': 'inotify' if observador else 'consulta',
+                }
+
+            restante = tempo_max_seg - (agora - inicio)
+            if restante <= 0:
+                raise TimeoutError(f"O download do arquivo '{nome_arquivo}' não foi concluído em {tempo_max_seg} segundos.")
+            if candidato is not None:
+                # Arquivo final já na pasta: só falta confirmar que o tamanho parou de mudar
+                time.sleep(min(_ESTABILIDADE_SEGUNDOS, restante))
+            elif observador:
+                # Acorda no próximo evento; o limite de 1 s cobre eventos perdidos (ex.: fila do inotify cheia)
+                observador.esperar(min(restante, 1.0))
+            else:
+                time.sleep(min(intervalo, restante))
+                intervalo = min(intervalo * 2, DOWNLOAD_INTERVALO_MAXIMO)
+    finally:
+        if observador:
+            observador.fechar()
@@ -0,0 +1,150 @@
+# robos/esperas.py
+"""
+Esperas explícitas e medidas dos robôs, no lugar dos time.sleep fixos.
+
+Cada passo da navegação espera uma condição (elemento visível/clicável, página
+carregada, rede ociosa, nova aba ou iframe) e segue assim que ela vale. Quanto
+cada espera levou de fato é guardado por thread (cada thread do pool de
+navegadores coleta um apartamento). A SessaoColeta grava o resumo de cada
+relatório no log do robô, para ver e ajustar a latência real de cada passo.
+
+Ajustes (.env):
+- ESPERA_INTERVALO: intervalo entre as conferências de uma condição (padrão 0,1 s);
+- ESPERA_SILENCIO_REDE: tempo sem requisições para a rede contar como ociosa (padrão 0,3 s).
+"""
+import os
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+ESPERA_INTERVALO = float(os.getenv('ESPERA_INTERVALO', '0.1'))
+ESPERA_SILENCIO_REDE = float(os.getenv('ESPERA_SILENCIO_REDE', '0.3'))
+
+_local = threading.local()
+
+
+def _medicoes() -> list:
+    if not hasattr(_local, 'medicoes'):
+        _local.medicoes = []
+    return _local.medicoes
+
+
+def aguardar(driver, condicao, etapa: str, timeout: float = 60, obrigatorio: bool = True):
+    """
+    Espera `condicao(driver)` ser verdadeira e devolve o resultado dela. Se o tempo
+    acabar, levanta TimeoutException (ou devolve None, com obrigatorio=False).
+    A duração é registrada em nome de `etapa`.
+    """
+    inicio = time.monotonic()
+    try:
+        resultado = WebDriverWait(driver, timeout, poll_frequency=ESPERA_INTERVALO).until(condicao)
+    except TimeoutException:
+        _medicoes().append((etapa, time.monotonic() - inicio, True))
+        if obrigatorio:
+            raise
+        return None
+    _medicoes().append((etapa, time.monotonic() - inicio, False))
+    return resultado
+
+
+def coletar_medicoes() -> list:
+    """Devolve e zera as medições desta thread: [(etapa, segundos, esgotou_o_tempo)]."""
+    medicoes = _medicoes()
+    _local.medicoes = []
+    return medicoes
+
+
+def resumo(medicoes: list) -> str:
+    partes = [f"{etapa} {segundos:.1f}s" + (" (tempo esgotado)" if esgotou else "") for etapa, segundos, esgotou in medicoes]
+    total = sum(segundos for _, segundos, _ in medicoes)
+    return f"{', '.join(partes)} | total {total:.1f}s"
+
+
+# --- Condições ---
+
+def documento_pronto(driver):
+    return driver.execute_script("return document.readyState") == 'complete'
+
+
+# Conta as requisições XHR em andamento (instrumenta a página na primeira conferência)
+_JS_ESTADO_REDE = """
+if (!window.__esperasXhr) {
+    window.__esperasXhr = {ativas: 0};
+    var envio = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        window.__esperasXhr.ativas++;
+        this.addEventListener('loadend', function() { window.__esperasXhr.ativas--; });
+        return envio.apply(this, arguments);
+    };
+}
+return [
+    document.readyState,
+    window.__esperasXhr.ativas + ((window.jQuery && window.jQuery.active) || 0),
+    performance.getEntriesByType('resource').length
+];
+"""
+
+
+class rede_ociosa:
+    """
+    Página carregada, nenhuma requisição AJAX em andamento e nenhum recurso novo
+    por ESPERA_SILENCIO_REDE segundos (as telas do ERP são JSF, atualizadas por AJAX).
+    """
+
+    def __init__(self, silencio: float = None):
+        self.silencio = ESPERA_SILENCIO_REDE if silencio is None else silencio
+        self._ultimo = None
+
+    def __call__(self, driver):
+        try:
+            estado, ativas, recursos = driver.execute_script(_JS_ESTADO_REDE)
+        except WebDriverException:
+            # Página trocando no meio da conferência
+            self._ultimo = None
+            return False
+        agora = time.monotonic()
+        if estado != 'complete' or ativas > 0:
+            self._ultimo = None
+            return False
+        if self._ultimo is None or self._ultimo[0] != recursos:
+            self._ultimo = (recursos, agora)
+            return False
+        return agora - self._ultimo[1] >= self.silencio
+
+
+class algum_visivel:
+    """Devolve (índice do localizador, elemento) do primeiro dos localizadores com elemento visível."""
+
+    def __init__(self, *localizadores):
+        self.localizadores = localizadores
+
+    def __call__(self, driver):
+        for indice, localizador in enumerate(self.localizadores):
+            for elemento in driver.find_elements(*localizador):
+                try:
+                    if elemento.is_displayed():
+                        return indice, elemento
+                except WebDriverException:
+                    continue
+        return False
+
+
+class nova_aba_ou_iframe:
+    """
+    'aba' quando há mais abas do que `abas_antes`; 'iframe' quando a página tem um
+    iframe e a rede ficou ociosa sem abrir aba (o iframe pode já existir antes do clique).
+    """
+
+    def __init__(self, abas_antes: int):
+        self.abas_antes = abas_antes
+        self._rede = rede_ociosa()
+
+    def __call__(self, driver):
+        if len(driver.window_handles) > self.abas_antes:
+            return 'aba'
+        if self._rede(driver) and driver.find_elements(By.TAG_NAME, 'iframe'):
+            return 'iframe'
+        return False
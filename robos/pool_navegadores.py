@@ -0,0 +1,167 @@
+# robos/pool_navegadores.py
+"""
+Pool de navegadores para coletar vários apartamentos ao mesmo tempo no worker.
+
+O pool mantém até N Chromes headless abertos ("quentes") e os empresta às
+tarefas de coleta. Cada navegador tem a própria pasta de downloads
+(downloads/_navegadores/<pid>_<sufixo>/<n>, uma pasta por pool), então dois
+apartamentos nunca baixam na mesma pasta, nem quando duas sincronizações rodam ao
+mesmo tempo (vários workers, ou a completa junto com a diária). A pasta do pool é
+apagada em `fechar`.
+Quando todos estão emprestados, `emprestar` bloqueia até um voltar: é isso que
+limita a concorrência.
+
+Ao voltar, o navegador é limpo (cookies, abas extras, pasta de downloads) para
+que nada de um apartamento passe para o próximo. Se a limpeza falhar, ele é
+fechado e um novo é aberto no próximo empréstimo.
+
+N vem de POOL_NAVEGADORES; com 0 (padrão) é calculado pela CPU e pela memória
+disponível (MEMORIA_POR_NAVEGADOR_MB por Chrome, padrão 512).
+"""
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import robos.base_robo as base_robo
+from selenium.common.exceptions import WebDriverException
+
+POOL_NAVEGADORES = int(os.getenv('POOL_NAVEGADORES', '0'))
+MEMORIA_POR_NAVEGADOR_MB = int(os.getenv('MEMORIA_POR_NAVEGADOR_MB', '512'))
+
+PASTA_NAVEGADORES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'downloads', '_navegadores'
+)
+
+
+def _memoria_disponivel_mb():
+    """MemAvailable do /proc/meminfo; sem ele, a memória física total."""
+    try:
+        with open('/proc/meminfo') as arquivo:
+            for linha in arquivo:
+                if linha.startswith('MemAvailable:'):
+                    return int(linha.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def tamanho_automatico() -> int:
+    """Navegadores que cabem nesta máquina: um por CPU, limitado pela memória disponível."""
+    tamanho = os.cpu_count() or 1
+    memoria = _memoria_disponivel_mb()
+    if memoria is not None:
+        tamanho = min(tamanho, memoria // MEMORIA_POR_NAVEGADOR_MB)
+    return max(tamanho, 1)
+
+
+def esvaziar_pasta(pasta: str):
+    """Apaga o conteúdo da pasta, mantendo a pasta (o Chrome já aberto continua baixando nela)."""
+    os.makedirs(pasta, exist_ok=True)
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome)
+        if os.path.isdir(caminho):
+            shutil.rmtree(caminho, ignore_errors=True)
+        else:
+            os.unlink(caminho)
+
+
+class Navegador:
+    """Um Chrome do pool, com a sua pasta de downloads. Quem o pega emprestado usa `driver`."""
+
+    def __init__(self, indice: int, pasta_downloads: str):
+        self.indice = indice
+        self.pasta_downloads = pasta_downloads
+        self.driver = None
+        # Página de depois do login no ERP, enquanto a sessão do apartamento atual vale (ver SessaoColeta)
+        self.pagina_inicial = None
+
+    def abrir(self):
+        self.driver, _ = base_robo.configurar_driver(None, pasta_downloads=self.pasta_downloads)
+
+    def limpar(self):
+        """Deixa o navegador como novo para o próximo apartamento."""
+        self.pagina_inicial = None
+        if self.driver is not None:
+            principal = self.driver.window_handles[0]
+            for aba in self.driver.window_handles[1:]:
+                self.driver.switch_to.window(aba)
+                self.driver.close()
+            self.driver.switch_to.window(principal)
+            self.driver.delete_all_cookies()
+            self.driver.get('about:blank')
+        # Depois do fechar do pool a pasta já foi apagada, e não deve ser recriada
+        if os.path.isdir(self.pasta_downloads):
+            esvaziar_pasta(self.pasta_downloads)
+
+    def fechar(self):
+        self.pagina_inicial = None
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+        self.driver = None
+
+
+class PoolNavegadores:
+    def __init__(self, tamanho: int = None):
+        self.tamanho = tamanho or POOL_NAVEGADORES or tamanho_automatico()
+        # LIFO: o navegador devolvido por último (o mais "quente") é o próximo emprestado
+        self._livres = queue.LifoQueue()
+        self._todos = []
+        self._lock = threading.Lock()
+        os.makedirs(PASTA_NAVEGADORES, exist_ok=True)
+        self.pasta = tempfile.mkdtemp(prefix=f'{os.getpid()}_', dir=PASTA_NAVEGADORES)
+        for indice in range(self.tamanho):
+            navegador = Navegador(indice, os.path.join(self.pasta, str(indice)))
+            self._todos.append(navegador)
+            self._livres.put(navegador)
+        print(f"[POOL] Pool com {self.tamanho} navegadores.")
+
+    def aquecer(self):
+        """Abre de uma vez os navegadores ainda fechados (senão, cada um abre no primeiro empréstimo)."""
+        livres = []
+        with self._lock:
+            while True:
+                try:
+                    livres.append(self._livres.get_nowait())
+                except queue.Empty:
+                    break
+        try:
+            for navegador in livres:
+                if navegador.driver is None:
+                    navegador.abrir()
+        finally:
+            for navegador in livres:
+                self._livres.put(navegador)
+
+    @contextmanager
+    def emprestar(self, timeout: float = None):
+        """Empresta um navegador (bloqueia enquanto todos estiverem em uso, até `timeout` segundos)."""
+        try:
+            navegador = self._livres.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Nenhum navegador livre no pool em {timeout} segundos.")
+        try:
+            if navegador.driver is None:
+                navegador.abrir()
+            esvaziar_pasta(navegador.pasta_downloads)
+            yield navegador
+        finally:
+            try:
+                navegador.limpar()
+            except Exception as e:
+                print(f"[POOL] Navegador {navegador.indice} descartado na devolução: {e}")
+                navegador.fechar()
+            self._livres.put(navegador)
+
+    def fechar(self):
+        for navegador in self._todos:
+            navegador.fechar()
+        shutil.rmtree(self.pasta, ignore_errors=True)
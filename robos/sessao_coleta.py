@@ -0,0 +1,150 @@
+# robos/sessao_coleta.py
+"""
+Sessão de coleta: um único Chrome, autenticado uma vez, usado por todos os robôs
+de um apartamento.
+
+Antes, cada robô abria o próprio navegador e fazia o login do zero. Agora o
+coletor_principal abre uma SessaoColeta e a repassa aos robôs; cada relatório
+volta à página inicial do ERP (a de depois do login) e segue o menu a partir dali.
+O login só é refeito quando a sessão expira (a tela de login reaparece) ou quando
+o navegador cai, e nesses casos o relatório é tentado mais uma vez.
+
+Os robôs continuam podendo rodar sozinhos (sem `sessao`): abrem uma sessão só
+para eles, como antes.
+
+Com `navegador` (um empréstimo do robos/pool_navegadores.py), a sessão usa o
+Chrome e a pasta de downloads do pool em vez de abrir um, não o fecha no fim e
+guarda nele a página inicial: as sessões seguintes do mesmo empréstimo (os
+outros meses do apartamento) aproveitam o login.
+"""
+import logic
+import database as db
+import robos.base_robo as base_robo
+import robos.esperas as esperas
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+SELETOR_CAMPO_USUARIO = "input[id='formCad:nome']"
+
+
+class SessaoColeta:
+    def __init__(self, apartamento_id: int, configs: dict = None, navegador=None):
+        self.apartamento_id = apartamento_id
+        self.configs = configs if configs is not None else logic.ler_configuracoes_robo(apartamento_id)
+        self.configs['apartamento_id'] = apartamento_id
+        self.navegador = navegador
+        self.driver = None
+        self.wait = None
+        self.actions = None
+        self.pasta_downloads = None
+        self.pagina_inicial = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
+
+    def credenciais_definidas(self) -> bool:
+        return all([self.configs.get('USUARIO_ROBO'), self.configs.get('SENHA_ROBO'), self.configs.get('URL_LOGIN')])
+
+    def _abrir_navegador(self):
+        if self.navegador is not None:
+            if self.navegador.driver is None:
+                self.navegador.abrir()
+            self.driver, self.pasta_downloads = self.navegador.driver, self.navegador.pasta_downloads
+            self.pagina_inicial = self.navegador.pagina_inicial
+        else:
+            self.driver, self.pasta_downloads = base_robo.configurar_driver(self.apartamento_id)
+        self.wait = WebDriverWait(self.driver, 60)
+        self.actions = ActionChains(self.driver)
+
+    def _autenticar(self):
+        base_robo.fazer_login(self.driver, self.wait, self.configs)
+        # A página de depois do login é o ponto de partida de todos os relatórios
+        self.pagina_inicial = self.driver.current_url
+        if self.navegador is not None:
+            self.navegador.pagina_inicial = self.pagina_inicial
+
+    def _na_tela_de_login(self) -> bool:
+        return bool(self.driver.find_elements(By.CSS_SELECTOR, SELETOR_CAMPO_USUARIO))
+
+    def _voltar_ao_inicio(self):
+        """Fecha as abas abertas pelo relatório anterior e recarrega a página inicial."""
+        principal = self.driver.window_handles[0]
+        for aba in self.driver.window_handles[1:]:
+            self.driver.switch_to.window(aba)
+            self.driver.close()
+        self.driver.switch_to.window(principal)
+        self.driver.switch_to.default_content()
+        self.driver.get(self.pagina_inicial)
+
+    def _preparar(self):
+        """Garante um navegador aberto e autenticado, na página inicial do ERP."""
+        if self.driver is None:
+            self._abrir_navegador()
+            if self.pagina_inicial is None:
+                self._autenticar()
+                return
+        self._voltar_ao_inicio()
+        if self._na_tela_de_login():
+            db.logar_progresso(self.apartamento_id, "Sessão expirada. Autenticando novamente...")
+            self._autenticar()
+
+    def _sessao_perdida(self) -> bool:
+        """Depois de uma falha: True se ela veio da sessão (expirada ou navegador caído)."""
+        try:
+            self.driver.switch_to.default_content()
+            return self._na_tela_de_login()
+        except WebDriverException:
+            db.logar_progresso(self.apartamento_id, "O navegador parou de responder. Abrindo um novo...")
+            if self.navegador is not None:
+                self.navegador.fechar()
+            self.fechar()
+            return True
+
+    def coletar_relatorio(self, codigo_relatorio, preencher_formulario, nome_arquivo: str):
+        """
+        Abre o relatório `codigo_relatorio`, chama `preencher_formulario(driver, wait)`,
+        gera a exportação e espera o download de `nome_arquivo`.
+        """
+        esperas.coletar_medicoes()
+        try:
+            self._tentar_relatorio(codigo_relatorio, preencher_formulario, nome_arquivo)
+        finally:
+            medicoes = esperas.coletar_medicoes()
+            if medicoes:
+                db.logar_progresso(self.apartamento_id, f"Esperas do relatório '{codigo_relatorio}': {esperas.resumo(medicoes)}")
+
+    def _tentar_relatorio(self, codigo_relatorio, preencher_formulario, nome_arquivo: str):
+        for tentativa in (1, 2):
+            try:
+                self._preparar()
+                base_robo.navegar_para_relatorio(self.driver, self.wait, self.actions, codigo_relatorio, self.apartamento_id)
+                preencher_formulario(self.driver, self.wait)
+
+                self.actions.key_down(Keys.CONTROL).send_keys(Keys.ENTER).key_up(Keys.CONTROL).perform()
+                esperas.aguardar(self.driver, EC.element_to_be_clickable((By.PARTIAL_LINK_TEXT, "Clique aqui para visualizar")), "geração do relatório").click()
+
+                base_robo.esperar_download_concluir(self.pasta_downloads, nome_arquivo, self.apartamento_id)
+                return
+            except Exception:
+                if tentativa == 2 or self.driver is None or not self._sessao_perdida():
+                    raise
+                db.logar_progresso(self.apartamento_id, f"Repetindo o relatório '{codigo_relatorio}' com uma nova sessão...")
+
+    def fechar(self):
+        # O navegador emprestado é do pool: quem o limpa (ou fecha) é ele
+        if self.driver and self.navegador is None:
+            db.logar_progresso(self.apartamento_id, "Fechando o navegador.")
+            try:
+                self.driver.quit()
+            except WebDriverException:
+                pass
+        self.driver = None
+        self.pagina_inicial = None
@@ -1,10 +1,13 @@
 document.addEventListener('DOMContentLoaded', function () {
     const params = new URLSearchParams(window.location.search);
     
-    fetch(`/api/despesas_dashboard_data?${params.toString()}`)
+    // Mesmo endpoint combinado do painel (/api/dashboard_bundle), só com a parte desta página
+    params.set('partes', 'despesas');
+    fetch(`/api/dashboard_bundle?${params.toString()}`)
         .then(response => response.json())
-        .then(data => {
-            if (!data || Object.keys(data).length === 0) {
+        .then(bundle => {
+            const data = bundle.despesas;
+            if (!data || data.error || Object.keys(data).length === 0) {
                 document.querySelector('.dashboard-layout').innerHTML = '<h2>Não há dados de despesas para os filtros selecionados.</h2>';
                 return;
             }
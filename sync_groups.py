@@ -1,3 +1,14 @@
+import sys
 import data_manager as dm
 if __name__ == '__main__':
-    dm.sync_expense_groups()
\ No newline at end of file
+    if len(sys.argv) < 2:
+        print("ERRO: Por favor, forneça o ID do apartamento que deseja sincronizar.")
+        print("Uso: python sync_groups.py <ID_DO_APARTAMENTO>")
+        sys.exit(1)
+
+    try:
+        apartamento_id_alvo = int(sys.argv[1])
+    except ValueError:
+        print(f"ERRO: O ID '{sys.argv[1]}' não é um número válido.")
+        sys.exit(1)
+    dm.sync_expense_groups(apartamento_id_alvo)
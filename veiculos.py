@@ -0,0 +1,168 @@
+# veiculos.py
+"""
+Tabela veiculos: as placas de cada apartamento já classificadas.
+
+- 'Próprio', 'Terceiro' ou 'Agregado': tipoFrete ('P', 'T', 'A') da viagem mais
+  recente da placa em relFilViagensCliente;
+- 'Apoio': placas com veiculoProprio = 'F' em relFilDespesasGerais que não
+  aparecem em nenhuma viagem com aqueles tipos de frete.
+primeiro_visto / ultimo_visto são a menor e a maior data em que a placa aparece
+(dataViagemMotorista nas viagens, dataControle nas despesas de apoio).
+
+Assim como o fato_diario, a tabela é mantida pelas importações, na mesma
+transação: `placas_afetadas` antes do DELETE e `atualizar_placas_afetadas` depois do INSERT.
+"""
+from sqlalchemy import text
+
+import cache_dados
+import carga_em_massa
+import database as db
+import esquema
+import filtros_sql
+from filtros_sql import _q
+
+_TABELAS_ORIGEM = (filtros_sql.TABELA_VIAGENS, filtros_sql.TABELA_DESPESAS)
+
+# (apartamento_id, versao_dados) já verificados por garantir_veiculos neste processo
+_apartamentos_verificados = set()
+
+
+def _mapa_colunas(conn, table_name: str) -> dict:
+    return esquema.mapa_colunas(table_name, conn)
+
+
+def _data(alias: str, col_map: dict, nome: str) -> str:
+    return f'CAST({alias}.{_q(col_map[nome])} AS DATE)' if nome in col_map else 'CAST(NULL AS DATE)'
+
+
+def _recalcular(conn, apartamento_id: int, placas: list = None) -> int:
+    """Apaga e reclassifica as placas informadas (None = todas as placas do apartamento)."""
+    params = {'apt_id': apartamento_id}
+    filtro_veiculos = ''
+    if placas is not None:
+        params['placas'] = placas
+        filtro_veiculos = ' AND placa = ANY(:placas)'
+    conn.execute(text(f'DELETE FROM veiculos WHERE apartamento_id = :apt_id{filtro_veiculos}'), params)
+
+    col_viag = _mapa_colunas(conn, filtros_sql.TABELA_VIAGENS)
+    col_desp = _mapa_colunas(conn, filtros_sql.TABELA_DESPESAS)
+    origens = []
+    if all(c in col_viag for c in ['placaveiculo', 'tipofrete']):
+        placa = f"TRIM(CAST(v.{_q(col_viag['placaveiculo'])} AS TEXT))"
+        tipo_frete = f"v.{_q(col_viag['tipofrete'])}"
+        origens.append(f"""
+            SELECT {placa} AS placa,
+                   CASE {tipo_frete} WHEN 'P' THEN 'Próprio' WHEN 'T' THEN 'Terceiro' ELSE 'Agregado' END AS tipo,
+                   {_data('v', col_viag, 'dataviagemmotorista')} AS dia, 1 AS prioridade
+            FROM {_q(filtros_sql.TABELA_VIAGENS)} v
+            WHERE v.apartamento_id = :apt_id AND {tipo_frete} IN ('P', 'T', 'A'){' AND ' + placa + ' = ANY(:placas)' if placas is not None else ''}""")
+    if all(c in col_desp for c in ['placaveiculo', 'veiculoproprio']):
+        placa = f"TRIM(CAST(d.{_q(col_desp['placaveiculo'])} AS TEXT))"
+        origens.append(f"""
+            SELECT {placa}, 'Apoio', {_data('d', col_desp, 'datacontrole')}, 2
+            FROM {_q(filtros_sql.TABELA_DESPESAS)} d
+            WHERE d.apartamento_id = :apt_id AND d.{_q(col_desp['veiculoproprio'])} = 'F'{' AND ' + placa + ' = ANY(:placas)' if placas is not None else ''}""")
+    if not origens:
+        return 0
+
+    # Viagens (prioridade 1) vencem o apoio; entre viagens, vale a mais recente
+    sql_insert = text(f"""
+        INSERT INTO veiculos (apartamento_id, placa, tipo, primeiro_visto, ultimo_visto)
+        SELECT :apt_id, placa,
+               (ARRAY_AGG(tipo ORDER BY dia DESC NULLS LAST))[1],
+               MIN(dia), MAX(dia)
+        FROM (
+            SELECT o.*, MIN(o.prioridade) OVER (PARTITION BY o.placa) AS melhor_prioridade
+            FROM ({' UNION ALL '.join(origens)}) o
+            WHERE o.placa IS NOT NULL AND o.placa <> ''
+        ) x
+        WHERE prioridade = melhor_prioridade
+        GROUP BY placa
+    """)
+    return conn.execute(sql_insert, params).rowcount
+
+
+def _bloquear(conn, apartamento_id: int):
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('veiculos'), :apt_id)"), {'apt_id': apartamento_id})
+
+
+def _tem_linhas(conn, apartamento_id: int) -> bool:
+    query = text("SELECT EXISTS (SELECT 1 FROM veiculos WHERE apartamento_id = :apt_id)")
+    return bool(conn.execute(query, {'apt_id': apartamento_id}).scalar())
+
+
+def reconstruir(conn, apartamento_id: int):
+    """Reclassifica todas as placas do apartamento. Deve rodar dentro de uma transação."""
+    _bloquear(conn, apartamento_id)
+    total = _recalcular(conn, apartamento_id)
+    print(f" -> veiculos reconstruído para o apartamento {apartamento_id}: {total} placas.")
+
+
+def placas_afetadas(conn, table_name: str, apartamento_id: int, key_columns: list):
+    """
+    Placas dos registros de `table_name` cujas chaves estão no staging da importação.
+    Chamar antes do DELETE (placas antigas) e depois do INSERT (placas novas).
+    Retorna None para tabelas que não alimentam a tabela de veículos.
+    """
+    if table_name not in _TABELAS_ORIGEM:
+        return None
+    cols = _mapa_colunas(conn, table_name)
+    if 'placaveiculo' not in cols or not all(c.lower() in cols for c in key_columns):
+        return set()
+    condicao_chaves = carga_em_massa.condicao_chaves_staging(conn, 't', table_name, key_columns)
+    query = text(
+        f"SELECT DISTINCT TRIM(CAST(t.{_q(cols['placaveiculo'])} AS TEXT)) FROM {_q(table_name)} t "
+        f"WHERE t.apartamento_id = :apt_id AND {condicao_chaves}"
+    )
+    return {row[0] for row in conn.execute(query, {'apt_id': apartamento_id}) if row[0]}
+
+
+def reclassificar_placas(conn, apartamento_id: int, placas):
+    """Reclassifica as placas informadas (ou tudo, se o apartamento ainda não tem veículos)."""
+    _bloquear(conn, apartamento_id)
+    if not _tem_linhas(conn, apartamento_id):
+        reconstruir(conn, apartamento_id)
+        return
+    if placas:
+        total = _recalcular(conn, apartamento_id, sorted(placas))
+        print(f" -> veiculos: {total} placas reclassificadas.")
+
+
+def atualizar_placas_afetadas(conn, table_name: str, apartamento_id: int, key_columns: list, antes):
+    """Reclassifica as placas de antes e de depois da importação (ou tudo, se o apartamento ainda não tem veículos)."""
+    if antes is None:
+        return
+    reclassificar_placas(conn, apartamento_id, antes | placas_afetadas(conn, table_name, apartamento_id, key_columns))
+
+
+def atualizar_tudo_da_tabela(conn, table_name: str, apartamento_id: int):
+    """Importações sem chave (só append): reclassifica todas as placas."""
+    if table_name in _TABELAS_ORIGEM:
+        reconstruir(conn, apartamento_id)
+
+
+def garantir_veiculos(apartamento_id: int):
+    """Classifica as placas de um apartamento que já tinha dados antes da tabela existir."""
+    chave = (apartamento_id, cache_dados.get_data_version(apartamento_id))
+    if chave in _apartamentos_verificados:
+        return
+    with db.engine.begin() as conn:
+        if not _tem_linhas(conn, apartamento_id):
+            _bloquear(conn, apartamento_id)
+            if not _tem_linhas(conn, apartamento_id):
+                reconstruir(conn, apartamento_id)
+    if chave[1] is not None:
+        _apartamentos_verificados.add(chave)
+
+
+def listar_veiculos(apartamento_id: int) -> list:
+    """Placas do apartamento como [{'placa', 'tipo'}], ordenadas por tipo e placa. Servido do cache por versão de dados."""
+    def _carregar():
+        garantir_veiculos(apartamento_id)
+        with db.engine.connect() as conn:
+            query = text("SELECT placa, tipo FROM veiculos WHERE apartamento_id = :apt_id")
+            lista = [dict(row) for row in conn.execute(query, {'apt_id': apartamento_id}).mappings()]
+        # Ordena em Python (e não no banco) para não depender da collation do Postgres
+        lista.sort(key=lambda x: (x['tipo'], x['placa']))
+        return lista
+    return cache_dados.obter_ou_calcular('veiculos', apartamento_id, _carregar)
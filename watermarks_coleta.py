@@ -0,0 +1,124 @@
+# watermarks_coleta.py
+"""
+Marcas d'água da coleta (tabela coleta_watermarks, migração 12): até que dia cada
+relatório do ERP já foi coletado e importado, por apartamento.
+
+A sincronização diária baixava todos os meses de janeiro até o mês atual, todas
+as noites, embora os meses fechados quase não mudem. Com as marcas, ela coleta:
+- a janela aberta: os COLETA_MESES_ABERTOS meses mais recentes (padrão 2, o
+  atual e o anterior) mais COLETA_MESES_RETROATIVOS (padrão 0) para trás;
+- desde a marca, para o relatório que ficou para trás (coletas que falharam);
+- tudo desde janeiro (a sincronização completa) quando o relatório ainda não
+  tem marca, quando a última completa tem mais de COLETA_COMPLETA_DIAS (padrão 7),
+  ou quando pedida: `python worker.py sincronizacao-completa` (todos os
+  apartamentos) ou `invalidar` (botão no painel do super admin, ou
+  `python worker.py invalidar-marcas <apartamento_id> [relatorio]`).
+
+A marca só avança com períodos contínuos: um mês que falha no meio da coleta
+completa segura a marca nele, e a noite seguinte coleta a partir dali.
+"""
+import calendar
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+
+COLETA_MESES_ABERTOS = int(os.getenv('COLETA_MESES_ABERTOS', '2'))
+COLETA_MESES_RETROATIVOS = int(os.getenv('COLETA_MESES_RETROATIVOS', '0'))
+COLETA_COMPLETA_DIAS = int(os.getenv('COLETA_COMPLETA_DIAS', '7'))
+
+FORMATO_DATA = '%d/%m/%Y'
+
+
+def _mes_anterior(dia: date, meses: int) -> date:
+    """Primeiro dia do mês `meses` meses antes do mês de `dia`."""
+    indice = dia.year * 12 + dia.month - 1 - meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def inicio_janela_aberta(hoje: date) -> date:
+    return _mes_anterior(hoje, max(COLETA_MESES_ABERTOS, 1) - 1 + COLETA_MESES_RETROATIVOS)
+
+
+def inicio_completa(hoje: date) -> date:
+    """Início da sincronização completa: janeiro do ano corrente (ou a janela aberta, se começa antes)."""
+    return min(date(hoje.year, 1, 1), inicio_janela_aberta(hoje))
+
+
+def ler(conn, apartamento_id: int) -> dict:
+    """relatorio -> {'coletado_ate', 'ultima_coleta', 'ultima_completa'}."""
+    query = text("""
+        SELECT relatorio, coletado_ate, ultima_coleta, ultima_completa
+        FROM coleta_watermarks WHERE apartamento_id = :apt_id
+    """)
+    return {row['relatorio']: dict(row) for row in conn.execute(query, {'apt_id': apartamento_id}).mappings()}
+
+
+def planejar(conn, apartamento_id: int, relatorios: list, completa: bool = False, hoje: date = None) -> list:
+    """
+    Períodos mensais a coletar para o apartamento, do mais antigo ao mês atual:
+    [(data_inicial, data_final, [relatorios])], com as datas em dd/mm/aaaa.
+    Cada período leva só os relatórios que precisam dele.
+    """
+    hoje = hoje or date.today()
+    marcas = ler(conn, apartamento_id)
+    aberta = inicio_janela_aberta(hoje)
+    limite_completa = datetime.now() - timedelta(days=COLETA_COMPLETA_DIAS)
+
+    inicio_por_relatorio = {}
+    for relatorio in relatorios:
+        marca = marcas.get(relatorio)
+        if (completa or marca is None or marca['coletado_ate'] is None
+                or marca['ultima_completa'] is None or marca['ultima_completa'] < limite_completa):
+            inicio_por_relatorio[relatorio] = inicio_completa(hoje)
+        else:
+            # A partir do mês do primeiro dia ainda não coletado, e nunca depois da janela aberta
+            inicio_por_relatorio[relatorio] = min(aberta, _mes_anterior(marca['coletado_ate'] + timedelta(days=1), 0))
+
+    periodos = []
+    mes = min(inicio_por_relatorio.values(), default=aberta)
+    while mes <= hoje:
+        ultimo_dia = date(mes.year, mes.month, calendar.monthrange(mes.year, mes.month)[1])
+        do_periodo = [relatorio for relatorio in relatorios if inicio_por_relatorio[relatorio] <= mes]
+        periodos.append((mes.strftime(FORMATO_DATA), ultimo_dia.strftime(FORMATO_DATA), do_periodo))
+        mes = ultimo_dia + timedelta(days=1)
+    return periodos
+
+
+def registrar(conn, apartamento_id: int, relatorios: list, data_inicial: str, data_final: str, hoje: date = None):
+    """
+    Registra a coleta (e importação) bem-sucedida do período para os relatórios.
+    Um período que começa no início da sincronização completa renova a marca e a
+    data da última completa; os demais só a avançam se continuarem a partir dela.
+    """
+    inicio = datetime.strptime(data_inicial, FORMATO_DATA).date()
+    fim = datetime.strptime(data_final, FORMATO_DATA).date()
+    completa = inicio <= inicio_completa(hoje or date.today())
+    query = text("""
+        INSERT INTO coleta_watermarks (apartamento_id, relatorio, coletado_ate, ultima_coleta, ultima_completa)
+        VALUES (:apt_id, :relatorio, CASE WHEN :completa THEN CAST(:fim AS date) END, now(),
+                CASE WHEN :completa THEN now() END)
+        ON CONFLICT (apartamento_id, relatorio) DO UPDATE SET
+            coletado_ate = CASE
+                WHEN :completa THEN CAST(:fim AS date)
+                WHEN coleta_watermarks.coletado_ate IS NOT NULL AND CAST(:inicio AS date) <= coleta_watermarks.coletado_ate + 1
+                    THEN GREATEST(coleta_watermarks.coletado_ate, CAST(:fim AS date))
+                ELSE coleta_watermarks.coletado_ate
+            END,
+            ultima_coleta = now(),
+            ultima_completa = CASE WHEN :completa THEN now() ELSE coleta_watermarks.ultima_completa END
+    """)
+    for relatorio in relatorios:
+        conn.execute(query, {
+            'apt_id': apartamento_id, 'relatorio': relatorio,
+            'inicio': inicio, 'fim': fim, 'completa': completa,
+        })
+
+
+def invalidar(conn, apartamento_id: int, relatorio: str = None):
+    """Apaga as marcas do apartamento (de um relatório ou de todas): a próxima sincronização é completa."""
+    filtro_relatorio = ' AND relatorio = :relatorio' if relatorio else ''
+    conn.execute(
+        text(f'DELETE FROM coleta_watermarks WHERE apartamento_id = :apt_id{filtro_relatorio}'),
+        {'apt_id': apartamento_id, 'relatorio': relatorio}
+    )
@@ -1,16 +1,18 @@
 # worker.py (VERSÃO COM ATUALIZAÇÃO DIÁRIA COMPLETA)
 import os
+import sys
+import multiprocessing
 import redis
-from rq import Worker, Queue, Connection
+from rq import Worker, Queue
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timedelta
 from sqlalchemy import text
-import calendar
 
 # --- Importações necessárias ---
 import app as main_app 
 import database as db
 import coletor_principal
+import watermarks_coleta
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -19,6 +21,19 @@ listen = ['high', 'default', 'low']
 redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
 conn = redis.from_url(redis_url)
 
+# Quantos workers RQ este processo sobe. As importações usam staging temporário
+# por transação (ver carga_em_massa.py), então vários apartamentos podem importar em paralelo.
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', '1'))
+
+# Tempo máximo do job da coleta diária de todos os apartamentos (um job só, com o pool de
+# navegadores). Cada apartamento tem também o seu prazo (COLETA_APARTAMENTO_TIMEOUT, em
+# coletor_principal.py); este é só o limite de segurança do job inteiro.
+COLETA_DIARIA_TIMEOUT = int(os.getenv('COLETA_DIARIA_TIMEOUT', '21600'))
+
+# Tempo máximo de run_daily_full_sync: ela só escolhe os apartamentos, planeja os períodos
+# e enfileira a coleta (que roda em outro job, com COLETA_DIARIA_TIMEOUT)
+PLANEJAMENTO_COLETA_TIMEOUT = int(os.getenv('PLANEJAMENTO_COLETA_TIMEOUT', '600'))
+
 # --- TAREFA 1: Verificação da coleta em tempo real (lógica existente) ---
 def check_and_run_live_robots():
     print(f"[{datetime.now()}] Worker (Live): Verificando robôs em tempo real...")
@@ -31,11 +46,18 @@ def schedule_robot_check():
     q.enqueue(check_and_run_live_robots, job_timeout=1800)
 
 # --- TAREFA 2: Nova rotina de sincronização diária completa ---
-def run_daily_full_sync():
+def run_daily_full_sync(completa: bool = False):
     """
-    Busca apartamentos elegíveis e dispara a coleta mensal para o ano corrente.
+    Busca apartamentos elegíveis e dispara a coleta mensal dos períodos que cada um
+    precisa: a janela ainda aberta, o que ficou para trás desde a marca d'água de
+    cada relatório, ou tudo desde janeiro (sincronização completa, periódica ou
+    com completa=True). Ver watermarks_coleta.py.
+    Os apartamentos são coletados em paralelo, num único job, pelo pool de
+    navegadores (ver coletor_principal.executar_coletas_em_paralelo); falhas e
+    prazos esgotados valem por apartamento, e o resultado do job traz a situação
+    de cada um.
     """
-    print(f"[{datetime.now()}] Worker (Diário): INICIANDO ROTINA DE SINCRONIZAÇÃO COMPLETA.")
+    print(f"[{datetime.now()}] Worker (Diário): INICIANDO ROTINA DE SINCRONIZAÇÃO{' COMPLETA' if completa else ''}.")
     with main_app.app.app_context():
         try:
             with db.engine.connect() as connection:
@@ -49,38 +71,28 @@ def run_daily_full_sync():
                 apartamentos_elegiveis = connection.execute(query).mappings().all()
 
                 if not apartamentos_elegiveis:
-                    print(f"[{datetime.now()}] Worker (Diário): Nenhum apartamento elegível encontrado para a sincronização completa.")
+                    print(f"[{datetime.now()}] Worker (Diário): Nenhum apartamento elegível encontrado para a sincronização.")
                     return
 
-                hoje = datetime.now()
-                ano_corrente = hoje.year
-                mes_corrente = hoje.month
-
+                relatorios = list(coletor_principal.ROBOS)
+                periodos_por_apartamento = {}
                 for apt in apartamentos_elegiveis:
                     apartamento_id = apt['id']
                     print(f"--> Worker (Diário): Iniciando sincronização para o Apartamento ID: {apartamento_id}")
-                    
-                    # Loop de Janeiro até o mês atual
-                    for mes in range(1, mes_corrente + 1):
-                        # Calcula o primeiro e o último dia do mês
-                        primeiro_dia = datetime(ano_corrente, mes, 1)
-                        ultimo_dia_num = calendar.monthrange(ano_corrente, mes)[1]
-                        ultimo_dia = datetime(ano_corrente, mes, ultimo_dia_num)
-
-                        start_date_str = primeiro_dia.strftime('%d/%m/%Y')
-                        end_date_str = ultimo_dia.strftime('%d/%m/%Y')
-                        
-                        print(f"    -> Enfileirando coleta para o mês {mes}/{ano_corrente} (Período: {start_date_str} a {end_date_str})")
-                        
-                        # Enfileira a tarefa no Redis para o worker executar
-                        q = Queue(connection=conn)
-                        q.enqueue(
-                            coletor_principal.executar_todas_as_coletas,
-                            apartamento_id,
-                            start_date_str=start_date_str,
-                            end_date_str=end_date_str,
-                            job_timeout=3600 # Timeout maior para tarefas mais longas
-                        )
+
+                    periodos = watermarks_coleta.planejar(connection, apartamento_id, relatorios, completa=completa)
+                    for start_date_str, end_date_str, relatorios_do_periodo in periodos:
+                        print(f"    -> Incluindo coleta do período {start_date_str} a {end_date_str} ({len(relatorios_do_periodo)} relatórios)")
+                    periodos_por_apartamento[apartamento_id] = periodos
+
+                # Enfileira a tarefa no Redis para o worker executar
+                q = Queue(connection=conn)
+                q.enqueue(
+                    coletor_principal.executar_coletas_em_paralelo,
+                    periodos_por_apartamento,
+                    job_timeout=COLETA_DIARIA_TIMEOUT
+                )
+                print(f"--> Worker (Diário): Coleta de {len(periodos_por_apartamento)} apartamentos enfileirada.")
 
         except Exception as e:
             print(f"ERRO CRÍTICO no worker (Diário) ao verificar apartamentos: {e}")
@@ -89,10 +101,47 @@ def schedule_daily_sync():
     """Função que o agendador chama para colocar a tarefa diária na fila."""
     print(f"[{datetime.now()}] Agendador: Colocando tarefa de sincronização diária na fila...")
     q = Queue(connection=conn)
-    q.enqueue(run_daily_full_sync, job_timeout=3600)
+    q.enqueue(run_daily_full_sync, job_timeout=PLANEJAMENTO_COLETA_TIMEOUT)
+
+def enfileirar_sincronizacao_completa():
+    """
+    Sincronização completa sob demanda (todos os meses desde janeiro, ignorando as
+    marcas d'água), de todos os apartamentos: `python worker.py sincronizacao-completa`.
+    Para um apartamento só, basta apagar as marcas dele (painel do super admin ou
+    `python worker.py invalidar-marcas <apartamento_id> [relatorio]`).
+    """
+    print(f"[{datetime.now()}] Colocando sincronização completa na fila...")
+    q = Queue(connection=conn)
+    q.enqueue(run_daily_full_sync, completa=True, job_timeout=PLANEJAMENTO_COLETA_TIMEOUT)
+
+def invalidar_marcas(apartamento_id, relatorio: str = None):
+    """Apaga as marcas d'água da coleta do apartamento: a próxima sincronização dele é completa."""
+    apartamento_id = int(apartamento_id)
+    with db.engine.begin() as connection:
+        watermarks_coleta.invalidar(connection, apartamento_id, relatorio)
+    print(f"Marcas da coleta do apartamento {apartamento_id}{f' ({relatorio})' if relatorio else ''} apagadas.")
+
+# Comandos avulsos: python worker.py <comando> [argumentos]
+COMANDOS = {
+    'sincronizacao-completa': enfileirar_sincronizacao_completa,
+    'invalidar-marcas': invalidar_marcas,
+}
+
+def iniciar_worker_rq():
+    # Cada processo abre a própria conexão com o Redis
+    conexao = redis.from_url(redis_url)
+    worker = Worker([Queue(nome, connection=conexao) for nome in listen], connection=conexao)
+    print(f"Worker (RQ) {worker.name} iniciado e escutando a fila...")
+    worker.work()
 
 # --- BLOCO PRINCIPAL DE EXECUÇÃO DO WORKER ---
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        if sys.argv[1] not in COMANDOS:
+            sys.exit(f"Comando desconhecido: {sys.argv[1]}. Comandos: {', '.join(COMANDOS)}")
+        COMANDOS[sys.argv[1]](*sys.argv[2:])
+        sys.exit(0)
+
     scheduler = BackgroundScheduler(daemon=True)
     
     # Agendador 1: Roda a verificação em tempo real a cada 1 minuto (existente)
@@ -104,7 +153,23 @@ if __name__ == '__main__':
     scheduler.start()
     print("Agendador de tarefas (APScheduler) iniciado com duas rotinas: 'Live' e 'Diária'.")
 
-    with Connection(conn):
-        worker = Worker(map(Queue, listen))
-        print("Worker (RQ) iniciado e escutando a fila...")
-        worker.work()
\ No newline at end of file
+    # O agendador roda só neste processo; os workers extras apenas consomem a fila.
+    # Os extras não são daemon: processos daemon não podem criar filhos, e a importação
+    # de um upload usa um pool de processos (IMPORTACAO_PROCESSOS) também nesses workers.
+    # Por isso eles são encerrados explicitamente quando o worker principal termina.
+    extras = []
+    for _ in range(WORKER_PROCESSES - 1):
+        processo = multiprocessing.Process(target=iniciar_worker_rq)
+        processo.start()
+        extras.append(processo)
+    if extras:
+        print(f"{len(extras)} workers (RQ) extras iniciados (WORKER_PROCESSES={WORKER_PROCESSES}).")
+
+    try:
+        iniciar_worker_rq()
+    finally:
+        # SIGTERM pede aos extras o mesmo desligamento suave (termina o job em andamento)
+        for processo in extras:
+            processo.terminate()
+        for processo in extras:
+            processo.join()
\ No newline at end of file